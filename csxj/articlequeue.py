@@ -3,19 +3,53 @@ import sys
 import os
 from datetime import datetime
 import json
+import hashlib
+import shutil
+import socket
+import random
+import time
 import utils
 import logging
 import traceback
+import urllib2
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+# datetime.strptime() lazily imports this module, which is not thread-safe
+# on python 2. Importing it here avoids spurious errors in download workers.
+import _strptime
 
 from csxj.common.decorators import deprecated
-from csxj.datasources.parser_tools.utils import fetch_html_content
+from csxj.datasources.parser_tools.utils import fetch_article_html
 from csxj.datasources.parser_tools.utils import convert_utf8_url_to_ascii
+from csxj.datasources.parser_tools.fetcher import get_shared_fetcher, FetchStats
+from csxj.datasources.parser_tools.retry import retry_with_backoff, CircuitBreaker, CircuitOpenError
 from csxj.datasources.parser_tools import constants
+from csxj.scheduling import FreshnessFirstPolicy
+from csxj.polling import PollingSchedule, DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
 
 from db import Provider, ProviderStats, make_error_log_entry2
+from db.seenurls import SeenUrlIndex
+from db.queuejournal import QueueJournal, DEFAULT_LEASE_DURATION
+from db import rawpack
+from db.contentstore import get_content_store
+from db.presetdict import load_latest_dictionary
+from db.syndication import SyndicationIndex
+from db.sqliteprovider import open_provider, DEFAULT_STORAGE_BACKEND
+from db.tombstones import TombstoneStore, HTTP_CODE_REASONS, DELETED, PAYWALLED
 from db.constants import *
 
 
+DEFAULT_DOWNLOAD_CONCURRENCY = 4
+
+# polls in a row where the frontpage is not fetched because the RSS feed had
+# nothing new: stories which only appear on the frontpage are still found
+MAX_RSS_SKIPPED_POLLS = 3
+
+# stands for the html of pages we did not even try to fetch, because the source's
+# circuit breaker was open or the run went over its time budget
+SKIPPED_PAGE = object()
+
+
 def write_dict_to_file(d, outdir, outfile):
     """
     """
@@ -28,17 +62,56 @@ def write_dict_to_file(d, outdir, outfile):
         json.dump(d, outfile)
 
 
+def format_transfer_stats(fetch_stats):
+    bytes_received = fetch_stats.get('bytes_received', 0)
+    bytes_decompressed = fetch_stats.get('bytes_decompressed', 0)
+    ratio = float(bytes_decompressed) / bytes_received if bytes_received else 1.0
+    return u"Received {0} kB over the wire for {1} kB of content ({2:.1f}x compression)".format(bytes_received / 1024,
+                                                                                              bytes_decompressed / 1024,
+                                                                                              ratio)
+
+
+def make_worker_id():
+    return u"{0}:{1}:{2:08x}".format(socket.gethostname(), os.getpid(), random.getrandbits(32))
+
+
+def parse_article_in_subprocess(args):
+    """
+    Parses a fetched article in a multiprocessing worker.
+
+    Modules can't be pickled, so the datasource is passed by name.
+    Returns an (article_data, html_content, stacktrace) tuple.
+    """
+    source_module_name, html_content, url = args
+    __import__(source_module_name)
+    source = sys.modules[source_module_name]
+    try:
+        article_data, html_content = source.parse_article(html_content, url)
+        return article_data, html_content, None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+
 class ArticleQueueFiller(object):
     log_name = "csxj_QueueFiller.log"
 
-    def __init__(self, source, source_name, db_root):
+    def __init__(self, source, source_name, db_root, only_if_due=False,
+                 poll_interval_bounds=(DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL), check_rss=True):
         self.source = source
         self.source_name = source_name
         self.db_root = db_root
         self.new_stories = list()
         self.new_blogposts = list()
         self.new_paywalled_articles = list()
+        self.syndicated_stories = dict()
         self.root = os.path.join(db_root, source_name)
+        # learns how often the frontpage changes, see csxj/polling.py
+        self.polling_schedule = PollingSchedule(self.root, *poll_interval_bounds)
+        # skip the poll if the schedule says it is too early
+        self.only_if_due = only_if_due
+        # look at the source's RSS_FEED_URL, if it has one, before fetching the frontpage
+        self.check_rss = check_rss
+        get_shared_fetcher().limiter.configure_for_source(source)
 
     def make_log_message(self, message):
         return u"[{0}] {1}".format(self.source_name, message)
@@ -72,8 +145,20 @@ class ArticleQueueFiller(object):
         if not os.path.exists(outdir):
             os.makedirs(outdir)
 
+        if self.only_if_due and not self.polling_schedule.is_due():
+            self.log_info(u"Not polling yet, next poll in {0:.0f}s".format(self.polling_schedule.get_next_poll_time() - time.time()))
+            return
+
         try:
-            frontpage_toc, blogposts_toc, paywalled_articles = self.source.get_frontpage_toc()
+            frontpage_cache = self.load_frontpage_cache()
+            frontpage_toc, blogposts_toc, paywalled_articles = self.get_frontpage_toc_if_changed(frontpage_cache)
+            if frontpage_toc is None:
+                frontpage_cache['skipped_polls'] = frontpage_cache.get('skipped_polls', 0) + 1
+                self.save_frontpage_cache(frontpage_cache)
+                self.log_info(u"Frontpage has not changed since last time, skipping this poll ({0} polls skipped in a row)".format(frontpage_cache['skipped_polls']))
+                self.update_polling_schedule(0)
+                return
+
             self.log_info(u"Found {0} stories, {1} blogposts and {2} paywalled articles on the frontpage".format(len(frontpage_toc),
                                                                                                                  len(blogposts_toc),
                                                                                                                  len(paywalled_articles)))
@@ -88,14 +173,30 @@ class ArticleQueueFiller(object):
                                                                 self.source_name,
                                                                 LAST_PAYWALLED_ARTICLES_FILENAME)
 
-                self.new_stories = utils.filter_only_new_stories(frontpage_toc, last_stories_filename)
-                self.new_blogposts = utils.filter_only_new_stories(blogposts_toc, last_blogposts_filename)
-                self.new_paywalled_articles = utils.filter_only_new_stories(paywalled_articles, last_paywalled_articles_filename)
-
-                self.log_info(u"Found {0} new stories, {1} new blogposts and {2} new paywalled articles since last time".format(len(self.new_stories),
-                                                                                                                                len(self.new_blogposts),
-                                                                                                                                len(self.new_paywalled_articles)))
-                self.update_global_queue()
+                seen_urls = self.open_seen_url_index()
+                try:
+                    self.new_stories = utils.filter_unseen_stories(frontpage_toc, seen_urls)
+                    self.new_blogposts = utils.filter_unseen_stories(blogposts_toc, seen_urls)
+                    self.new_paywalled_articles = utils.filter_unseen_stories(paywalled_articles, seen_urls)
+
+                    self.log_info(u"Found {0} new stories, {1} new blogposts and {2} new paywalled articles since last time".format(len(self.new_stories),
+                                                                                                                                    len(self.new_blogposts),
+                                                                                                                                    len(self.new_paywalled_articles)))
+                    self.syndicated_stories = self.find_syndicated_stories(self.new_stories)
+                    self.update_global_queue()
+                    for title, url in self.new_stories + self.new_blogposts + self.new_paywalled_articles:
+                        seen_urls.add(url)
+                    self.log_info(u"{0} urls queued so far".format(len(seen_urls)))
+                finally:
+                    seen_urls.close()
+
+                utils.save_toc_to_file(frontpage_toc, last_stories_filename)
+                utils.save_toc_to_file(blogposts_toc, last_blogposts_filename)
+                utils.save_toc_to_file(paywalled_articles, last_paywalled_articles_filename)
+                # only remember this version once its stories are safely enqueued
+                frontpage_cache['skipped_polls'] = 0
+                self.save_frontpage_cache(frontpage_cache)
+                self.update_polling_schedule(len(self.new_stories) + len(self.new_blogposts) + len(self.new_paywalled_articles))
             else:
                 self.log_error(u"Found no headlines on the frontpage. Updating error log")
                 self.update_queue_error_log("*** No link were extracted from the frontpage")
@@ -105,6 +206,155 @@ class ArticleQueueFiller(object):
             stacktrace = traceback.format_exc()
             self.update_queue_error_log(stacktrace)
 
+    def update_polling_schedule(self, new_link_count):
+        self.polling_schedule.record_poll(new_link_count)
+        self.polling_schedule.save()
+        self.log_info(u"Polling the frontpage every {0:.0f}s (about {1:.1f} new links per hour)".format(self.polling_schedule.interval,
+                                                                                                    self.polling_schedule.new_stories_rate or 0))
+
+    def find_syndicated_stories(self, stories):
+        """
+        Looks for the stories which another source of the same group (see SYNDICATION_GROUP)
+        already queued. Returns {url: {"source", "url", "matched_by"}} for those copies.
+        """
+        group = getattr(self.source, 'SYNDICATION_GROUP', None)
+        if not group or not stories:
+            return dict()
+        syndicated_stories = SyndicationIndex(self.db_root, group).register_stories(self.source_name, stories)
+        if syndicated_stories:
+            self.log_info(u"Found {0} stories already queued by other {1} sources".format(len(syndicated_stories), group))
+        return syndicated_stories
+
+    def open_seen_url_index(self):
+        """
+        Opens the index of all the urls ever queued for this source.
+
+        A new index starts with what was on the last frontpage we saw, since
+        that was queued already.
+        """
+        index_filename = os.path.join(self.root, SEEN_URLS_FILENAME)
+        is_new_index = not os.path.exists(index_filename)
+        seen_urls = SeenUrlIndex(index_filename)
+        if is_new_index:
+            for last_toc_filename in (LAST_STORIES_FILENAME, LAST_BLOGPOSTS_FILENAME, LAST_PAYWALLED_ARTICLES_FILENAME):
+                for title, url in utils.load_last_toc_from_file(os.path.join(self.root, last_toc_filename)):
+                    seen_urls.add(url)
+        return seen_urls
+
+    def load_frontpage_cache(self):
+        cache_filename = os.path.join(self.root, FRONTPAGE_CACHE_FILENAME)
+        if os.path.exists(cache_filename):
+            with open(cache_filename, 'r') as f:
+                return json.load(f)
+        else:
+            return dict()
+
+    def save_frontpage_cache(self, frontpage_cache):
+        with open(os.path.join(self.root, FRONTPAGE_CACHE_FILENAME), 'w') as f:
+            json.dump(frontpage_cache, f)
+
+    def get_frontpage_toc_if_changed(self, frontpage_cache):
+        """
+        Sends a conditional request for the source frontpage, using the validators
+        and body hash kept in frontpage_cache, and parses it only if it changed.
+
+        If the source has an RSS feed, it is checked first: as long as it has no new
+        items, the frontpage is not even fetched (up to MAX_RSS_SKIPPED_POLLS times).
+        New items from the feed are merged into the frontpage toc, or into the last
+        saved tocs when the frontpage itself has not changed.
+
+        Returns (None, None, None) when the frontpage has not changed since it was
+        cached. Otherwise, updates frontpage_cache in place and returns the parsed toc.
+        """
+        if not hasattr(self.source, 'FRONTPAGE_URL'):
+            return self.source.get_frontpage_toc()
+
+        new_rss_items = None
+        if self.check_rss and hasattr(self.source, 'RSS_FEED_URL'):
+            new_rss_items = self.get_new_rss_items(frontpage_cache)
+            if new_rss_items == [] and frontpage_cache.get('rss_skipped_polls', 0) < MAX_RSS_SKIPPED_POLLS:
+                frontpage_cache['rss_skipped_polls'] = frontpage_cache.get('rss_skipped_polls', 0) + 1
+                self.log_info(u"RSS feed has no new items, not fetching the frontpage")
+                return None, None, None
+
+        frontpage_cache['rss_skipped_polls'] = 0
+        page = self.fetch_if_changed(self.source.FRONTPAGE_URL, frontpage_cache, 'etag', 'last_modified')
+        if page is None:
+            if new_rss_items:
+                return self.merge_with_last_tocs(new_rss_items)
+            return None, None, None
+
+        content_hash = hashlib.sha1(page.content).hexdigest()
+        if content_hash == frontpage_cache.get('content_hash'):
+            if new_rss_items:
+                return self.merge_with_last_tocs(new_rss_items)
+            return None, None, None
+
+        frontpage_cache['etag'] = page.headers.getheader('etag')
+        frontpage_cache['last_modified'] = page.headers.getheader('last-modified')
+        frontpage_cache['content_hash'] = content_hash
+        frontpage_toc, blogposts_toc, paywalled_articles = self.source.parse_frontpage_toc(page.content)
+        if new_rss_items:
+            frontpage_urls = set(url for (title, url) in frontpage_toc + blogposts_toc + paywalled_articles)
+            frontpage_toc = frontpage_toc + [(title, url) for (title, url) in new_rss_items if url not in frontpage_urls]
+        return frontpage_toc, blogposts_toc, paywalled_articles
+
+    def merge_with_last_tocs(self, new_rss_items):
+        """
+        Returns the last saved tocs, with the new RSS items added to the stories,
+        so that saving them does not forget what the unchanged frontpage still lists.
+        """
+        frontpage_toc, blogposts_toc, paywalled_articles = [utils.load_last_toc_from_file(os.path.join(self.root, filename))
+                                                             for filename in (LAST_STORIES_FILENAME,
+                                                                              LAST_BLOGPOSTS_FILENAME,
+                                                                              LAST_PAYWALLED_ARTICLES_FILENAME)]
+        last_urls = set(url for (title, url) in frontpage_toc + blogposts_toc + paywalled_articles)
+        frontpage_toc = frontpage_toc + [(title, url) for (title, url) in new_rss_items if url not in last_urls]
+        return frontpage_toc, blogposts_toc, paywalled_articles
+
+    def fetch_if_changed(self, url, frontpage_cache, etag_key, last_modified_key):
+        """
+        Sends a conditional request using the validators kept in frontpage_cache.
+        Returns the page, or None if it was not modified.
+        """
+        headers = dict()
+        if frontpage_cache.get(etag_key):
+            headers['If-None-Match'] = frontpage_cache[etag_key]
+        if frontpage_cache.get(last_modified_key):
+            headers['If-Modified-Since'] = frontpage_cache[last_modified_key]
+
+        # several fillers can share the fetcher at the same time, so we keep our own counters
+        fetch_stats = FetchStats()
+        page = get_shared_fetcher().fetch(url, headers, fetch_stats)
+        self.log_info(format_transfer_stats(fetch_stats.as_dict()))
+        if page.status == 304:
+            return None
+        return page
+
+    def get_new_rss_items(self, frontpage_cache):
+        """
+        Fetches the source's RSS feed, which is much lighter than its frontpage, and
+        returns the (title, url) items which were not in it last time.
+
+        Returns None if the feed could not be read: the frontpage tells us then.
+        """
+        try:
+            feed = self.fetch_if_changed(self.source.RSS_FEED_URL, frontpage_cache, 'rss_etag', 'rss_last_modified')
+            if feed is None:
+                return []
+            rss_toc = self.source.parse_rss_toc(feed.content)
+        except Exception:
+            self.log_error(u"Could not read the RSS feed, checking the frontpage instead:\n{0}".format(traceback.format_exc()))
+            return None
+
+        previous_urls = set(frontpage_cache.get('rss_urls', []))
+        new_rss_items = [(title, url) for (title, url) in rss_toc if url not in previous_urls]
+        frontpage_cache['rss_etag'] = feed.headers.getheader('etag')
+        frontpage_cache['rss_last_modified'] = feed.headers.getheader('last-modified')
+        frontpage_cache['rss_urls'] = [url for (title, url) in rss_toc]
+        self.log_info(u"Found {0} new items in the RSS feed".format(len(new_rss_items)))
+        return new_rss_items
+
     def update_queue_error_log(self, stacktrace):
         """
         """
@@ -133,31 +383,59 @@ class ArticleQueueFiller(object):
         today = datetime.today()
 
         day_str = today.strftime("%Y-%m-%d")
-        day_directory = os.path.join(self.root, "queue", day_str)
-
-        if not os.path.exists(day_directory):
-            os.makedirs(day_directory)
-
         batch_hour_str = today.strftime("%H.%M.%S")
-        batch_filename = "{0}.json".format(os.path.join(day_directory, batch_hour_str))
 
-        self.log.info(self.make_log_message("Saving toc to {0}".format(batch_filename)))
-        with open(batch_filename, "w") as f:
-            self.log.info(self.make_log_message("Enqueuing {0} new stories, {1} blogposts and {2} paywalled articles".format(len(self.new_stories),
-                                                                                                                             len(self.new_blogposts),
-                                                                                                                             len(self.new_paywalled_articles))))
-            json.dump({"articles": self.new_stories, "blogposts": self.new_blogposts, "paywalled_articles": self.new_paywalled_articles}, f)
+        queue = QueueJournal(os.path.join(self.root, QUEUE_DIR))
+        self.log.info(self.make_log_message("Saving toc to the queue as batch {0}/{1}".format(day_str, batch_hour_str)))
+        self.log.info(self.make_log_message("Enqueuing {0} new stories, {1} blogposts and {2} paywalled articles".format(len(self.new_stories),
+                                                                                                                         len(self.new_blogposts),
+                                                                                                                         len(self.new_paywalled_articles))))
+        items = {"articles": self.new_stories, "blogposts": self.new_blogposts, "paywalled_articles": self.new_paywalled_articles}
+        if self.syndicated_stories:
+            items["syndicated_stories"] = self.syndicated_stories
+        queue.enqueue(day_str, batch_hour_str, items)
+        batch_count, item_count = queue.get_depth()
+        self.log_info(u"{0} articles in {1} batches are waiting in the queue".format(item_count, batch_count))
 
 
 class ArticleQueueDownloader(object):
     log_name = "csxj_QueueDownloader.log"
 
-    def __init__(self, source, source_name, db_root, debug_mode=True):
+    def __init__(self, source, source_name, db_root, debug_mode=True, max_workers=None, parse_processes=1, deadline=None, lease_duration=DEFAULT_LEASE_DURATION, skip_syndicated=False, scheduling_policy=None, storage_backend=DEFAULT_STORAGE_BACKEND, deduplicate_raw_data=True):
         self.db_root = db_root
         self.source = source
         self.source_name = source_name
         self.downloaded_articles = []
         self.debug_mode = debug_mode
+        if max_workers is None:
+            # the rate limiter decides how many of them actually hit the site at once
+            rate_limit = getattr(source, 'RATE_LIMIT', dict())
+            max_workers = rate_limit.get('max_concurrency', DEFAULT_DOWNLOAD_CONCURRENCY)
+        self.max_workers = max(1, max_workers)
+        self.parse_processes = parse_processes
+        self.parse_pool = None
+        self.circuit_breaker = CircuitBreaker()
+        # time.time() after which we leave what is left in the queue for the next run
+        self.deadline = deadline
+        # tells our leases apart from those of the other downloaders working on the same queue
+        self.worker_id = make_worker_id()
+        self.lease_duration = lease_duration
+        # picks the next batch to download, see csxj/scheduling.py
+        self.scheduling_policy = scheduling_policy or FreshnessFirstPolicy()
+        self.current_lease = None
+        self.tombstones = None
+        # the source's preset dictionary for the raw html, if one was trained (see csxj/db/presetdict.py)
+        self.raw_data_dictionary = None
+        # keep each page once in the source's content store, batches refer to it (see csxj/db/contentstore.py)
+        self.deduplicate_raw_data = deduplicate_raw_data
+        self.content_store = None
+        # do not fetch the stories a sister source already downloaded
+        self.skip_syndicated = skip_syndicated
+        group = getattr(source, 'SYNDICATION_GROUP', None)
+        self.syndication_index = SyndicationIndex(db_root, group) if group else None
+        # where the articles go, one of STORAGE_BACKENDS (the raw html always goes to the source's directory)
+        self.storage_backend = storage_backend
+        get_shared_fetcher().limiter.configure_for_source(source)
 
     def make_log_message(self, message):
         return u"[{0}] {1}".format(self.source_name, message)
@@ -186,122 +464,322 @@ class ArticleQueueDownloader(object):
         cls.log.addHandler(file_handler)
         cls.log.addHandler(stream_handler)
 
+    def log_http_stats(self, fetch_stats_before):
+        fetch_stats = FetchStats.diff(get_shared_fetcher().stats.as_dict(), fetch_stats_before)
+        self.log_info(u"Sent {0} http requests ({1} new connections, {2} reused connections)".format(fetch_stats.get('requests', 0),
+                                                                                                   fetch_stats.get('connections_opened', 0),
+                                                                                                   fetch_stats.get('connections_reused', 0)))
+        if fetch_stats.get('throttled'):
+            self.log_info(u"The site asked us to slow down {0} times (429/503 responses)".format(fetch_stats['throttled']))
+        self.log_info(format_transfer_stats(fetch_stats))
+
+    def get_reason_to_stop(self):
+        """
+        Returns why we should stop downloading for this run, or None if we can go on.
+        """
+        if self.circuit_breaker.is_rejecting_requests():
+            return u"Too many failures"
+        if self.deadline is not None and time.time() >= self.deadline:
+            return u"Out of time"
+        return None
+
+    def log_time_budget(self, start_time):
+        now = time.time()
+        self.log_info(u"Used {0:.0f}s of the time budget ({1:.0f}s left)".format(now - start_time,
+                                                                               max(0, self.deadline - now)))
+
     def download_all_articles_in_queue(self):
-        provider_db = Provider(self.db_root, self.source_name)
-        queued_items = provider_db.get_queued_batches_by_day()
-
-        if queued_items:
-            for (day_string, batches) in queued_items:
-                self.log_info(u"Downloading {0} batches for {1}".format(len(batches), day_string))
-                day_directory = os.path.join(self.db_root, self.source_name, day_string)
-                for (i, batch) in enumerate(batches):
-                    batch_hour_string, items = batch
-
-                    news_items, junk = self.source.filter_news_items(items['articles'])
-                    if junk:
-                        self.log.info(self.make_log_message("Found {0} articles which are not actually news".format(len(junk))))
-
-                    self.log.info(self.make_log_message("Downloading {0} articles for batch#{1} ({2})".format(len(news_items), i, batch_hour_string)))
-                    articles, detected_paywalled_articles, deleted_articles, errors, raw_data = self.download_batch(news_items)
-
-                    self.log_info(u"Found data for {0} articles ({1} errors)".format(len(articles),
-                                                                                     len(errors)))
-                    batch_output_directory = os.path.join(day_directory, batch_hour_string)
-                    self.save_articles_to_db(articles, deleted_articles, errors, items['blogposts']+junk, batch_output_directory)
-
-                    # paywalled stuff
-                    if 'paywalled_articles' not in items:
-                        items['paywalled_articles'] = []
-                    all_paywalled_articles = items['paywalled_articles'] + detected_paywalled_articles
-                    self.log_info(u"Writing {0} paywalled article links to {1}".format(len(all_paywalled_articles), os.path.join(batch_output_directory, PAYWALLED_ARTICLES_FILENAME)))
-                    write_dict_to_file(dict(paywalled_articles=all_paywalled_articles), batch_output_directory, PAYWALLED_ARTICLES_FILENAME)
-
-                    # raw data
-                    self.save_raw_data_to_db(raw_data, batch_output_directory)
-                    self.save_errors_raw_data_to_db(errors, batch_output_directory)
-
-                self.log_info(u"Removing queue directory for day: {0}".format(day_string))
-                provider_db.cleanup_queue(day_string)
-        else:
+        start_time = time.time()
+        provider_db = open_provider(self.db_root, self.source_name, self.storage_backend)
+        try:
+            batch_count, item_count = provider_db.get_queue_depth()
+            fetch_stats_before = get_shared_fetcher().stats.as_dict()
+
+            if batch_count and self.parse_processes > 1:
+                self.parse_pool = multiprocessing.Pool(self.parse_processes)
+            # opened for each run, which also gets it compacted from time to time
+            self.tombstones = TombstoneStore(os.path.join(self.db_root, self.source_name))
+            self.raw_data_dictionary = load_latest_dictionary(self.db_root, self.source_name)
+            if self.deduplicate_raw_data:
+                self.content_store = get_content_store(os.path.join(self.db_root, self.source_name))
+
+            self.download_queued_items(provider_db)
+        finally:
+            if self.parse_pool:
+                self.parse_pool.close()
+                self.parse_pool.join()
+                self.parse_pool = None
+            provider_db.close()
+
+        if batch_count:
+            self.log_http_stats(fetch_stats_before)
+        if self.deadline is not None:
+            self.log_time_budget(start_time)
+
+    def download_queued_items(self, provider_db):
+        """
+        Claims the queued batches one at a time and downloads them, until the queue is
+        empty or we have to stop. Other downloaders can drain the same queue concurrently:
+        each batch is leased to the one which claimed it, and only committed once its
+        articles are safely in the database.
+        """
+        downloaded_batch_count = 0
+        while True:
+            reason_to_stop = self.get_reason_to_stop()
+            if reason_to_stop:
+                batch_count, item_count = provider_db.get_queue_depth()
+                self.log_error(u"{0}, leaving {1} batches in the queue".format(reason_to_stop, batch_count))
+                break
+
+            queued_batch = provider_db.claim_queued_batch(self.worker_id, self.lease_duration, self.scheduling_policy)
+            if queued_batch is None:
+                break
+
+            self.current_lease = [provider_db, queued_batch, time.time()]
+            try:
+                self.download_queued_batch(provider_db, queued_batch)
+            except:
+                provider_db.release_queued_batch(queued_batch, self.worker_id)
+                raise
+            finally:
+                self.current_lease = None
+            provider_db.commit_queued_batch(queued_batch)
+            downloaded_batch_count += 1
+
+        if not downloaded_batch_count:
             self.log_info(u"Empty queue. Nothing to do.")
 
-    def download_batch(self, items):
-        articles, detected_paywalled_articles, deleted_articles, errors, raw_data = list(), list(), list(), list(), list()
+    def renew_lease_if_needed(self):
+        """
+        Keeps the batch being downloaded leased to us, however long it takes.
+        """
+        if not self.current_lease:
+            return
+        provider_db, queued_batch, last_renewal = self.current_lease
+        now = time.time()
+        if now - last_renewal >= self.lease_duration / 3.0:
+            if not provider_db.renew_queued_batch_lease(queued_batch, self.worker_id, self.lease_duration):
+                self.log_error(u"Lost the lease on batch {0} ({1}), another downloader may fetch it too".format(queued_batch.batch, queued_batch.day))
+            self.current_lease[2] = now
+
+    def download_queued_batch(self, provider_db, queued_batch):
+        day_string, batch_hour_string, items = queued_batch.day, queued_batch.batch, queued_batch.items
+        day_directory = os.path.join(self.db_root, self.source_name, day_string)
+
+        news_items, junk = self.source.filter_news_items(items['articles'])
+        if junk:
+            self.log.info(self.make_log_message("Found {0} articles which are not actually news".format(len(junk))))
+
+        news_items, syndicated_articles = self.set_aside_syndicated_articles(news_items, items.get('syndicated_stories', dict()))
+        if syndicated_articles:
+            self.log_info(u"Skipping {0} articles which were already downloaded from another source".format(len(syndicated_articles)))
+
+        self.log.info(self.make_log_message("Downloading {0} articles for batch {1} ({2})".format(len(news_items), batch_hour_string, day_string)))
+        articles, detected_paywalled_articles, deleted_articles, errors, raw_data, errors_raw_data, skipped_items = self.download_batch(news_items)
+
+        self.log_info(u"Found data for {0} articles ({1} errors)".format(len(articles),
+                                                                         len(errors)))
+        if self.syndication_index:
+            self.syndication_index.mark_downloaded(self.source_name, [url for (url, html_content) in raw_data])
+
+        # the batch is written aside, and only moved in place once complete: a
+        # downloader dying halfway leaves nothing behind in the database
+        batch_output_directory = os.path.join(day_directory, batch_hour_string)
+        tmp_output_directory = os.path.join(day_directory, u".{0}.{1}.tmp".format(batch_hour_string, self.worker_id))
+        if os.path.exists(tmp_output_directory):
+            shutil.rmtree(tmp_output_directory)
+        all_paywalled_articles = items.get('paywalled_articles', []) + detected_paywalled_articles
+        self.log_info(u"Saving {0} articles, {1} deleted articles, {2} paywalled articles and {3} errors to batch {4} ({5})".format(len(articles),
+                                                                                                                               len(deleted_articles),
+                                                                                                                               len(all_paywalled_articles),
+                                                                                                                               len(errors),
+                                                                                                                               batch_hour_string,
+                                                                                                                               day_string))
+        provider_db.save_batch_content(day_string, batch_hour_string, tmp_output_directory,
+                                       articles=articles, deleted_articles=deleted_articles, errors=errors,
+                                       blogposts=items['blogposts'] + junk, paywalled_articles=all_paywalled_articles,
+                                       syndicated_articles=syndicated_articles)
+
+        # raw data
+        self.save_raw_data_to_db(raw_data, errors_raw_data, tmp_output_directory)
+
+        if os.path.exists(batch_output_directory):
+            # left by a downloader whose lease expired before it could commit
+            shutil.rmtree(batch_output_directory)
+        os.rename(tmp_output_directory, batch_output_directory)
+
+        if skipped_items:
+            requeued_batch = provider_db.requeue_items(day_string, dict(articles=skipped_items, blogposts=[], paywalled_articles=[]))
+            self.log_error(u"{0}, put {1} articles back in the queue (batch {2})".format(self.get_reason_to_stop() or u"Skipped",
+                                                                                        len(skipped_items), requeued_batch))
+
+    def set_aside_syndicated_articles(self, items, syndicated_stories):
+        """
+        Splits the (title, url) items between the ones to download, and the copies of
+        stories which were already downloaded from another source of the group.
+        The latter are returned as [title, url, original source, original url].
+        """
+        if not (self.skip_syndicated and self.syndication_index and syndicated_stories):
+            return items, []
+        items_to_download, syndicated_articles = list(), list()
         for title, url in items:
-            try:
-                article_data, html_content = self.source.extract_article_data(url)
-                if article_data:
-                    if article_data.content == constants.PAYWALLED_CONTENT:
-                        detected_paywalled_articles.append((article_data.title, article_data.url))
-                    else:
-                        articles.append(article_data)
-                        raw_data.append((url, html_content))
-                else:
-                    deleted_articles.append((title, url))
-            except Exception:
-                # log all the things
-                stacktrace = traceback.format_exc()
-                new_error = make_error_log_entry2(url, title, stacktrace)
-                errors.append(new_error)
-
-        return articles, detected_paywalled_articles, deleted_articles, errors, raw_data
+            original = syndicated_stories.get(url)
+            if original and self.syndication_index.is_downloaded(original['source'], original['url']):
+                syndicated_articles.append([title, url, original['source'], original['url']])
+            else:
+                items_to_download.append((title, url))
+        return items_to_download, syndicated_articles
 
-    def save_articles_to_db(self, articles, deleted_articles, errors, blogposts, outdir):
-        all_data = {'articles': [art.to_json() for art in articles],
-                    'errors': []}
+    def fetch_item(self, item):
+        """
+        Fetches the raw html for a single (title, url) queue item.
 
-        self.log_info(u"Writing {0} articles to {1}".format(len(articles), os.path.join(outdir, ARTICLES_FILENAME)))
-        write_dict_to_file(all_data, outdir, ARTICLES_FILENAME)
+        This runs in a worker thread, so it never raises: the stacktrace
+        is returned with the outcome and turned into an error entry by download_batch().
+        The html is None if the article was removed, and SKIPPED_PAGE if the
+        source is failing too much for us to even try, or if we are out of time.
+        """
+        title, url = item
+        missing_page_codes = getattr(self.source, 'MISSING_PAGE_HTTP_CODES', ())
+        if self.deadline is not None and time.time() >= self.deadline:
+            return title, url, SKIPPED_PAGE, None
+        try:
+            html_content = self.circuit_breaker.call(lambda: retry_with_backoff(lambda: fetch_article_html(url, missing_page_codes)))
+            return title, url, html_content, None
+        except CircuitOpenError:
+            return title, url, SKIPPED_PAGE, None
+        except urllib2.HTTPError as e:
+            if e.code in HTTP_CODE_REASONS:
+                self.tombstones.add(url, HTTP_CODE_REASONS[e.code])
+            return title, url, None, traceback.format_exc()
+        except Exception:
+            return title, url, None, traceback.format_exc()
 
-        blogposts_data = {'blogposts': blogposts}
-        self.log_info(u"Writing {0} blogpost links to {1}".format(len(blogposts), os.path.join(outdir, BLOGPOSTS_FILENAME)))
-        write_dict_to_file(blogposts_data, outdir, BLOGPOSTS_FILENAME)
+    def parse_item(self, fetched_item):
+        title, url, html_content, stacktrace = fetched_item
+        if stacktrace or html_content is None:
+            return title, url, None, None, stacktrace
+        try:
+            article_data, parsed_html_content = self.source.parse_article(html_content, url)
+            return title, url, article_data, parsed_html_content, None
+        except Exception:
+            # keep the page which made the parser fail, it gets saved with the errors
+            return title, url, None, html_content, traceback.format_exc()
+
+    def parse_items_in_subprocesses(self, fetched_items):
+        pending = list()
+        for fetched_item in fetched_items:
+            title, url, html_content, stacktrace = fetched_item
+            if stacktrace or html_content is None:
+                pending.append((fetched_item, None))
+            else:
+                async_result = self.parse_pool.apply_async(parse_article_in_subprocess, [(self.source.__name__, html_content, url)])
+                pending.append((fetched_item, async_result))
+
+        outcomes = list()
+        for fetched_item, async_result in pending:
+            title, url, html_content, stacktrace = fetched_item
+            if async_result:
+                article_data, parsed_html_content, stacktrace = async_result.get()
+                if not stacktrace:
+                    html_content = parsed_html_content
+                outcomes.append((title, url, article_data, html_content, stacktrace))
+            else:
+                outcomes.append((title, url, None, None, stacktrace))
+        return outcomes
 
-        deleted_articles_data = {'deleted_articles': deleted_articles}
-        self.log_info(u"Writing {0} links to deleted articles to {1}".format(len(deleted_articles), os.path.join(outdir, DELETED_ARTICLES_FILENAME)))
-        write_dict_to_file(deleted_articles_data, outdir, DELETED_ARTICLES_FILENAME)
+    def download_batch(self, items):
+        """
+        Downloads and parses a list of (title, url) items.
 
-        self.log_info(u"Writing {0} errors to {1}".format(len(errors), os.path.join(outdir, ERRORS2_FILENAME)))
-        write_dict_to_file({'errors': errors}, outdir, ERRORS2_FILENAME)
+        Returns the articles, detected paywalled articles, deleted articles, errors,
+        raw html of the articles, raw html of the pages that could not be parsed,
+        and the items which were skipped because the circuit breaker opened.
 
-    def save_raw_data_to_db(self, raw_data, batch_outdir):
-        """
+        Items with a tombstone are not fetched again: they are reported as deleted
+        or paywalled, like the first time.
         """
-        raw_data_dir = os.path.join(batch_outdir, RAW_DATA_DIR)
-        self.log_info(u"Writing raw html data to {0}".format(raw_data_dir))
-        self.save_raw_data_to_path(raw_data, raw_data_dir)
+        articles, detected_paywalled_articles, deleted_articles, errors, raw_data = list(), list(), list(), list(), list()
+        errors_raw_data, skipped_items = list(), list()
+
+        items_to_fetch = list()
+        for title, url in items:
+            reason = self.tombstones.get(url)
+            if reason == PAYWALLED:
+                detected_paywalled_articles.append((title, url))
+            elif reason:
+                deleted_articles.append((title, url))
+            else:
+                items_to_fetch.append((title, url))
+        if len(items_to_fetch) < len(items):
+            self.log_info(u"Not fetching {0} articles which were found deleted or paywalled before".format(len(items) - len(items_to_fetch)))
+        items = items_to_fetch
+
+        def set_aside_skipped_items(fetched_items):
+            for fetched_item in fetched_items:
+                self.renew_lease_if_needed()
+                title, url, html_content, stacktrace = fetched_item
+                if html_content is SKIPPED_PAGE:
+                    skipped_items.append((title, url))
+                else:
+                    yield fetched_item
+
+        worker_count = min(self.max_workers, len(items))
+        fetch_pool = ThreadPool(worker_count) if worker_count > 1 else None
+        try:
+            if fetch_pool:
+                # imap() hands back the pages in the same order as the queued items, so
+                # we can start parsing the first ones while the others are still downloading
+                fetched_items = set_aside_skipped_items(fetch_pool.imap(self.fetch_item, items))
+            else:
+                fetched_items = set_aside_skipped_items(self.fetch_item(item) for item in items)
+
+            if self.parse_pool:
+                outcomes = self.parse_items_in_subprocesses(fetched_items)
+            else:
+                outcomes = [self.parse_item(fetched_item) for fetched_item in fetched_items]
+        finally:
+            if fetch_pool:
+                fetch_pool.close()
+                fetch_pool.join()
+
+        for title, url, article_data, html_content, stacktrace in outcomes:
+            if stacktrace:
+                # log all the things
+                new_error = make_error_log_entry2(url, title, stacktrace)
+                errors.append(new_error)
+                if html_content is not None:
+                    errors_raw_data.append((url, html_content))
+            elif article_data:
+                if article_data.content == constants.PAYWALLED_CONTENT:
+                    detected_paywalled_articles.append((article_data.title, article_data.url))
+                    self.tombstones.add(url, PAYWALLED)
+                else:
+                    articles.append(article_data)
+                    raw_data.append((url, html_content))
+            else:
+                deleted_articles.append((title, url))
+                self.tombstones.add(url, DELETED)
+
+        return articles, detected_paywalled_articles, deleted_articles, errors, raw_data, errors_raw_data, skipped_items
 
-    def save_errors_raw_data_to_db(self, errors, batch_outdir):
+    def save_raw_data_to_db(self, raw_data, errors_raw_data, batch_outdir):
         """
+        Packs the html of the downloaded pages, and of the pages which could not be
+        parsed, in the batch's raw_data.pack (see csxj/db/rawpack.py).
         """
-        raw_data = list()
-        for i, error in enumerate(errors):
-            url, _, _ = error
-            try:
-                url = convert_utf8_url_to_ascii(url)
-                html_content = fetch_html_content(url)
-                raw_data.append((url, html_content))
-            except:
-                self.log_error(u"Could not fetch raw html data for error'd url: {0} (Reason: {1})".format([url], traceback.format_exc()))
-                continue
-
-        raw_data_dir = os.path.join(batch_outdir, ERRORS_RAW_DATA_DIR)
-        self.log_info(u"Writing raw html data to {0}".format(raw_data_dir))
-        self.save_raw_data_to_path(raw_data, raw_data_dir)
-
-    def save_raw_data_to_path(self, raw_data, root_path):
-        raw_data_dir = root_path
-        if not os.path.exists(raw_data_dir):
-            os.mkdir(raw_data_dir)
-        references = []
-        for (i, (url, html_content)) in enumerate(raw_data):
-            outfilename = u"{0}.html".format(i)
-            with open(os.path.join(raw_data_dir, outfilename), 'w') as f:
-                f.write(html_content)
-            references.append((url, outfilename))
-
-        with open(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME), 'w') as f:
-            json.dump(references, f)
+        errors_raw_data = [(convert_utf8_url_to_ascii(url), html_content) for (url, html_content) in errors_raw_data]
+        pages = [(RAW_DATA_DIR, url, html_content) for (url, html_content) in raw_data]
+        pages.extend((ERRORS_RAW_DATA_DIR, url, html_content) for (url, html_content) in errors_raw_data)
+
+        pack_filename = os.path.join(batch_outdir, RAW_DATA_PACK_FILENAME)
+        self.log_info(u"Writing {0} raw html pages to {1}".format(len(pages), pack_filename))
+        if self.content_store:
+            deduplicated_count = self.content_store.deduplicated_count
+            rawpack.write_pack(pack_filename, pages, dictionary=self.raw_data_dictionary, content_store=self.content_store)
+            self.log_info(u"{0} of those pages were already stored".format(self.content_store.deduplicated_count - deduplicated_count))
+        else:
+            rawpack.write_pack(pack_filename, pages, dictionary=self.raw_data_dictionary)
 
     @deprecated
     def update_provider_stats(self, outdir, articles, errors):
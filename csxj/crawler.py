@@ -2,22 +2,50 @@
 # -*- coding: utf-8 -*-
 
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from articlequeue import ArticleQueueFiller, ArticleQueueDownloader
+from db.sqliteprovider import DEFAULT_STORAGE_BACKEND
 
 
-def put_articles_in_queue(provider, db_root):
+DEFAULT_FILLER_WORKERS = 4
+
+
+def put_articles_in_queue(provider, db_root, **filler_options):
     name = provider.SOURCE_NAME
     print("Enqueuing stories for {0}".format(name))
-    queue_filler = ArticleQueueFiller(provider, name, db_root)
+    queue_filler = ArticleQueueFiller(provider, name, db_root, **filler_options)
     queue_filler.fetch_newest_article_links()
 
 
+def put_articles_in_all_queues(providers, db_root, max_workers=DEFAULT_FILLER_WORKERS, **filler_options):
+    """
+    Fills the queues of several sources at the same time, so that a slow
+    frontpage does not hold up the other sources.
+
+    filler_options are passed on to ArticleQueueFiller.
+    """
+    worker_count = min(max_workers, len(providers))
+    if worker_count > 1:
+        pool = ThreadPool(worker_count)
+        try:
+            pool.map(lambda provider: put_articles_in_queue(provider, db_root, **filler_options), providers)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for provider in providers:
+            put_articles_in_queue(provider, db_root, **filler_options)
+
+
 
 
-def download_queued_articles(source, db_root):
+def download_queued_articles(source, db_root, max_workers=None, parse_processes=1, deadline=None, skip_syndicated=False, scheduling_policy=None,
+                             storage_backend=DEFAULT_STORAGE_BACKEND):
     name = source.SOURCE_NAME
     print("Downloading enqueued stories for {0}".format(name))
-    queue_downloader = ArticleQueueDownloader(source, name, db_root)
+    queue_downloader = ArticleQueueDownloader(source, name, db_root, max_workers=max_workers, parse_processes=parse_processes,
+                                              deadline=deadline, skip_syndicated=skip_syndicated, scheduling_policy=scheduling_policy,
+                                              storage_backend=storage_backend)
     queue_downloader.download_all_articles_in_queue()
 
 
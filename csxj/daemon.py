@@ -0,0 +1,163 @@
+"""
+Long-running crawler: polls the frontpages and downloads the queued articles
+on its own timers, instead of being started over by cron for each run. Each
+frontpage is polled at the interval its PollingSchedule learned.
+
+Parsers, locales and the shared fetcher's connection pools are set up once
+and reused for the whole life of the process. SIGTERM (or SIGINT) stops the
+daemon cleanly: a running download stops after the articles in flight, and
+puts what it did not fetch back in the queue.
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import traceback
+
+from articlequeue import ArticleQueueFiller, ArticleQueueDownloader
+from crawler import put_articles_in_all_queues, DEFAULT_FILLER_WORKERS
+from csxj.datasources.parser_tools.fetcher import get_shared_fetcher
+from polling import PollingSchedule, DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL
+from db.constants import LOG_PATH
+
+
+# seconds between two runs of the downloader
+DEFAULT_DOWNLOAD_INTERVAL = 5 * 60
+
+
+class CrawlerDaemon(object):
+    log_name = "csxj_Daemon.log"
+
+    def __init__(self, db_root, filled_sources, downloaded_sources,
+                 poll_interval_bounds=(DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL), download_interval=DEFAULT_DOWNLOAD_INTERVAL,
+                 filler_workers=DEFAULT_FILLER_WORKERS, check_rss=True, download_time_budget=None, **downloader_options):
+        self.db_root = db_root
+        self.filled_sources = filled_sources
+        self.downloaded_sources = downloaded_sources
+        # each source is polled as often as its frontpage changes, see csxj/polling.py
+        self.poll_interval_bounds = poll_interval_bounds
+        self.download_interval = download_interval
+        self.filler_workers = filler_workers
+        self.check_rss = check_rss
+        self.download_time_budget = download_time_budget
+        self.downloader_options = downloader_options
+
+        # when each source's frontpage is polled next, everything is due at startup
+        self.next_polls = dict((source.SOURCE_NAME, 0) for source in filled_sources)
+        self.next_download = 0
+
+        # downloaders are kept from one run to the next, along with their circuit breakers
+        self.downloaders = dict()
+        self.current_downloader = None
+        self.stop_event = threading.Event()
+
+    @classmethod
+    def setup_logging(cls):
+        if not os.path.exists(LOG_PATH):
+            os.mkdir(LOG_PATH)
+
+        file_formatter = logging.Formatter('%(asctime)s [%(levelname)s:] %(message)s')
+        file_handler = logging.FileHandler(os.path.join(LOG_PATH, cls.log_name))
+        file_handler.setFormatter(file_formatter)
+
+        stream_formatter = logging.Formatter("[%(levelname)s]  %(message)s")
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(stream_formatter)
+
+        cls.log = logging.getLogger("csxj_Daemon")
+        cls.log.setLevel(logging.INFO)
+        cls.log.addHandler(file_handler)
+        cls.log.addHandler(stream_handler)
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.handle_stop_signal)
+        signal.signal(signal.SIGINT, self.handle_stop_signal)
+
+    def handle_stop_signal(self, signum, frame):
+        self.log.info(u"Received signal {0}, stopping".format(signum))
+        self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        downloader = self.current_downloader
+        if downloader:
+            # the downloader stops at its deadline, and requeues what it did not fetch
+            downloader.deadline = time.time()
+
+    def is_stopping(self):
+        return self.stop_event.is_set()
+
+    def run(self):
+        self.log.info(u"Starting: polling {0} sources, downloading {1} sources".format(len(self.filled_sources),
+                                                                                         len(self.downloaded_sources)))
+        try:
+            while not self.is_stopping():
+                self.run_due_tasks()
+                if not self.is_stopping():
+                    self.stop_event.wait(max(0, self.get_next_task_time() - time.time()))
+        finally:
+            get_shared_fetcher().close()
+            self.log.info(u"Stopped")
+
+    def run_due_tasks(self):
+        now = time.time()
+        due_sources = [source for source in self.filled_sources if self.next_polls[source.SOURCE_NAME] <= now]
+        if due_sources:
+            self.poll_frontpages(due_sources)
+        if not self.is_stopping() and self.next_download <= time.time():
+            self.download_queued_articles()
+            self.next_download = time.time() + self.download_interval
+
+    def get_next_task_time(self):
+        return min(self.next_polls.values() + [self.next_download])
+
+    def poll_frontpages(self, sources):
+        try:
+            self.fill_queues(sources)
+        except Exception:
+            self.log.error(u"Polling the frontpages failed:\n{0}".format(traceback.format_exc()))
+        for source in sources:
+            self.next_polls[source.SOURCE_NAME] = time.time() + self.get_poll_interval(source)
+
+    def fill_queues(self, sources):
+        put_articles_in_all_queues(sources, self.db_root, self.filler_workers,
+                                   poll_interval_bounds=self.poll_interval_bounds, check_rss=self.check_rss)
+
+    def get_poll_interval(self, source):
+        return PollingSchedule(os.path.join(self.db_root, source.SOURCE_NAME), *self.poll_interval_bounds).interval
+
+    def download_queued_articles(self):
+        deadline = time.time() + self.download_time_budget if self.download_time_budget else None
+        for source in self.downloaded_sources:
+            downloader = self.get_downloader(source)
+            self.current_downloader = downloader
+            # a stop signal coming in from now on moves the deadline to its own time
+            downloader.deadline = deadline
+            try:
+                if self.is_stopping():
+                    break
+                downloader.download_all_articles_in_queue()
+            except Exception:
+                self.log.error(u"Downloading the queue of {0} failed:\n{1}".format(source.SOURCE_NAME, traceback.format_exc()))
+            finally:
+                self.current_downloader = None
+
+    def get_downloader(self, source):
+        if source.SOURCE_NAME not in self.downloaders:
+            self.downloaders[source.SOURCE_NAME] = ArticleQueueDownloader(source, source.SOURCE_NAME, self.db_root, **self.downloader_options)
+        return self.downloaders[source.SOURCE_NAME]
+
+
+def run_daemon(db_root, filled_sources, downloaded_sources, **options):
+    if not os.path.exists(db_root):
+        os.mkdir(db_root)
+    ArticleQueueFiller.setup_logging()
+    ArticleQueueDownloader.setup_logging()
+    CrawlerDaemon.setup_logging()
+
+    daemon = CrawlerDaemon(db_root, filled_sources, downloaded_sources, **options)
+    daemon.install_signal_handlers()
+    daemon.run()
@@ -5,13 +5,13 @@ from datetime import datetime, time
 from itertools import chain
 import re
 import urlparse
-from urllib2 import HTTPError
 
 import BeautifulSoup as bs
 
 from csxj.common.tagging import classify_and_tag, make_tagged_url, update_tagged_urls
 from csxj.db.article import ArticleData
 from parser_tools.utils import fetch_html_content, make_soup_from_html_content, TEXT_MARKUP_TAGS
+from parser_tools.utils import fetch_and_parse_article
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, remove_text_formatting_and_links_from_fragments
 from parser_tools.utils import extract_plaintext_urls_from_text, setup_locales
 from parser_tools import constants
@@ -43,6 +43,13 @@ DHNET_NETLOC = 'www.dhnet.be'
 SOURCE_TITLE = u"DHNet"
 SOURCE_NAME = u"dhnet"
 
+MISSING_PAGE_HTTP_CODES = (404,)
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = ipm_utils.SYNDICATION_GROUP
+
+FRONTPAGE_URL = 'http://www.dhnet.be'
+
 
 def is_on_same_domain(url):
     """
@@ -288,20 +295,12 @@ def extract_links_to_embedded_content(main_content):
 
 def extract_article_data(source):
     """
+    source is either a file-like object, or a url.
     """
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        try:
-            html_content = fetch_html_content(source)
-        except HTTPError as e:
-            if e.code == 404:
-                return None, None
-            else:
-                raise
-        except Exception:
-            raise
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
+
 
+def parse_article(html_content, source):
     soup = make_soup_from_html_content(html_content)
     main_content = soup.find('div', {'id': 'maincontent'})
 
@@ -378,8 +377,10 @@ def get_first_story_title_and_url(main_content):
 
 
 def get_frontpage_toc():
-    url = 'http://www.dhnet.be'
-    html_content = fetch_html_content(url)
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_content):
     soup = make_soup_from_html_content(html_content)
 
     main_content = soup.find('div', {'id': 'maincontent'})
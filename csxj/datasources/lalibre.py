@@ -9,6 +9,7 @@ import BeautifulSoup
 from csxj.common.tagging import classify_and_tag, make_tagged_url, update_tagged_urls
 from csxj.db.article import ArticleData
 from parser_tools.utils import fetch_html_content, make_soup_from_html_content, extract_plaintext_urls_from_text
+from parser_tools.utils import fetch_and_parse_article
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, TEXT_MARKUP_TAGS, remove_text_formatting_and_links_from_fragments
 from parser_tools import constants
 from parser_tools import ipm_utils
@@ -37,6 +38,13 @@ LALIBRE_NETLOC = 'www.lalibre.be'
 SOURCE_TITLE = u"La Libre"
 SOURCE_NAME = u"lalibre"
 
+MISSING_PAGE_HTTP_CODES = ()
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = ipm_utils.SYNDICATION_GROUP
+
+FRONTPAGE_URL = 'http://www.lalibre.be'
+
 
 def is_on_same_domain(url):
     """
@@ -214,7 +222,7 @@ def extract_article_data_from_file(source_url, source_file):
         f = source_file
 
     html_content = f.read()
-    return extract_article_data_from_html(html_content, source_url)
+    return parse_article(html_content, source_url)
 
 
 def print_for_test(taggedURLs):
@@ -224,7 +232,7 @@ def print_for_test(taggedURLs):
                                                                            taggedURL.tags)
 
 
-def extract_article_data_from_html(html_content, source_url):
+def parse_article(html_content, source_url):
     soup = make_soup_from_html_content(html_content)
 
     main_content = soup.find('div', {'id': 'mainContent'})
@@ -267,13 +275,9 @@ def extract_article_data_from_html(html_content, source_url):
 
 def extract_article_data(source):
     """
+    source is either a file-like object, or a url.
     """
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        html_content = fetch_html_content(source)
-
-    return extract_article_data_from_html(html_content, source)
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
 
 
 def filter_news_items(frontpage_items):
@@ -281,8 +285,11 @@ def filter_news_items(frontpage_items):
 
 
 def get_frontpage_toc():
-    hostname_url = 'http://www.lalibre.be'
-    html_content = fetch_html_content(hostname_url)
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_content):
+    hostname_url = FRONTPAGE_URL
 
     soup = make_soup_from_html_content(html_content)
 
@@ -7,11 +7,9 @@ import itertools as it
 from urlparse import urlparse
 from scrapy.selector import HtmlXPathSelector
 
-from urllib2 import HTTPError
-
 from csxj.common.tagging import classify_and_tag, make_tagged_url, update_tagged_urls, print_taggedURLs
 from csxj.db.article import ArticleData
-from parser_tools.utils import fetch_html_content
+from parser_tools.utils import fetch_html_content, fetch_and_parse_article
 from parser_tools.utils import extract_plaintext_urls_from_text, setup_locales
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, remove_text_formatting_and_links_from_fragments
 from parser_tools import constants
@@ -22,12 +20,16 @@ setup_locales()
 SOURCE_TITLE = u"L'Avenir"
 SOURCE_NAME = u"lavenir"
 
+MISSING_PAGE_HTTP_CODES = (404, 403)
+
 LAVENIR_INTERNAL_BLOGS = {
     'lavenir.newspaperdirect.com': ['internal', 'pdf newspaper']
 }
 
 LAVENIR_NETLOC = 'www.lavenir.net'
 
+FRONTPAGE_URL = "http://{0}".format(LAVENIR_NETLOC)
+
 BLACKLIST = ["http://citysecrets.lavenir.net"]
 
 LAVENIR_SAME_OWNER = [
@@ -544,19 +546,13 @@ def extract_article_data_new_style(source, hxs):
 
 
 def extract_article_data(source):
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        try:
-            html_content = fetch_html_content(source)
-        except HTTPError as e:
-            if e.code == 404 or e.code == 403:
-                return None, None
-            else:
-                raise
-        except Exception:
-            raise
+    """
+    source is either a file-like object, or a url.
+    """
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
+
 
+def parse_article(html_content, source):
     hxs = HtmlXPathSelector(text=html_content)
 
     old_style_content_hxs = hxs.select("//div[@id='content']")
@@ -602,8 +598,10 @@ def filter_news_items(frontpage_items):
 
 
 def get_frontpage_toc():
-    frontpage_url = "http://{0}".format(LAVENIR_NETLOC)
-    html_data = fetch_html_content(frontpage_url)
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_data):
 
     hxs = HtmlXPathSelector(text=html_data)
 
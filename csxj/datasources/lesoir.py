@@ -8,6 +8,7 @@ import codecs
 from csxj.common.tagging import classify_and_tag, make_tagged_url, update_tagged_urls
 from csxj.db.article import ArticleData
 from parser_tools.utils import fetch_html_content, fetch_rss_content, make_soup_from_html_content
+from parser_tools.utils import fetch_and_parse_article
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, extract_plaintext_urls_from_text, remove_text_formatting_and_links_from_fragments
 from parser_tools.utils import setup_locales
 from parser_tools import constants
@@ -21,6 +22,11 @@ setup_locales()
 SOURCE_TITLE = u"Le Soir"
 SOURCE_NAME = u"lesoir"
 
+MISSING_PAGE_HTTP_CODES = ()
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = rossel_utils.SYNDICATION_GROUP
+
 LESOIR_INTERNAL_BLOGS = {
 
     'archives.lesoir.be': ['archives', 'internal'],
@@ -34,6 +40,10 @@ LESOIR_INTERNAL_BLOGS = {
 
 LESOIR_NETLOC = 'www.lesoir.be'
 
+FRONTPAGE_URL = 'http://www.lesoir.be'
+# checked before the frontpage, which is only fetched if the feed has new items
+RSS_FEED_URL = 'http://www.lesoir.be/la_une/rss.xml'
+
 
 def is_on_same_domain(url):
     """
@@ -271,11 +281,10 @@ def extract_article_data(source):
     """
     source is either a file-like object, or a url.
     """
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        html_content = fetch_html_content(source)
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
 
+
+def parse_article(html_content, source):
     soup = make_soup_from_html_content(html_content)
     story = soup.find('div', {'id': 'story'})
 
@@ -349,13 +358,13 @@ def filter_news_items(frontpage_items):
 
 
 def get_frontpage_toc():
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_content):
     """
-    Fetch links to articles listed on the 'Le Soir' front page.
-    For each of them, extract the relevant data.
+    Extract links to articles listed on the 'Le Soir' front page.
     """
-    url = 'http://www.lesoir.be'
-    html_content = fetch_html_content(url)
-
     soup = make_soup_from_html_content(html_content)
 
     # Here we have interlaced <ul>'s with a bunch of random other shit that
@@ -405,8 +414,10 @@ def get_frontpage_toc():
 
 
 def get_rss_toc():
-    rss_url = 'http://www.lesoir.be/la_une/rss.xml'
-    xml_content = fetch_rss_content(rss_url)
+    return parse_rss_toc(fetch_rss_content(RSS_FEED_URL))
+
+
+def parse_rss_toc(xml_content):
     stonesoup = BeautifulStoneSoup(xml_content)
 
     titles_in_rss = [(item.title.contents[0], item.link.contents[0]) for item in stonesoup.findAll('item')]
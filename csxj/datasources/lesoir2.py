@@ -9,14 +9,20 @@ from scrapy.selector import HtmlXPathSelector
 from parser_tools.utils import fetch_html_content
 from parser_tools.utils import setup_locales
 from parser_tools import constants
+from parser_tools import rossel_utils
 
 setup_locales()
 
 SOURCE_TITLE = u"Le Soir"
 SOURCE_NAME = u"lesoir2"
 
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = rossel_utils.SYNDICATION_GROUP
+
 LESOIR2_NETLOC = 'www.lesoir.be'
 
+FRONTPAGE_URL = 'http://www.lesoir.be'
+
 
 def extract_title_and_url(link_hxs):
     title = u"".join(link_hxs.select("text()").extract())
@@ -44,7 +50,10 @@ def reconstruct_full_url(url):
 
 
 def get_frontpage_toc():
-    html_data = fetch_html_content('http://www.lesoir.be')
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_data):
     hxs = HtmlXPathSelector(text=html_data)
 
     # main stories
@@ -11,12 +11,11 @@ from scrapy.selector import HtmlXPathSelector
 from csxj.common import tagging
 from csxj.db.article import ArticleData
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, extract_plaintext_urls_from_text, remove_text_formatting_and_links_from_fragments
-from parser_tools.utils import fetch_html_content
+from parser_tools.utils import fetch_html_content, fetch_and_parse_article
 from parser_tools.utils import setup_locales
 from parser_tools import rossel_utils
 from parser_tools.utils import convert_utf8_url_to_ascii
 from parser_tools import constants
-from urllib2 import HTTPError
 
 from helpers.unittest_generator import generate_test_func, save_sample_data_file
 
@@ -26,7 +25,14 @@ setup_locales()
 SOURCE_TITLE = u"Le Soir"
 SOURCE_NAME = u"lesoir_new"
 
+MISSING_PAGE_HTTP_CODES = (404, 403)
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = rossel_utils.SYNDICATION_GROUP
+
 LESOIR_NETLOC = "www.lesoir.be"
+
+FRONTPAGE_URL = "http://www.lesoir.be"
 LESOIR_INTERNAL_SITES = {
 
     'archives.lesoir.be': ['archives', 'internal'],
@@ -78,7 +84,10 @@ def separate_paywalled_articles(all_link_hxs):
 
 
 def get_frontpage_toc():
-    html_data = fetch_html_content('http://www.lesoir.be')
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_data):
     hxs = HtmlXPathSelector(text=html_data)
 
     # main stories
@@ -492,20 +501,15 @@ def filter_news_items(frontpage_items):
 
 
 def extract_article_data(source):
+    """
+    source is either a file-like object, or a url.
+    """
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
 
-    if hasattr(source, 'read'):
-        html_data = source.read()
-    else:
-        try:
-            source = convert_utf8_url_to_ascii(source)
-            html_data = fetch_html_content(source)
-        except HTTPError as e:
-            if e.code == 404 or e.code == 403:
-                return None, None
-            else:
-                raise
-        except Exception:
-            raise
+
+def parse_article(html_data, source):
+    if not hasattr(source, 'read'):
+        source = convert_utf8_url_to_ascii(source)
 
     soup = bs4.BeautifulSoup(html_data)
 
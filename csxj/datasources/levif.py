@@ -25,6 +25,8 @@ LEVIF_INTERNAL_BLOGS = {
 
 LEVIF_NETLOC = 'www.levif.be'
 
+FRONTPAGE_URL = "http://{0}/info".format(LEVIF_NETLOC)
+
 
 def split_news_and_blogposts(titles_and_urls):
     frontpage_items, blogposts = list(), list()
@@ -47,8 +49,10 @@ def extract_title_and_url(link_selector):
 
 
 def get_frontpage_toc():
-    url = "http://{0}/info".format(LEVIF_NETLOC)
-    html_data = fetch_html_content(url)
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_data):
 
     hxs = HtmlXPathSelector(text=html_data)
 
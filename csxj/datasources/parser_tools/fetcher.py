@@ -0,0 +1,307 @@
+# coding=utf-8
+"""
+HTTP fetcher shared by all the datasources.
+
+urllib2 opens (and closes) a new connection for every single page. Since we
+keep hitting the same handful of news sites, the fetcher keeps a pool of
+idle keep-alive connections for every host, and reuses them for the next
+requests to that host.
+
+It is a drop-in replacement for urllib2.urlopen(url).read(): redirects are
+followed, and HTTP errors are raised as urllib2.HTTPError so the datasources
+can keep checking e.code.
+
+Pages are requested gzip or deflate compressed, and transparently
+decompressed: FetchedPage.content is always the decoded body.
+
+Requests to each host go through a RateLimiter (see ratelimiter.py), so
+parallel downloads stay polite.
+
+Connecting and waiting for data both time out, so a hanging server cannot
+block a whole crawl: socket.timeout is raised instead.
+
+Requests can also be sent through an HTTP proxy, which is how the crawler
+is run against the offline stand-in of replay.py.
+"""
+
+import httplib
+import random
+import socket
+import threading
+import time
+import urllib2
+import urlparse
+import zlib
+from collections import namedtuple
+from StringIO import StringIO
+
+from useragents import USER_AGENT_STRINGS
+from ratelimiter import RateLimiter, NoLimit, THROTTLING_STATUS_CODES
+
+
+REDIRECT_CODES = (301, 302, 303, 307)
+MAX_REDIRECTS = 10
+MAX_IDLE_CONNECTIONS_PER_HOST = 8
+# servers usually drop idle keep-alive connections after a few seconds
+IDLE_CONNECTION_TIMEOUT = 15
+# seconds to wait for a connection to be established
+CONNECT_TIMEOUT = 10
+# seconds to wait for the next bytes of a response
+READ_TIMEOUT = 30
+
+# what we might get when sending a request over a connection the server already closed
+STALE_CONNECTION_ERRORS = (httplib.BadStatusLine, httplib.CannotSendRequest,
+                           httplib.ResponseNotReady, socket.error)
+
+ACCEPTED_ENCODINGS = 'gzip, deflate'
+
+
+FetchedPage = namedtuple('FetchedPage', 'url status headers content')
+
+
+def pick_random_ua_string():
+    index = random.randint(0, len(USER_AGENT_STRINGS) - 1)
+    return USER_AGENT_STRINGS[index]
+
+
+def decode_content(content, content_encoding):
+    """
+    Decompresses a response body according to its Content-Encoding header.
+    """
+    content_encoding = (content_encoding or '').strip().lower()
+    if not content:
+        # 304s and redirects keep the Content-Encoding header, without a body to decode
+        return content
+    elif content_encoding in ('gzip', 'x-gzip'):
+        return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+    elif content_encoding == 'deflate':
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            # some servers send a raw deflate stream, without the zlib header
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+    else:
+        return content
+
+
+class FetchStats(object):
+    """
+    Thread-safe bag of counters.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict()
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        with self.lock:
+            return dict(self.counters)
+
+    @staticmethod
+    def diff(after, before):
+        """
+        Returns the counters incremented between two as_dict() snapshots.
+        """
+        return dict((k, v - before.get(k, 0)) for (k, v) in after.items())
+
+
+class ConnectionPool(object):
+    """
+    Idle keep-alive connections to a single (scheme, host, port).
+    """
+    def __init__(self, scheme, netloc, max_idle=MAX_IDLE_CONNECTIONS_PER_HOST,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.lock = threading.Lock()
+        self.idle_connections = list()
+
+    def make_connection(self):
+        """
+        Returns a new, connected, connection.
+        """
+        if self.scheme == 'https':
+            conn = httplib.HTTPSConnection(self.netloc, timeout=self.connect_timeout)
+        else:
+            conn = httplib.HTTPConnection(self.netloc, timeout=self.connect_timeout)
+        conn.connect()
+        # from now on, the timeout applies to every read on the socket
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def get(self):
+        """
+        Returns a (connection, reused) tuple.
+        """
+        now = time.time()
+        with self.lock:
+            while self.idle_connections:
+                conn, idle_since = self.idle_connections.pop()
+                if now - idle_since < IDLE_CONNECTION_TIMEOUT:
+                    return conn, True
+                conn.close()
+        return self.make_connection(), False
+
+    def put(self, conn):
+        with self.lock:
+            if len(self.idle_connections) < self.max_idle:
+                self.idle_connections.append((conn, time.time()))
+                return
+        conn.close()
+
+    def close_all(self):
+        with self.lock:
+            for conn, idle_since in self.idle_connections:
+                conn.close()
+            self.idle_connections = list()
+
+
+class Fetcher(object):
+    """
+    Fetches pages over pooled keep-alive connections.
+
+    One instance is meant to be shared by everyone (see get_shared_fetcher()),
+    it is safe to use from several threads.
+    """
+    def __init__(self, max_idle_connections_per_host=MAX_IDLE_CONNECTIONS_PER_HOST,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.max_idle_connections_per_host = max_idle_connections_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pools = dict()
+        self.pools_lock = threading.Lock()
+        self.stats = FetchStats()
+        self.limiter = RateLimiter()
+        self.proxy = None
+        self.proxy_rate_limited = True
+
+    def set_proxy(self, proxy_url, rate_limited=True):
+        """
+        Sends all the http requests through a proxy, e.g. 'http://127.0.0.1:8080'. None disables it.
+
+        With rate_limited=False, the requests sent through the proxy skip the per-host limits:
+        a local stand-in such as replay.py does not need them.
+        """
+        self.proxy = urlparse.urlsplit(proxy_url) if proxy_url else None
+        self.proxy_rate_limited = rate_limited
+
+    def get_pool(self, scheme, netloc):
+        key = (scheme, netloc.lower())
+        with self.pools_lock:
+            if key not in self.pools:
+                self.pools[key] = ConnectionPool(scheme, netloc, self.max_idle_connections_per_host,
+                                                 self.connect_timeout, self.read_timeout)
+            return self.pools[key]
+
+    def close(self):
+        with self.pools_lock:
+            for pool in self.pools.values():
+                pool.close_all()
+
+    def fetch(self, url, headers=None, stats=None):
+        """
+        GETs a url, following redirects.
+
+        Returns a FetchedPage. Raises urllib2.HTTPError if the server answers with an error code.
+        If a FetchStats is given, the counters for this fetch are also added to it.
+        """
+        scheme = urlparse.urlsplit(url).scheme.lower()
+        if scheme not in ('http', 'https'):
+            # file://, ftp:// and friends are not worth pooling
+            response = urllib2.urlopen(url, timeout=self.read_timeout)
+            return FetchedPage(response.geturl(), 200, response.info(), response.read())
+
+        for i in range(MAX_REDIRECTS + 1):
+            status, reason, response_headers, content = self.send_request(url, headers or dict(), stats)
+            if status in REDIRECT_CODES and response_headers.getheader('location'):
+                url = urlparse.urljoin(url, response_headers.getheader('location'))
+                continue
+            if status >= 400:
+                raise urllib2.HTTPError(url, status, reason, response_headers, StringIO(content))
+            return FetchedPage(url, status, response_headers, content)
+
+        raise urllib2.HTTPError(url, status, "Too many redirects", response_headers, StringIO(content))
+
+    def send_request(self, url, headers, stats=None):
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            path = "{0}?{1}".format(path or '/', query)
+        request_headers = {'User-agent': pick_random_ua_string(),
+                           'Accept-Encoding': ACCEPTED_ENCODINGS,
+                           'Connection': 'keep-alive'}
+        request_headers.update(headers)
+
+        path = path or '/'
+        host_limiter = self.limiter.get(netloc)
+        if self.proxy:
+            # proxies want the full url in the request line
+            scheme, netloc, path = self.proxy.scheme, self.proxy.netloc, urlparse.urldefrag(url)[0]
+            if not self.proxy_rate_limited:
+                host_limiter = NoLimit()
+
+        host_limiter.acquire()
+        status, latency = None, None
+        try:
+            start_time = time.time()
+            response, raw_content, reused = self.send_pooled_request(scheme, netloc, path, request_headers)
+            status, latency = response.status, time.time() - start_time
+        finally:
+            host_limiter.release(status, latency)
+
+        content = decode_content(raw_content, response.getheader('content-encoding'))
+        counts = dict(requests=1,
+                      connections_reused=int(reused),
+                      connections_opened=int(not reused),
+                      bytes_received=len(raw_content),
+                      bytes_decompressed=len(content),
+                      throttled=int(status in THROTTLING_STATUS_CODES))
+        self.stats.add(**counts)
+        if stats:
+            stats.add(**counts)
+        return response.status, response.reason, response.msg, content
+
+    def send_pooled_request(self, scheme, netloc, path, headers):
+        """
+        Returns the response, its raw (still compressed) body, and whether we reused a connection.
+        """
+        pool = self.get_pool(scheme, netloc)
+        conn, reused = pool.get()
+        try:
+            try:
+                response = self.get_response(conn, path, headers)
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if not reused or isinstance(e, socket.timeout):
+                    raise
+                # the server dropped our idle connection, try again on a fresh one
+                conn, reused = pool.make_connection(), False
+                response = self.get_response(conn, path, headers)
+            raw_content = response.read()
+        except Exception:
+            # whatever went wrong, the connection is in no state to be reused
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            pool.put(conn)
+        return response, raw_content, reused
+
+    def get_response(self, conn, path, headers):
+        conn.request('GET', path, headers=headers)
+        return conn.getresponse()
+
+
+_shared_fetcher = Fetcher()
+
+
+def get_shared_fetcher():
+    return _shared_fetcher
@@ -6,6 +6,9 @@ from utils import remove_text_formatting_markup_from_fragments, remove_text_form
 import media_utils
 import constants
 
+# sources of this group are checked against each other for syndicated stories
+SYNDICATION_GROUP = u"ipm"
+
 IPM_SAME_OWNER = [
     'essentielle.be',
     'tribunedebruxelles.be',
@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+Per-host politeness limits for the fetcher.
+
+Every host gets a token bucket, which caps the request rate, and a limit on
+the number of requests in flight. That limit adapts to how the host behaves:
+it grows while responses come back quickly, shrinks when they get slow, and
+is halved as soon as the host answers 429 (Too Many Requests) or 503.
+
+The defaults below suit most sites. A datasource whose site needs other
+limits declares them in a RATE_LIMIT dict, next to SOURCE_NAME, e.g.:
+
+    RATE_LIMIT = dict(requests_per_second=5.0, burst=8, max_concurrency=8)
+"""
+
+import threading
+import time
+import urlparse
+
+
+THROTTLING_STATUS_CODES = (429, 503)
+
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+DEFAULT_BURST = 4
+DEFAULT_MAX_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+# responses slower than this (in seconds) make us back off
+DEFAULT_TARGET_LATENCY = 2.0
+# weight of the newest sample in the moving average of the latency
+LATENCY_SMOOTHING = 0.3
+
+
+def normalize_netloc(netloc):
+    """
+    'www.lesoir.be', 'lesoir.be' and 'LESOIR.BE' are all the same host to us.
+
+    >>> normalize_netloc('WWW.LeSoir.be')
+    'lesoir.be'
+    """
+    netloc = netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return netloc
+
+
+class TokenBucket(object):
+    """
+    Lets through `rate` requests per second on average, with bursts of up to `burst` requests.
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Blocks until a token is available. Returns how long we had to wait.
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # going below zero reserves a token from the future, so that
+            # waiting threads are served in the order they arrived
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostLimiter(object):
+    """
+    Rate and (adaptive) concurrency limits for a single host.
+    """
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, target_latency=DEFAULT_TARGET_LATENCY):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_concurrency = max(MIN_CONCURRENCY, max_concurrency)
+        self.target_latency = target_latency
+        self.concurrency = max(MIN_CONCURRENCY, self.max_concurrency / 2)
+        self.in_flight = 0
+        self.latency = None
+        self.fast_streak, self.slow_streak = 0, 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.concurrency:
+                self.condition.wait()
+            self.in_flight += 1
+        self.bucket.take()
+
+    def release(self, status, latency):
+        """
+        Frees a slot, and adapts the concurrency to the response we got.
+        `status` and `latency` are None if the request failed altogether.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.update_concurrency(status, latency)
+            self.condition.notify_all()
+
+    def update_concurrency(self, status, latency):
+        if status in THROTTLING_STATUS_CODES:
+            self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+            self.fast_streak, self.slow_streak = 0, 0
+            return
+
+        if latency is None:
+            return
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+
+        # additive increase/decrease, once per 'window' of responses
+        if self.latency > self.target_latency:
+            self.fast_streak, self.slow_streak = 0, self.slow_streak + 1
+            if self.slow_streak >= self.concurrency:
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency - 1)
+                self.slow_streak = 0
+        else:
+            self.fast_streak, self.slow_streak = self.fast_streak + 1, 0
+            if self.fast_streak >= self.concurrency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.fast_streak = 0
+
+
+class NoLimit(object):
+    """
+    Stands in for a HostLimiter, for requests which are not to be limited at all.
+    """
+    def acquire(self):
+        pass
+
+    def release(self, status, latency):
+        pass
+
+
+class RateLimiter(object):
+    """
+    Keeps one HostLimiter per host. Hosts which were not configured get the default limits.
+    """
+    def __init__(self):
+        self.limits = dict()
+        self.host_limiters = dict()
+        self.lock = threading.Lock()
+
+    def configure(self, netloc, **limits):
+        """
+        Sets the limits for a host (see HostLimiter for the accepted keywords).
+        """
+        netloc = normalize_netloc(netloc)
+        with self.lock:
+            if self.limits.get(netloc) != limits:
+                self.limits[netloc] = limits
+                self.host_limiters[netloc] = HostLimiter(**limits)
+
+    def configure_for_source(self, source):
+        """
+        Applies the RATE_LIMIT declared by a datasource module to the host of its frontpage.
+        """
+        if hasattr(source, 'RATE_LIMIT') and hasattr(source, 'FRONTPAGE_URL'):
+            self.configure(urlparse.urlsplit(source.FRONTPAGE_URL).netloc, **source.RATE_LIMIT)
+
+    def get(self, netloc):
+        netloc = normalize_netloc(netloc)
+        with self.lock:
+            if netloc not in self.host_limiters:
+                self.host_limiters[netloc] = HostLimiter(**self.limits.get(netloc, dict()))
+            return self.host_limiters[netloc]
@@ -0,0 +1,200 @@
+# coding=utf-8
+"""
+Offline replay of recorded pages, to run (and benchmark) the whole crawler
+without touching the network.
+
+Pages come from:
+ - the raw html archived by the downloader: every raw_data/ and errors_raw_data/
+   directory of a json db, gzipped or not, and every raw_data.pack,
+ - cassettes: directories laid out just like raw_data/, a references.json index
+   of (url, filename) pairs next to the N.html files. A cassette can be recorded
+   from the live sites, which is how frontpages end up in there.
+
+ReplayServer is a local HTTP stand-in answering requests from those pages, with
+some injectable latency. The fetcher talks to it as if it were an HTTP proxy
+(see Fetcher.set_proxy()), so the datasources keep requesting their usual urls.
+"""
+
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+
+from csxj.db.constants import RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_INDEX_FILENAME, RAW_DATA_PACK_FILENAME
+from csxj.db.rawdata import read_raw_html, list_raw_pages, load_raw_data_index
+from fetcher import Fetcher
+
+
+def normalize_url(url):
+    """
+    Archived urls can be unicode, requested ones are always ascii.
+    """
+    if isinstance(url, unicode):
+        return url.encode('utf-8')
+    return url
+
+
+def find_raw_data_directories(db_root):
+    """
+    Yields the raw_data and errors_raw_data directories, including those which were packed.
+    """
+    for dirpath, dirnames, filenames in os.walk(db_root):
+        if os.path.basename(dirpath) in (RAW_DATA_DIR, ERRORS_RAW_DATA_DIR) and RAW_DATA_INDEX_FILENAME in filenames:
+            yield dirpath
+        if RAW_DATA_PACK_FILENAME in filenames:
+            yield os.path.join(dirpath, RAW_DATA_DIR)
+            yield os.path.join(dirpath, ERRORS_RAW_DATA_DIR)
+
+
+class PageArchive(object):
+    """
+    Maps urls to archived html files.
+
+    If a cassette directory is given, recorded pages are saved in there.
+    """
+    def __init__(self, cassette_dir=None):
+        self.pages = dict()
+        self.cassette_dir = cassette_dir
+        self.cassette_references = list()
+        self.lock = threading.Lock()
+        if cassette_dir:
+            if not os.path.exists(cassette_dir):
+                os.makedirs(cassette_dir)
+            if os.path.exists(os.path.join(cassette_dir, RAW_DATA_INDEX_FILENAME)):
+                self.add_directory(cassette_dir)
+                self.cassette_references = load_raw_data_index(cassette_dir)
+
+    @classmethod
+    def from_db(cls, db_root, cassette_dir=None):
+        archive = cls(cassette_dir)
+        for raw_data_dir in find_raw_data_directories(db_root):
+            archive.add_directory(raw_data_dir)
+        return archive
+
+    def __len__(self):
+        return len(self.pages)
+
+    def add_directory(self, raw_data_dir):
+        """
+        Adds all the pages listed in a raw_data-like directory, packed or not.
+        """
+        references = list_raw_pages(raw_data_dir)
+        with self.lock:
+            for url, location in references:
+                self.pages[normalize_url(url)] = location
+
+    def get(self, url):
+        """
+        Returns the archived html for a url, or None if we do not have it.
+        """
+        with self.lock:
+            filename = self.pages.get(normalize_url(url))
+        if filename:
+            return read_raw_html(filename)
+
+    def record(self, url, html_content):
+        """
+        Saves a page in the cassette.
+        """
+        with self.lock:
+            filename = u"{0}.html".format(len(self.cassette_references))
+            with open(os.path.join(self.cassette_dir, filename), 'w') as f:
+                f.write(html_content)
+            self.cassette_references.append((url, filename))
+            with open(os.path.join(self.cassette_dir, RAW_DATA_INDEX_FILENAME), 'w') as f:
+                json.dump(self.cassette_references, f)
+            self.pages[normalize_url(url)] = os.path.join(self.cassette_dir, filename)
+
+
+def gzip_content(content):
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    f.write(content)
+    f.close()
+    return buf.getvalue()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def get_requested_url(self):
+        if self.path.startswith('http://') or self.path.startswith('https://'):
+            return self.path
+        # not proxied: someone asked for a page on the stand-in itself
+        return "http://{0}{1}".format(self.headers.getheader('host', ''), self.path)
+
+    def do_GET(self):
+        url = self.get_requested_url()
+        self.server.wait_some_latency()
+        html_content = self.server.get_page(url)
+        if html_content is None:
+            self.send_page(404, 'not in the archive: {0}'.format(url))
+        else:
+            self.send_page(200, html_content)
+
+    def send_page(self, status, content):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        if 'gzip' in self.headers.getheader('accept-encoding', ''):
+            content = gzip_content(content)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """
+    Local HTTP stand-in for the news sites.
+
+    Every response is delayed by `latency` seconds, plus a random `jitter`.
+    With `record`, the pages missing from the archive are fetched from the
+    live site and saved in the archive's cassette.
+    """
+    daemon_threads = True
+
+    def __init__(self, archive, latency=0.0, jitter=0.0, record=False, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), ReplayHandler)
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.live_fetcher = Fetcher() if record else None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+    def wait_some_latency(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_page(self, url):
+        html_content = self.archive.get(url)
+        if html_content is None and self.live_fetcher:
+            try:
+                html_content = self.live_fetcher.fetch(url).content
+            except Exception:
+                return None
+            self.archive.record(url, html_content)
+        return html_content
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.live_fetcher:
+            self.live_fetcher.close()
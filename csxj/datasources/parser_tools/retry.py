@@ -0,0 +1,130 @@
+# coding=utf-8
+"""
+Retries with exponential backoff, and a circuit breaker to stop hammering
+a site which is down.
+"""
+
+import httplib
+import random
+import socket
+import threading
+import time
+import urllib2
+
+
+# status codes worth trying again a bit later
+TRANSIENT_HTTP_CODES = (408, 429, 500, 502, 503, 504)
+
+MAX_ATTEMPTS = 3
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+
+# consecutive failures after which we stop fetching from a source
+FAILURE_THRESHOLD = 5
+# seconds to wait before letting a trial request through an open circuit
+RESET_TIMEOUT = 120.0
+
+
+def is_transient_error(exception):
+    """
+    Tells if an exception raised while fetching a page is worth a retry.
+    """
+    if isinstance(exception, urllib2.HTTPError):
+        return exception.code in TRANSIENT_HTTP_CODES
+    return isinstance(exception, (urllib2.URLError, httplib.HTTPException, socket.error))
+
+
+def get_retry_delay(exception, attempt, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """
+    Exponential backoff with some jitter, unless the server told us how long to wait.
+    """
+    if isinstance(exception, urllib2.HTTPError) and exception.hdrs:
+        retry_after = exception.hdrs.getheader('retry-after')
+        if retry_after and retry_after.strip().isdigit():
+            return min(max_delay, float(retry_after))
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def retry_with_backoff(func, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """
+    Calls func(), retrying it on transient errors. The last exception is re-raised.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return func()
+        except Exception as e:
+            if not is_transient_error(e) or attempt == max_attempts - 1:
+                raise
+            time.sleep(get_retry_delay(e, attempt, base_delay, max_delay))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Counts consecutive failures for a source. Once there are too many of them,
+    the circuit opens and no more requests are allowed until `reset_timeout`
+    seconds have passed. Then a single trial request is let through: the circuit
+    closes again if it succeeds, and stays open for another period if it fails.
+    """
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def is_rejecting_requests(self):
+        """
+        True while the circuit is open and not yet ready for a trial request.
+        """
+        with self.lock:
+            return self.opened_at is not None and time.time() - self.opened_at < self.reset_timeout
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial_in_progress and time.time() - self.opened_at >= self.reset_timeout:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failure_count = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failure_count += 1
+            if self.trial_in_progress or self.failure_count >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.trial_in_progress = False
+
+    def call(self, func):
+        """
+        Calls func() through the circuit. Raises CircuitOpenError if the circuit is open.
+        Only transient errors count as failures: a 404 means the site is up.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError()
+        try:
+            result = func()
+        except Exception as e:
+            if is_transient_error(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
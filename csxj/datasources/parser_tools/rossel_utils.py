@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+# sources of this group are checked against each other for syndicated stories
+SYNDICATION_GROUP = u"rossel"
+
 ROSSEL_SAME_OWNER = [
     'passionsante.be',
     'references.be',
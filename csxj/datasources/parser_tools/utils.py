@@ -3,32 +3,66 @@
 import urllib2
 import urlparse
 import re
-import random
 from datetime import datetime
 
 from BeautifulSoup import BeautifulSoup, Tag, NavigableString
 import bs4
 
-from useragents import USER_AGENT_STRINGS
 from icann_tlds import TLD_LIST
-
-
-def pick_random_ua_string():
-    index = random.randint(0, len(USER_AGENT_STRINGS) - 1)
-    return USER_AGENT_STRINGS[index]
+from fetcher import get_shared_fetcher, pick_random_ua_string
 
 
 def fetch_content_from_url(url):
-    request = urllib2.Request(url)
-    request.add_header('User-agent', pick_random_ua_string())
-    response = urllib2.urlopen(request)
-    return response.read()
+    return get_shared_fetcher().fetch(url).content
 
 
 def fetch_html_content(url):
     return fetch_content_from_url(url)
 
 
+def fetch_article_html(url, missing_page_codes=()):
+    """
+    Common fetch layer for article pages.
+
+    Returns the raw html of the article, or None if the server answers with
+    one of the `missing_page_codes` (i.e. the article was removed).
+    Any other HTTP error is raised.
+    """
+    if isinstance(url, unicode):
+        try:
+            url.encode('ascii')
+        except UnicodeEncodeError:
+            url = convert_utf8_url_to_ascii(url)
+
+    try:
+        return fetch_html_content(url)
+    except urllib2.HTTPError as e:
+        if e.code in missing_page_codes:
+            return None
+        else:
+            raise
+
+
+def fetch_and_parse_article(source, parse_article, missing_page_codes=()):
+    """
+    Shared implementation of the datasources' extract_article_data(source).
+
+    `source` is either a file-like object, or a url. `parse_article` is the
+    datasource's parse_article(html_content, source_url) function, which
+    does no network access. `missing_page_codes` are the status codes
+    meaning the article was removed (MISSING_PAGE_HTTP_CODES).
+    Returns an (ArticleData, html_content) tuple, (None, None) for removed articles.
+    """
+    if hasattr(source, 'read'):
+        return parse_article(source.read(), source)
+
+    html_content = fetch_article_html(source, missing_page_codes)
+    if html_content is None:
+        return None, None
+    else:
+        return parse_article(html_content, source)
+
+
 def fetch_rss_content(url):
     return fetch_content_from_url(url)
 
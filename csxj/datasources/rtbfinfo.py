@@ -18,6 +18,8 @@ SOURCE_NAME = u"rtbfinfo"
 RTBFINFO_INTERNAL_BLOGS = {}
 RTBFINFO_NETLOC = 'www.rtbf.be'
 
+FRONTPAGE_URL = "http://{0}/info".format(RTBFINFO_NETLOC)
+
 BLACKLIST = ["http://citysecrets.lavenir.net"]
 
 
@@ -36,8 +38,10 @@ def extract_title_and_url_from_span_thing(link_selector):
 
 
 def get_frontpage_toc():
-    url = "http://{0}/info".format(RTBFINFO_NETLOC)
-    html_data = fetch_html_content(url)
+    return parse_frontpage_toc(fetch_html_content(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_data):
 
     hxs = HtmlXPathSelector(text=html_data)
 
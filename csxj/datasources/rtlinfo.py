@@ -5,6 +5,7 @@ from itertools import chain
 import codecs
 from parser_tools.utils import fetch_content_from_url, make_soup_from_html_content, remove_text_formatting_markup_from_fragments
 from parser_tools.utils import extract_plaintext_urls_from_text, setup_locales
+from parser_tools.utils import fetch_and_parse_article
 from csxj.common.tagging import tag_URL, classify_and_tag, make_tagged_url, TaggedURL
 from csxj.db.article import ArticleData
 
@@ -21,6 +22,13 @@ RTLINFO_INTERNAL_SITES = {
 SOURCE_TITLE = u"RTL Info"
 SOURCE_NAME = u"rtlinfo"
 
+MISSING_PAGE_HTTP_CODES = ()
+
+# rtl.be gets more than the default politeness limits of parser_tools/ratelimiter.py
+RATE_LIMIT = dict(requests_per_second=5.0, burst=8, max_concurrency=8)
+
+FRONTPAGE_URL = 'http://www.rtl.be/info/'
+
 def extract_title(main_article):
     left_column = main_article.find('div', {'id':'leftCol'})
     title = left_column.find('h1', {'class':'rtl_font_weight_normal'})
@@ -182,11 +190,13 @@ def extract_intro(main_article):
 
 
 def extract_article_data(source):
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        html_content = fetch_content_from_url(source)
+    """
+    source is either a file-like object, or a url.
+    """
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
+
 
+def parse_article(html_content, source):
     soup = make_soup_from_html_content(html_content)
 
     main_article= soup.find('div', {'id':'mainArticle'})
@@ -306,8 +316,10 @@ def separate_news_and_blogposts(titles_and_urls):
 
 
 def get_frontpage_toc():
-    url = 'http://www.rtl.be/info/'
-    html_content = fetch_content_from_url(url)
+    return parse_frontpage_toc(fetch_content_from_url(FRONTPAGE_URL))
+
+
+def parse_frontpage_toc(html_content):
     soup = make_soup_from_html_content(html_content)
 
     maincontent = soup.find('div', {'class': 'mainContent'})
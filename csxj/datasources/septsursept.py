@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import urllib
 import datetime as dt
+import urlparse
 from itertools import chain
 
 from scrapy.selector import HtmlXPathSelector
@@ -21,8 +21,13 @@ from helpers.unittest_generator import generate_test_func, save_sample_data_file
 SOURCE_TITLE = u"7 sur 7"
 SOURCE_NAME = u"septsursept"
 
+MISSING_PAGE_HTTP_CODES = ()
+
 
 SEPTSURSEPT_NETLOC = "www.7sur7.be"
+
+FRONTPAGE_URL = "http://www.7sur7.be/"
+
 SEPTSURSEPT_INTERNAL_SITES = {}
 
 SEPTSURSEPT_SAME_OWNER = [
@@ -71,8 +76,11 @@ def separate_articles_and_photoalbums(frontpage_items):
 
 
 def try_extract_frontpage_items(url):
+    html_data = utils.fetch_html_content(url)
+    return extract_frontpage_items(html_data)
+
 
-    html_data = urllib.urlopen(url).read()
+def extract_frontpage_items(html_data):
     hxs = HtmlXPathSelector(text=html_data)
 
     # get all the stories from the left column
@@ -101,7 +109,11 @@ def try_extract_frontpage_items(url):
 
 
 def get_frontpage_toc():
-    return try_extract_frontpage_items("http://www.7sur7.be/")
+    return try_extract_frontpage_items(FRONTPAGE_URL)
+
+
+def parse_frontpage_toc(html_data):
+    return extract_frontpage_items(html_data)
 
 
 def extract_title(soup):
@@ -467,12 +479,29 @@ IS_ARTICLE = 2
 MAYBE_ARTICLE = 3
 
 
-def detect_page_type(url):
-    current_item_count = len(try_extract_frontpage_items(url)[0])
-    frontpage_item_count = len(get_frontpage_toc()[0])
+# the real frontpage lists dozens of stories
+MIN_FRONTPAGE_ITEM_COUNT = 20
+
+
+def is_frontpage_url(url):
+    return urlparse.urlsplit(url).path in ('', '/')
+
+
+def detect_page_type(html_data, url):
+    """
+    Tells the frontpage (which some urls redirect to) from an article, from the page alone.
+    """
+    current_item_count = len(extract_frontpage_items(html_data)[0])
     if current_item_count == 0:
         return IS_ARTICLE
-    elif float(current_item_count) / frontpage_item_count < 0.8:
+    if is_frontpage_url(url):
+        return IS_FRONTPAGE
+
+    # articles can list a few other stories, but they have a title of their own
+    soup = bs4.BeautifulSoup(html_data)
+    if soup.find(attrs={"class": "k1 mrg"}):
+        return IS_ARTICLE
+    if current_item_count < MIN_FRONTPAGE_ITEM_COUNT:
         return MAYBE_ARTICLE
     else:
         return IS_FRONTPAGE
@@ -500,16 +529,21 @@ def is_404_page(html_data):
 
 
 def extract_article_data(source):
-    # url is either a file-like object, or a url.
-    # if it's a file we just open it, assume it's an article and extract article data
+    """
+    source is either a file-like object, or a url.
+    """
+    return utils.fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
 
-    if hasattr(source, 'read'):
-        html_data = source.read()
-    # if it's an url we need to check if it's a photo album, a link to the frontpage or a true article
-    else:
-        html_data = utils.fetch_html_content(source)
 
-        page_type = detect_page_type(source)
+def parse_article(html_data, source):
+    """
+    Extracts the article data from raw html.
+
+    If it's a file we assume it's an article and extract article data.
+    If it comes from an url we need to check if it's a photo album, a link to the frontpage or a true article.
+    """
+    if not hasattr(source, 'read'):
+        page_type = detect_page_type(html_data, source)
         if page_type == IS_FRONTPAGE:
             return None, None
         elif page_type == MAYBE_ARTICLE:
@@ -3,13 +3,12 @@
 import codecs
 from datetime import datetime
 import urllib
-import urllib2
 import itertools as it
 from urlparse import urlparse
 
 from scrapy.selector import HtmlXPathSelector
 
-from parser_tools.utils import fetch_content_from_url, fetch_html_content
+from parser_tools.utils import fetch_content_from_url, fetch_html_content, fetch_and_parse_article
 from parser_tools.utils import extract_plaintext_urls_from_text, remove_text_formatting_markup_from_fragments
 from parser_tools.utils import remove_text_formatting_and_links_from_fragments
 from parser_tools.utils import convert_utf8_url_to_ascii
@@ -151,6 +150,12 @@ SUDINFO_OWN_DOMAIN = 'sudinfo.be'
 SOURCE_TITLE = u"Sud Info"
 SOURCE_NAME = u"sudinfo"
 
+MISSING_PAGE_HTTP_CODES = (404,)
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = rossel_utils.SYNDICATION_GROUP
+
+
 def extract_date(hxs):
     date_string = u"".join(hxs.select("//p[@class='publiele']//text()").extract())
     date_bytestring = codecs.encode(date_string, 'utf-8')
@@ -435,19 +440,14 @@ def is_page_error_404(hxs):
 
 def extract_article_data(source):
     """
+    source is either a file-like object, or a url.
     """
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
 
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
+
+def parse_article(html_content, source):
+    if not hasattr(source, 'read'):
         source = convert_utf8_url_to_ascii(source)
-        try:
-            html_content = fetch_html_content(source)
-        except urllib2.HTTPError as err:
-            if err.code == 404:
-                return None, "<html><head><title>404</title></head><body></body></html>"
-            else:
-                raise err
 
     hxs = HtmlXPathSelector(text=html_content)
 
@@ -509,6 +509,7 @@ def separate_blogposts_and_news(titles_and_urls):
     return news_items, blogpost_items
 
 
+# no FRONTPAGE_URL for the queue filler: the regional page has to be polled even when the frontpage did not change
 def get_frontpage_toc():
     BASE_URL = u'http://www.sudinfo.be/'
     html_content = fetch_content_from_url(BASE_URL)
@@ -6,7 +6,7 @@ import urllib
 import re
 import BeautifulSoup as bs
 from parser_tools.utils import make_soup_from_html_content, fetch_content_from_url, fetch_html_content
-from parser_tools.utils import extract_plaintext_urls_from_text
+from parser_tools.utils import extract_plaintext_urls_from_text, fetch_and_parse_article
 from parser_tools.utils import remove_text_formatting_markup_from_fragments, remove_text_formatting_and_links_from_fragments
 from parser_tools.utils import setup_locales
 from csxj.common.tagging import classify_and_tag, make_tagged_url, update_tagged_urls, print_taggedURLs
@@ -34,6 +34,11 @@ SUDPRESSE_OWN_NETLOC = 'www.sudpresse.be'
 SOURCE_TITLE = u"Sud Presse"
 SOURCE_NAME = u"sudpresse"
 
+MISSING_PAGE_HTTP_CODES = ()
+
+# the sister sources which may publish the same stories
+SYNDICATION_GROUP = rossel_utils.SYNDICATION_GROUP
+
 
 def extract_category(content):
     breadcrumbs = content.find('p', {'class': 'ariane'})
@@ -201,12 +206,12 @@ coveritlive_title_massage_functions = [
 
 def extract_article_data(source):
     """
+    source is either a file-like object, or a url.
     """
-    if hasattr(source, 'read'):
-        html_content = source.read()
-    else:
-        html_content = fetch_html_content(source)
+    return fetch_and_parse_article(source, parse_article, MISSING_PAGE_HTTP_CODES)
+
 
+def parse_article(html_content, source):
     soup = make_soup_from_html_content(html_content, additional_massage_functions=coveritlive_title_massage_functions)
 
     if is_page_error_404(soup):
@@ -349,6 +354,7 @@ def make_full_url(prefix, titles_and_urls):
     return [(title, urllib.basejoin(prefix, url)) for title, url in titles_and_urls]
 
 
+# no FRONTPAGE_URL for the queue filler: the regional page has to be polled even when the frontpage did not change
 def get_frontpage_toc():
     url = 'http://sudpresse.be/'
     html_content = fetch_content_from_url(url)
@@ -1,6 +1,10 @@
 LAST_STORIES_FILENAME = 'last_frontpage_list.json'
 LAST_BLOGPOSTS_FILENAME = 'last_blogposts_list.json'
 LAST_PAYWALLED_ARTICLES_FILENAME = 'last_paywalled_articles.json'
+FRONTPAGE_CACHE_FILENAME = 'frontpage_cache.json'
+SEEN_URLS_FILENAME = 'seen_urls.idx'
+TOMBSTONES_FILENAME = 'tombstones.jsonl'
+SQLITE_DB_FILENAME = 'csxj.sqlite'
 LOG_PATH = "logs"
 
 ARTICLES_FILENAME = 'articles.json'
@@ -9,12 +13,17 @@ PAYWALLED_ARTICLES_FILENAME = 'paywalled_articles.json'
 ERRORS_FILENAME = 'errors.json'
 ERRORS2_FILENAME = 'errors2.json'
 DELETED_ARTICLES_FILENAME = 'deleted_articles.json'
+SYNDICATED_ARTICLES_FILENAME = 'syndicated_articles.json'
 METAINFO_FILENAME = 'cached_metainfo.json'
 RAW_DATA_INDEX_FILENAME = 'references.json'
+RAW_DATA_PACK_FILENAME = 'raw_data.pack'
 REPROCESSED_DIR_PREFIX = 'reprocessed'
 
 RAW_DATA_DIR = 'raw_data'
 ERRORS_RAW_DATA_DIR = 'errors_raw_data'
 QUEUE_DIR = 'queue'
+OBJECTS_DIR = 'objects'
+SYNDICATION_DIR = 'syndication'
+DICTIONARIES_DIR = 'dictionaries'
 
 QUEUE_ERROR_LOG_FILENAME = 'queue_errors.json'
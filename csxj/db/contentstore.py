@@ -0,0 +1,230 @@
+"""
+Content-addressed storage of raw html, so that a page is stored only once.
+
+The same html used to end up on disk several times: in the batch which
+downloaded it, in errors_raw_data/, then in every reprocessed_* directory.
+Each source now has a content store, in its objects/ directory, where pages
+are kept under the sha1 of their content. The packs of the batches (see
+rawpack.py) hold "sha1:<hash>" references to them instead of the pages.
+
+Pages are appended to data files (NNNNNN.dat, a new one when the last one
+gets over MAX_DATA_FILE_SIZE), compressed like they are in packs. Where
+each page is, is kept in index.sqlite. Downloaders of the same source can
+share a store: appending is serialized with a lock file.
+
+Stores are never cleaned up: removing a batch leaves its pages behind.
+"""
+
+import os
+import fcntl
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from constants import OBJECTS_DIR, RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_INDEX_FILENAME, RAW_DATA_PACK_FILENAME
+# a module import: rawpack imports this module as well
+import rawpack
+
+
+INDEX_FILENAME = 'index.sqlite'
+LOCK_FILENAME = 'lock'
+DATA_FILE_EXTENSION = '.dat'
+
+MAX_DATA_FILE_SIZE = 512 * 1024 * 1024
+
+# seconds a writer waits for another process to release the index
+LOCK_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    data_file TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def hash_content(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+class ContentStore(object):
+    def __init__(self, source_directory):
+        self.directory = os.path.join(source_directory, OBJECTS_DIR)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.connection = sqlite3.connect(os.path.join(self.directory, INDEX_FILENAME), timeout=LOCK_TIMEOUT,
+                                          check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        # the replay server reads pages from its own threads
+        self.thread_lock = threading.Lock()
+        # pages given to put(), and how many of them were already stored
+        self.put_count = 0
+        self.deduplicated_count = 0
+
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self.directory, LOCK_FILENAME), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def lookup(self, content_hash):
+        """
+        Returns (data file, offset, length, codec, size), or None if the store does not have it.
+        """
+        rows = self.connection.execute("SELECT data_file, offset, length, codec, size FROM objects WHERE hash = ?",
+                                       (content_hash,)).fetchall()
+        return rows[0] if rows else None
+
+    def __contains__(self, content_hash):
+        with self.thread_lock:
+            return self.lookup(content_hash) is not None
+
+    def get_data_files(self):
+        return sorted(f for f in os.listdir(self.directory) if f.endswith(DATA_FILE_EXTENSION))
+
+    def get_current_data_file(self):
+        data_files = self.get_data_files()
+        if data_files and os.path.getsize(os.path.join(self.directory, data_files[-1])) < MAX_DATA_FILE_SIZE:
+            return data_files[-1]
+        return "{0:06d}{1}".format(len(data_files), DATA_FILE_EXTENSION)
+
+    def put(self, html_content, compress=True, dictionary=None):
+        """
+        Stores a page, unless the store already has it. Returns its hash.
+        """
+        if isinstance(html_content, unicode):
+            html_content = html_content.encode('utf-8')
+        content_hash = hash_content(html_content)
+        with self.thread_lock:
+            self.put_count += 1
+            if self.lookup(content_hash) is not None:
+                self.deduplicated_count += 1
+                return content_hash
+
+            record, codec = rawpack.encode_record(html_content, compress, dictionary)
+            with self.locked():
+                # another downloader might have stored it in the meantime
+                if self.lookup(content_hash) is not None:
+                    self.deduplicated_count += 1
+                    return content_hash
+                data_file = self.get_current_data_file()
+                with open(os.path.join(self.directory, data_file), 'ab') as f:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell()
+                    f.write(record)
+                    # the index row must never point past what actually made it to the disk
+                    f.flush()
+                    os.fsync(f.fileno())
+                with self.connection:
+                    self.connection.execute("INSERT INTO objects (hash, data_file, offset, length, codec, size) VALUES (?, ?, ?, ?, ?, ?)",
+                                            (content_hash, data_file, offset, len(record), codec, len(html_content)))
+        return content_hash
+
+    def get(self, content_hash):
+        """
+        Returns the html stored under a hash.
+
+        Raises IOError if the store does not have it.
+        """
+        with self.thread_lock:
+            stored_object = self.lookup(content_hash)
+        if stored_object is None:
+            raise IOError("No page {0} in {1}".format(content_hash, self.directory))
+        data_file, offset, length, codec, size = stored_object
+        data_filename = os.path.join(self.directory, data_file)
+        with open(data_filename, 'rb') as f:
+            f.seek(offset)
+            record = f.read(length)
+        return rawpack.decode_record(record, codec, data_filename)
+
+    def get_stored_lengths(self):
+        """
+        Returns a dict of hash: bytes taken by the page in the store.
+        """
+        with self.thread_lock:
+            return dict(self.connection.execute("SELECT hash, length FROM objects").fetchall())
+
+    def get_usage(self):
+        """
+        Returns (page count, bytes taken, uncompressed bytes) for the whole store.
+        """
+        with self.thread_lock:
+            [(count, length, size)] = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(size), 0) FROM objects").fetchall()
+        return count, length, size
+
+
+# stores are shared by everything touching the same source in a process
+opened_stores = dict()
+opened_stores_lock = threading.Lock()
+
+
+def get_content_store(source_directory):
+    key = os.path.abspath(source_directory)
+    with opened_stores_lock:
+        if key not in opened_stores:
+            opened_stores[key] = ContentStore(source_directory)
+        return opened_stores[key]
+
+
+def find_content_store(filepath):
+    """
+    Returns the content store of the source a pack belongs to.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    while True:
+        if os.path.exists(os.path.join(directory, OBJECTS_DIR, INDEX_FILENAME)):
+            return get_content_store(directory)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise IOError("No content store found for {0}".format(filepath))
+        directory = parent
+
+
+def measure_raw_data_usage(source_directory):
+    """
+    Returns a dict describing the space taken by the raw html of a source:
+
+        page_count             pages referenced by the batches
+        unique_page_count      different pages among them, in the content store
+        pack_bytes             packs, without the pages they refer to
+        unpacked_bytes         older batches, one file per page
+        store_bytes            content store, data files and index
+        deduplicated_bytes     saved by storing the pages once, rather than once per batch
+    """
+    usage = dict(page_count=0, unique_page_count=0, pack_bytes=0, unpacked_bytes=0, store_bytes=0, deduplicated_bytes=0)
+    store_directory = os.path.join(source_directory, OBJECTS_DIR)
+    stored_lengths = dict()
+    if os.path.exists(os.path.join(store_directory, INDEX_FILENAME)):
+        stored_lengths = get_content_store(source_directory).get_stored_lengths()
+        usage['store_bytes'] = sum(os.path.getsize(os.path.join(store_directory, f)) for f in os.listdir(store_directory))
+
+    referenced_hashes = set()
+    referenced_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(source_directory):
+        if dirpath == store_directory:
+            continue
+        if RAW_DATA_PACK_FILENAME in filenames:
+            pack_filename = os.path.join(dirpath, RAW_DATA_PACK_FILENAME)
+            usage['pack_bytes'] += os.path.getsize(pack_filename)
+            with rawpack.RawDataPack(pack_filename) as pack:
+                for kind, url, offset, length, codec in pack.index:
+                    usage['page_count'] += 1
+                    if codec.startswith(rawpack.CONTENT_HASH_PREFIX):
+                        content_hash = codec[len(rawpack.CONTENT_HASH_PREFIX):]
+                        referenced_hashes.add(content_hash)
+                        referenced_bytes += stored_lengths.get(content_hash, 0)
+        if os.path.basename(dirpath) in (RAW_DATA_DIR, ERRORS_RAW_DATA_DIR) and RAW_DATA_INDEX_FILENAME in filenames:
+            usage['page_count'] += len(filenames) - 1
+            usage['unpacked_bytes'] += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+
+    usage['unique_page_count'] = len(referenced_hashes)
+    usage['deduplicated_bytes'] = referenced_bytes - sum(stored_lengths.get(h, 0) for h in referenced_hashes)
+    return usage
@@ -19,7 +19,7 @@ def get_all_provider_names(db_root):
 
     Returns a list of string, one for each content provider.
     """
-    subdirs = utils.get_subdirectories(db_root)
+    subdirs = [d for d in utils.get_subdirectories(db_root) if d not in (SYNDICATION_DIR, DICTIONARIES_DIR)]
     subdirs.sort()
     return subdirs
 
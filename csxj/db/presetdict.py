@@ -0,0 +1,192 @@
+"""
+Per-source preset dictionaries for compressing raw html.
+
+The pages of a source share most of their template (headers, navigation,
+footers, script blocks), which gzip cannot take advantage of since every
+file is compressed on its own. A preset dictionary holds the strings those
+pages have in common: deflate starts each page with the dictionary already
+in its window, and refers back to it instead of spelling out the template.
+
+Python 2's zlib has no zdict argument, so the dictionary is fed to a raw
+deflate stream which is then flushed (Z_SYNC_FLUSH): the compressor and
+decompressor left in that state are copied for each page, and only what
+comes after the flush is stored. That is what zdict does, one level up.
+
+Dictionaries are trained by csxj_train_dictionary.py and kept in the
+database, as db_root/dictionaries/<source>/<version>.zdict. They are never
+modified once written: pages record which version they were compressed
+with, a new training adds a new version.
+"""
+
+import os
+import re
+import zlib
+import random
+import threading
+from collections import defaultdict
+
+from constants import DICTIONARIES_DIR
+
+
+DICTIONARY_EXTENSION = '.zdict'
+
+# deflate cannot refer further back than this, the rest of a dictionary would be wasted
+MAX_DICTIONARY_SIZE = 32 * 1024 - 262
+
+# segments shorter than this are not worth a back reference of their own
+MIN_SEGMENT_LENGTH = 8
+
+# only the segments found in at least this share of the sample pages go in the dictionary
+MIN_DOCUMENT_SHARE = 0.1
+
+COMPRESSION_LEVEL = 6
+
+# long lines (minified html) are cut after each tag
+MAX_LINE_LENGTH = 256
+TAG_END = re.compile(r'(?<=>)')
+
+
+class PresetDictionary(object):
+    def __init__(self, dictionary_id, content):
+        """
+        dictionary_id is "<source>/<version>", stored with each compressed page.
+        """
+        self.id = dictionary_id
+        self.content = content[-MAX_DICTIONARY_SIZE:]
+
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        priming = compressor.compress(self.content) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        decompressor.decompress(priming)
+
+        self.compressor = compressor
+        self.decompressor = decompressor
+
+    def compress(self, data):
+        compressor = self.compressor.copy()
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH)
+
+    def decompress(self, data):
+        decompressor = self.decompressor.copy()
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+def split_segments(html_content):
+    for line in html_content.splitlines(True):
+        if len(line) > MAX_LINE_LENGTH:
+            for segment in TAG_END.split(line):
+                yield segment
+        else:
+            yield line
+
+
+def train_dictionary(pages, size=MAX_DICTIONARY_SIZE):
+    """
+    Builds a dictionary from a sample of pages of a source.
+
+    Lines (or tags, on minified pages) are scored by their length times the number of
+    pages they appear in. The best ones are kept, the most valuable at the end of the
+    dictionary, where the back references to them are the shortest.
+    """
+    document_frequencies = defaultdict(int)
+    for html_content in pages:
+        for segment in set(split_segments(html_content)):
+            if len(segment.strip()) >= MIN_SEGMENT_LENGTH:
+                document_frequencies[segment] += 1
+
+    min_document_frequency = max(2, int(MIN_DOCUMENT_SHARE * len(pages)))
+    scored_segments = [(len(segment) * frequency, segment) for (segment, frequency) in document_frequencies.iteritems()
+                       if frequency >= min_document_frequency]
+    scored_segments.sort(reverse=True)
+
+    selected, selected_size = list(), 0
+    for score, segment in scored_segments:
+        if selected_size + len(segment) > size:
+            continue
+        selected.append(segment)
+        selected_size += len(segment)
+    selected.reverse()
+    return ''.join(selected)
+
+
+def sample_pages(pages, sample_size, seed=None):
+    pages = list(pages)
+    if len(pages) <= sample_size:
+        return pages
+    return random.Random(seed).sample(pages, sample_size)
+
+
+def get_dictionary_directory(db_root, source_name):
+    return os.path.join(db_root, DICTIONARIES_DIR, source_name)
+
+
+def get_dictionary_versions(db_root, source_name):
+    directory = get_dictionary_directory(db_root, source_name)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(f[:-len(DICTIONARY_EXTENSION)]) for f in os.listdir(directory)
+                  if f.endswith(DICTIONARY_EXTENSION) and f[:-len(DICTIONARY_EXTENSION)].isdigit())
+
+
+def save_dictionary(db_root, source_name, content):
+    """
+    Stores a new version of a source's dictionary. Returns its version.
+    """
+    directory = get_dictionary_directory(db_root, source_name)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    versions = get_dictionary_versions(db_root, source_name)
+    version = versions[-1] + 1 if versions else 1
+    filename = os.path.join(directory, "{0}{1}".format(version, DICTIONARY_EXTENSION))
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(content)
+    os.rename(tmp_filename, filename)
+    return version
+
+
+# dictionaries never change once written, so they are loaded once per process
+loaded_dictionaries = dict()
+loaded_dictionaries_lock = threading.Lock()
+
+
+def load_dictionary(db_root, dictionary_id):
+    """
+    Returns the PresetDictionary for a "<source>/<version>" id.
+
+    Raises IOError if the database has no such dictionary.
+    """
+    filename = os.path.join(db_root, DICTIONARIES_DIR, dictionary_id + DICTIONARY_EXTENSION)
+    key = os.path.abspath(filename)
+    with loaded_dictionaries_lock:
+        if key not in loaded_dictionaries:
+            with open(filename, 'rb') as f:
+                loaded_dictionaries[key] = PresetDictionary(dictionary_id, f.read())
+        return loaded_dictionaries[key]
+
+
+def load_latest_dictionary(db_root, source_name):
+    """
+    Returns the newest dictionary of a source, or None if it has none.
+    """
+    versions = get_dictionary_versions(db_root, source_name)
+    if not versions:
+        return None
+    return load_dictionary(db_root, "{0}/{1}".format(source_name, versions[-1]))
+
+
+def find_dictionary(filepath, dictionary_id):
+    """
+    Loads the dictionary a page was compressed with, from the database the page is in.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    while True:
+        if os.path.isdir(os.path.join(directory, DICTIONARIES_DIR)):
+            try:
+                return load_dictionary(directory, dictionary_id)
+            except IOError:
+                pass
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise IOError("No dictionary {0} found for {1}".format(dictionary_id, filepath))
+        directory = parent
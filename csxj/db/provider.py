@@ -6,22 +6,24 @@ This is how a typical database looks like:
 - provider1
   - stats.json
   - last_frontpage_list.json
+  - seen_urls.idx (and its .bloom filter, see seenurls.py)
+  - objects/ (the raw html, stored once, see contentstore.py)
+  - queue/
+    - journal.jsonl
+    - cursor.json
   - YYYY-MM-DD/
     - cached_metainfo.json
     - HH.MM.SS/
         - articles.json
-        - raw_data/
+        - raw_data.pack (the raw html of the batch, or references to objects/, see rawpack.py)
+        - raw_data/ (older batches)
             - references.json
-            - 0.html
-            - 1.html
+            - 0.html.gz (0.html in even older batches)
+            - 1.html.gz
             - ...
         - reprocessed_YYYY-MM-DD_HH.MM.SS/
             - articles.json
-            - raw_data/
-                - references.json
-                - 0.html
-                - 1.html
-                - ...
+            - raw_data.pack (or raw_data/)
     - HH.MM.SS
     - HH.MM.SS
     - ...
@@ -38,12 +40,13 @@ import os
 from datetime import datetime, timedelta
 from collections import namedtuple, defaultdict
 import json
-import shutil
 
 import utils
+import rawdata
 from article import ArticleData
 from csxj.common.decorators import deprecated
 from constants import *
+from queuejournal import QueueJournal, DEFAULT_LEASE_DURATION
 
 
 
@@ -63,6 +66,13 @@ def make_error_log_entry2(url, title, stacktrace):
     return ErrorLogEntry2(url, title, stacktrace)
 
 
+def write_json_file(data, directory, filename):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, filename), 'w') as f:
+        json.dump(data, f)
+
+
 class NonExistentDayError(Exception):
     def __init__(self, provider_name, date_string):
         super(NonExistentDayError, self).__init__()
@@ -86,6 +96,14 @@ class Provider(object):
     def __init__(self, db_root, provider_name):
         self.db_root = db_root
         self.name = provider_name
+        self._queue = None
+
+
+    def close(self):
+        """
+        The json files are not kept open, the SQLite provider has a connection to close.
+        """
+        pass
 
 
     @property
@@ -115,7 +133,7 @@ class Provider(object):
         The list is sorted on the date (earlier date at the front)
         """
 
-        all_days = [d for d in utils.get_subdirectories(self.directory) if d != QUEUE_DIR]
+        all_days = [d for d in utils.get_subdirectories(self.directory) if d not in (QUEUE_DIR, OBJECTS_DIR)]
         all_days.sort()
         result = list()
         for date_string in all_days:
@@ -128,7 +146,7 @@ class Provider(object):
         """
         Returns a sorted list of all the dates (formatted as: YYYY-MM-DD) for which there is data available
         """
-        all_days = [d for d in utils.get_subdirectories(self.directory) if d != QUEUE_DIR]
+        all_days = [d for d in utils.get_subdirectories(self.directory) if d not in (QUEUE_DIR, OBJECTS_DIR)]
         all_days.sort()
         return all_days
 
@@ -425,71 +443,120 @@ class Provider(object):
             return {"blogposts":[]}
 
 
+    def get_raw_html(self, date_string, batch_time_string, url):
+        """
+        Returns the html of a page, as it was downloaded for a batch, or None if the
+        batch did not download that url. Packed or not, compressed or not.
+        """
+        batch_directory = os.path.join(self.directory, date_string, batch_time_string)
+        if not os.path.isdir(batch_directory):
+            raise NonExistentBatchError(self.name, date_string, batch_time_string)
+        return rawdata.find_raw_html(batch_directory, url)
+
+
+    ### Writing batches
+    def save_batch_content(self, date_string, batch_time_string, batch_directory,
+                           articles, deleted_articles, errors, blogposts, paywalled_articles, syndicated_articles=None):
+        """
+        Stores what was downloaded for a batch: ArticleData instances, ErrorLogEntry2
+        instances, and lists of (title, url) for the rest.
+
+        The json files are written to batch_directory, which the downloader moves in
+        place once the raw html is there too.
+        """
+        write_json_file({'articles': [art.to_json() for art in articles], 'errors': []}, batch_directory, ARTICLES_FILENAME)
+        write_json_file({'blogposts': blogposts}, batch_directory, BLOGPOSTS_FILENAME)
+        write_json_file({'deleted_articles': deleted_articles}, batch_directory, DELETED_ARTICLES_FILENAME)
+        write_json_file({'errors': errors}, batch_directory, ERRORS2_FILENAME)
+        write_json_file({'paywalled_articles': paywalled_articles}, batch_directory, PAYWALLED_ARTICLES_FILENAME)
+        if syndicated_articles:
+            write_json_file({'syndicated_articles': syndicated_articles}, batch_directory, SYNDICATED_ARTICLES_FILENAME)
+
+
     ### Queue management
-    def cleanup_queue(self, day_string):
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = QueueJournal(os.path.join(self.directory, QUEUE_DIR))
+        return self._queue
+
+
+    def requeue_items(self, day_string, items):
         """
-        Removes the queued items for a certain date. Should be called only after
-        a successfull crawling session.
+        Puts items back in the queue for a day, as a new batch.
+
+        The batch is named after the current time, so that it does not
+        overwrite the output of the batch these items were taken from.
+        Returns the name of the new batch.
         """
-        day_queue_directory = os.path.join(self.directory, QUEUE_DIR, day_string)
-        if os.path.exists(day_queue_directory):
-            shutil.rmtree(day_queue_directory)
+        queued_batch_names = set((b.day, b.batch) for b in self.queue.get_pending_batches())
+
+        batch_time = datetime.today()
+        batch_hour_string = batch_time.strftime("%H.%M.%S")
+        while (day_string, batch_hour_string) in queued_batch_names or \
+              os.path.exists(os.path.join(self.directory, day_string, batch_hour_string)):
+            batch_time += timedelta(seconds=1)
+            batch_hour_string = batch_time.strftime("%H.%M.%S")
+
+        self.queue.enqueue(day_string, batch_hour_string, items)
+        return batch_hour_string
 
 
 
     def get_queued_batches_by_day(self):
         """
         Each datasource directory contains a 'queue' directory in which items' urls
-        are stored for delayed download.
+        are stored for delayed download (see queuejournal.py).
 
-        Under the 'queue' directory,
+        Returns a list of (day, [(batch_hour, items)]) for all the batches
+        which were not downloaded yet, sorted by day and hour. Every 'items' dict
+        contains lists of (title, url) pairs: one for the actual news stories,
+        and one for the occasionally promoted blogposts.
         """
-        queue_directory = os.path.join(self.directory, QUEUE_DIR)
-        batched_days = utils.get_subdirectories(queue_directory)
-        batches_by_day = list()
-        for day_string in batched_days:
-            day_directory = os.path.join(queue_directory, day_string)
-            batches_by_day.append((day_string, self.get_queued_items_by_batch(day_directory)))
+        batches_by_day = defaultdict(list)
+        for queued_batch in self.queue.get_pending_batches():
+            batches_by_day[queued_batch.day].append((queued_batch.batch, queued_batch.items))
 
-        batches_by_day.sort(key=lambda day_batches: day_batches[0])
-        return batches_by_day
+        for batches in batches_by_day.values():
+            batches.sort(key=lambda batch: batch[0])
+        return sorted(batches_by_day.items(), key=lambda day_batches: day_batches[0])
 
 
 
-    def get_queued_items_by_batch(self, day_directory):
+    def claim_queued_batch(self, owner, lease_duration=DEFAULT_LEASE_DURATION, scheduling_policy=None):
+        """
+        Leases the next batch to download, so that other downloaders leave it alone.
+        The scheduling policy (see csxj/scheduling.py) picks that batch, by default the
+        first one queued.
+        Returns a QueuedBatch (day, batch, items, ...) or None if the queue is empty.
         """
-        Queued items for a day are stored in json files, one for every batch.
-        The hierarchy looks like:
+        return self.queue.claim_next(owner, lease_duration, scheduling_policy)
 
-         - 2011-26-11/
-            - ...
-            - 21.00.00.json
-            - 22.00.00.json
-            - ...
 
-        Every file contains two lists of (title, url) pairs: one for the actual
-        news stories, and one for the occasionally promoted blogposts.
-        """
-        items_by_batch = list()
-        for batch_file in utils.get_json_files(day_directory):
-            batch_hour = batch_file[:-5]
-            with open(os.path.join(day_directory, batch_file)) as f:
-                items = json.load(f)
-                items_by_batch.append((batch_hour, items))
-        items_by_batch.sort(key=lambda batch: batch[0])
-        return items_by_batch
+    def renew_queued_batch_lease(self, queued_batch, owner, lease_duration=DEFAULT_LEASE_DURATION):
+        return self.queue.renew(queued_batch, owner, lease_duration)
 
 
+    def release_queued_batch(self, queued_batch, owner):
+        self.queue.release(queued_batch, owner)
 
-    def get_queued_items_count(self):
-        queue_directory = os.path.join(self.directory, QUEUE_DIR)
-        batched_days = utils.get_subdirectories(queue_directory)
-        item_count = 0
 
-        for day_string in batched_days:
-            day_directory = os.path.join(queue_directory, day_string)
-            item_count += self.get_item_count_for_day(day_directory)
+    def commit_queued_batch(self, queued_batch):
+        """
+        Removes a claimed batch from the queue, once it has been downloaded.
+        """
+        self.queue.commit(queued_batch)
+
 
+    def get_queue_depth(self):
+        """
+        Returns the number of (batches, articles) waiting in the queue.
+        """
+        return self.queue.get_depth()
+
+
+    def get_queued_items_count(self):
+        batch_count, item_count = self.queue.get_depth()
         return item_count
 
 
@@ -0,0 +1,319 @@
+"""
+Append-only journal of the batches queued for download.
+
+Everything lives in the source's 'queue' directory:
+
+ - journal.jsonl: one line per queued batch, {"day": ..., "batch": ..., "items": ...}.
+   The filler only ever appends to it.
+ - cursor.json: where the downloader is in the journal. Every batch before
+   'offset' has been downloaded; so have the ones listed in 'committed'
+   (batches can be committed out of order). Also counts what was consumed.
+ - enqueued.json: counts what was appended, so that the queue depth is the
+   difference of two small counters, whatever the size of the journal. It
+   also records how much of the journal it counted: lines a crashed filler
+   appended without counting them are counted when it is read.
+ - leases.json: the batches claimed by downloaders, and until when.
+ - journal.lock: serializes the writers, with flock().
+
+Several downloaders, possibly on several machines sharing the filesystem,
+can drain the same queue: each of them claims a batch, which leases it for
+a while, downloads it and commits it. A downloader which dies leaves its
+lease behind; once it expires, the batch can be claimed again. Leases
+compare wall clock times, so the machines' clocks should be kept in sync.
+
+Once every batch has been consumed, the journal is truncated, and the
+cursor's 'generation' goes up so that offsets into the old journal are
+never mistaken for offsets into the new one.
+
+Queues from older versions (one json file per batch, in a directory per
+day) are moved to the journal by the first writer. Until then, reading the
+queue lists them as they are: reads never modify anything.
+"""
+
+import os
+import json
+import time
+import errno
+import fcntl
+import shutil
+from collections import namedtuple
+from contextlib import contextmanager
+
+import utils
+
+
+JOURNAL_FILENAME = 'journal.jsonl'
+CURSOR_FILENAME = 'cursor.json'
+ENQUEUED_COUNTS_FILENAME = 'enqueued.json'
+LOCK_FILENAME = 'journal.lock'
+LEASES_FILENAME = 'leases.json'
+
+# seconds a claimed batch stays out of the other downloaders' reach
+DEFAULT_LEASE_DURATION = 15 * 60
+
+
+QueuedBatch = namedtuple('QueuedBatch', 'generation offset end_offset day batch items')
+
+
+def count_articles(items):
+    return len(items.get('articles', []))
+
+
+def write_json_atomically(data, filename):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_filename, filename)
+
+
+def read_json(filename, default):
+    if os.path.exists(filename):
+        with open(filename, 'r') as f:
+            return json.load(f)
+    return default
+
+
+class QueueJournal(object):
+    def __init__(self, queue_directory):
+        self.directory = queue_directory
+        self.journal_filename = os.path.join(queue_directory, JOURNAL_FILENAME)
+        self.cursor_filename = os.path.join(queue_directory, CURSOR_FILENAME)
+        self.enqueued_counts_filename = os.path.join(queue_directory, ENQUEUED_COUNTS_FILENAME)
+        self.lock_filename = os.path.join(queue_directory, LOCK_FILENAME)
+        self.leases_filename = os.path.join(queue_directory, LEASES_FILENAME)
+
+    def exists(self):
+        return os.path.exists(self.directory)
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_filename, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked_for_writing(self):
+        """
+        Holds the lock, once the queue directory exists and any legacy queue is in the journal.
+        """
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        with self.locked():
+            self.migrate_legacy_queue()
+            yield
+
+    def read_cursor(self):
+        return read_json(self.cursor_filename, dict(generation=0, offset=0, committed=dict(), batches=0, articles=0))
+
+    def read_leases(self):
+        return read_json(self.leases_filename, dict())
+
+    @staticmethod
+    def make_lease_key(queued_batch):
+        return "{0}:{1}".format(queued_batch.generation, queued_batch.offset)
+
+    def read_enqueued_counts(self):
+        """
+        The counts are written after the batch is appended: whatever was appended
+        after the part of the journal they cover is counted from the journal.
+        """
+        counts = read_json(self.enqueued_counts_filename, dict(batches=0, articles=0, generation=0, journal_size=0))
+        generation = self.read_cursor()['generation']
+        if counts['generation'] != generation:
+            # the journal was emptied since, once everything it held was consumed
+            counts['generation'], counts['journal_size'] = generation, 0
+        for queued_batch in self.iter_batches_from(generation, counts['journal_size'], dict()):
+            counts['batches'] += 1
+            counts['articles'] += count_articles(queued_batch.items)
+            counts['journal_size'] = queued_batch.end_offset
+        return counts
+
+    def enqueue(self, day_string, batch_hour_string, items):
+        """
+        Appends a batch to the journal.
+        """
+        with self.locked_for_writing():
+            self.append(day_string, batch_hour_string, items)
+
+    def append(self, day_string, batch_hour_string, items):
+        line = json.dumps(dict(day=day_string, batch=batch_hour_string, items=items)) + '\n'
+        with open(self.journal_filename, 'a+b') as f:
+            self.drop_partial_line(f)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        write_json_atomically(self.read_enqueued_counts(), self.enqueued_counts_filename)
+
+    @staticmethod
+    def drop_partial_line(f):
+        """
+        Truncates whatever a crashed writer left after the last complete line.
+        """
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == '\n':
+            return
+        f.seek(0)
+        content = f.read()
+        f.truncate(content.rfind('\n') + 1)
+
+    def get_pending_batches(self):
+        """
+        Returns the QueuedBatches which were not committed yet, in the order they were queued.
+
+        The batches of a legacy queue which was not moved to the journal yet come first, they
+        cannot be committed (their offsets are None).
+        """
+        if not self.exists():
+            return []
+        with self.locked():
+            cursor = self.read_cursor()
+            batches = list(self.iter_batches_from(cursor['generation'], cursor['offset'], self.get_committed_batches(cursor)))
+        return list(self.iter_legacy_batches()) + batches
+
+    def iter_batches_from(self, generation, offset, committed_offsets):
+        if not os.path.exists(self.journal_filename):
+            return
+        with open(self.journal_filename, 'rb') as f:
+            f.seek(offset)
+            for line in iter(f.readline, ''):
+                if not line.endswith('\n'):
+                    # still being written
+                    break
+                end_offset = offset + len(line)
+                if offset not in committed_offsets:
+                    entry = json.loads(line)
+                    yield QueuedBatch(generation, offset, end_offset, entry['day'], entry['batch'], entry['items'])
+                offset = end_offset
+
+    def commit(self, queued_batch):
+        """
+        Marks a batch as downloaded. The cursor only moves past batches once
+        all the batches before them have been committed too.
+        """
+        with self.locked_for_writing():
+            self.drop_lease(queued_batch)
+            cursor = self.read_cursor()
+            committed = self.get_committed_batches(cursor)
+            if queued_batch.generation != cursor['generation'] or \
+               queued_batch.offset < cursor['offset'] or queued_batch.offset in committed:
+                return
+            cursor['batches'] += 1
+            cursor['articles'] += count_articles(queued_batch.items)
+
+            committed[queued_batch.offset] = queued_batch.end_offset
+            offset = cursor['offset']
+            while offset in committed:
+                offset = committed.pop(offset)
+
+            if not committed and offset == os.path.getsize(self.journal_filename):
+                # everything has been consumed: start over with an empty journal
+                with open(self.journal_filename, 'r+b') as f:
+                    f.truncate(0)
+                offset = 0
+                cursor['generation'] += 1
+
+            cursor['offset'] = offset
+            cursor['committed'] = dict((str(k), v) for (k, v) in committed.items())
+            write_json_atomically(cursor, self.cursor_filename)
+
+    def claim_next(self, owner, lease_duration=DEFAULT_LEASE_DURATION, order=None):
+        """
+        Leases the next pending batch which nobody else holds. Expired leases are reclaimed.
+
+        `order` can sort the claimable batches, the first one is picked.
+        Returns the claimed QueuedBatch, or None if there is nothing left to claim.
+        """
+        with self.locked_for_writing():
+            cursor = self.read_cursor()
+            now = time.time()
+            leases = dict((k, lease) for (k, lease) in self.read_leases().items() if lease['expires'] > now)
+            claimable = [b for b in self.iter_batches_from(cursor['generation'], cursor['offset'], self.get_committed_batches(cursor))
+                         if self.make_lease_key(b) not in leases]
+            if order:
+                claimable = order(claimable)
+            if not claimable:
+                write_json_atomically(leases, self.leases_filename)
+                return None
+
+            queued_batch = claimable[0]
+            leases[self.make_lease_key(queued_batch)] = dict(owner=owner, expires=now + lease_duration)
+            write_json_atomically(leases, self.leases_filename)
+            return queued_batch
+
+    def renew(self, queued_batch, owner, lease_duration=DEFAULT_LEASE_DURATION):
+        """
+        Extends a lease. Returns False if it was lost to another downloader.
+        """
+        with self.locked_for_writing():
+            leases = self.read_leases()
+            lease = leases.get(self.make_lease_key(queued_batch))
+            if lease is None or lease['owner'] != owner:
+                return False
+            lease['expires'] = time.time() + lease_duration
+            write_json_atomically(leases, self.leases_filename)
+            return True
+
+    def release(self, queued_batch, owner):
+        """
+        Gives up a lease without committing the batch, so that someone else can claim it.
+        """
+        with self.locked_for_writing():
+            self.drop_lease(queued_batch, owner)
+
+    def drop_lease(self, queued_batch, owner=None):
+        leases = self.read_leases()
+        lease_key = self.make_lease_key(queued_batch)
+        if lease_key in leases and (owner is None or leases[lease_key]['owner'] == owner):
+            del leases[lease_key]
+            write_json_atomically(leases, self.leases_filename)
+
+    @staticmethod
+    def get_committed_batches(cursor):
+        """
+        Returns {offset: end offset} for the batches committed ahead of the cursor.
+        """
+        return dict((int(k), v) for (k, v) in cursor['committed'].items())
+
+    def get_depth(self):
+        """
+        Returns the number of (batches, articles) waiting in the queue.
+        """
+        if not self.exists():
+            return 0, 0
+        with self.locked():
+            enqueued, consumed = self.read_enqueued_counts(), self.read_cursor()
+        batch_count, article_count = enqueued['batches'] - consumed['batches'], enqueued['articles'] - consumed['articles']
+        for queued_batch in self.iter_legacy_batches():
+            batch_count += 1
+            article_count += count_articles(queued_batch.items)
+        return batch_count, article_count
+
+    def iter_legacy_batches(self):
+        for day_string in sorted(utils.get_subdirectories(self.directory)):
+            day_directory = os.path.join(self.directory, day_string)
+            for batch_file in sorted(utils.get_json_files(day_directory)):
+                with open(os.path.join(day_directory, batch_file)) as f:
+                    yield QueuedBatch(None, None, None, day_string, batch_file[:-5], json.load(f))
+
+    def migrate_legacy_queue(self):
+        """
+        Moves a legacy queue to the journal, with the lock held. Each batch file is
+        removed as soon as its batch is in the journal.
+        """
+        for queued_batch in list(self.iter_legacy_batches()):
+            self.append(queued_batch.day, queued_batch.batch, queued_batch.items)
+            os.remove(os.path.join(self.directory, queued_batch.day, queued_batch.batch + '.json'))
+        for day_string in utils.get_subdirectories(self.directory):
+            shutil.rmtree(os.path.join(self.directory, day_string))
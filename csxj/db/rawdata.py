@@ -0,0 +1,267 @@
+"""
+Reading and writing the raw html kept along with each batch.
+
+A raw_data/ (or errors_raw_data/) directory holds one file per page and a
+references.json index of (url, filename) pairs. Pages used to be written as
+plain N.html files, they are now gzipped as N.html.gz, or compressed with
+the source's preset dictionary as N.html.zd when it has one (see
+presetdict.py). Readers go through open_raw_html(), which picks the right
+one from the filename, so the old batches stay readable as they are.
+
+A .html.zd file starts with a "csxj-zd" line and a line holding the id of
+its dictionary, followed by the raw deflate data.
+
+Newer batches keep all their pages in a single raw_data.pack file instead
+(see rawpack.py). list_raw_pages() returns the pages of a raw_data
+directory either way: a page packed at position i of a pack is located
+as "<pack filename>#i", which open_raw_html() and read_raw_html() accept
+as well as file names.
+"""
+
+import os
+import json
+import gzip
+import shutil
+from cStringIO import StringIO
+
+from constants import RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_INDEX_FILENAME, RAW_DATA_PACK_FILENAME
+from presetdict import find_dictionary
+from rawpack import RawDataPack, write_pack, CONTENT_HASH_PREFIX
+
+
+COMPRESSED_RAW_HTML_EXTENSION = '.html.gz'
+PRESET_DICTIONARY_RAW_HTML_EXTENSION = '.html.zd'
+RAW_HTML_EXTENSION = '.html'
+
+PRESET_DICTIONARY_MAGIC = 'csxj-zd'
+
+PACKED_PAGE_SEPARATOR = '#'
+
+# html compresses about as well at 6 as at 9, for a fraction of the time
+COMPRESSION_LEVEL = 6
+
+
+def is_compressed(filename):
+    return filename.endswith('.gz')
+
+
+def uses_preset_dictionary(filename):
+    return filename.endswith(PRESET_DICTIONARY_RAW_HTML_EXTENSION)
+
+
+def encode_with_dictionary(html_content, dictionary):
+    return '\n'.join([PRESET_DICTIONARY_MAGIC, str(dictionary.id), dictionary.compress(html_content)])
+
+
+def decode_with_dictionary(data, filepath):
+    magic, dictionary_id, compressed_html = data.split('\n', 2)
+    if magic != PRESET_DICTIONARY_MAGIC:
+        raise ValueError("{0} was not compressed with a preset dictionary".format(filepath))
+    return find_dictionary(filepath, dictionary_id).decompress(compressed_html)
+
+
+class ClosingStringIO(object):
+    """
+    cStringIO objects cannot be used in a with statement.
+    """
+    def __init__(self, content):
+        self.f = StringIO(content)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __iter__(self):
+        return iter(self.f)
+
+    def __enter__(self):
+        return self.f
+
+    def __exit__(self, *exc_info):
+        self.f.close()
+
+
+def make_packed_page_location(pack_filename, i):
+    return u"{0}{1}{2}".format(pack_filename, PACKED_PAGE_SEPARATOR, i)
+
+
+def parse_packed_page_location(location):
+    """
+    Returns (pack filename, position) for a packed page, None for a file name.
+    """
+    pack_filename, separator, i = location.rpartition(PACKED_PAGE_SEPARATOR)
+    if separator and pack_filename.endswith(RAW_DATA_PACK_FILENAME) and i.isdigit():
+        return pack_filename, int(i)
+    return None
+
+
+def open_raw_html(filepath):
+    """
+    Returns a file-like object over the html, decompressed if needed.
+    """
+    if uses_preset_dictionary(filepath) or parse_packed_page_location(filepath):
+        return ClosingStringIO(read_raw_html(filepath))
+    if is_compressed(filepath):
+        return gzip.open(filepath, 'rb')
+    return open(filepath, 'r')
+
+
+def read_raw_html(filepath):
+    packed_page = parse_packed_page_location(filepath)
+    if packed_page:
+        pack_filename, i = packed_page
+        with RawDataPack(pack_filename) as pack:
+            return pack.get_by_index(i)
+    if uses_preset_dictionary(filepath):
+        with open(filepath, 'rb') as f:
+            return decode_with_dictionary(f.read(), filepath)
+    with open_raw_html(filepath) as f:
+        return f.read()
+
+
+def write_raw_html(filepath, html_content, dictionary=None):
+    if isinstance(html_content, unicode):
+        html_content = html_content.encode('utf-8')
+    if uses_preset_dictionary(filepath):
+        with open(filepath, 'wb') as f:
+            f.write(encode_with_dictionary(html_content, dictionary))
+        return
+    if is_compressed(filepath):
+        f = gzip.GzipFile(filepath, 'wb', COMPRESSION_LEVEL)
+    else:
+        f = open(filepath, 'w')
+    with f:
+        f.write(html_content)
+
+
+def make_raw_html_filename(i, compress=True, dictionary=None):
+    if dictionary:
+        extension = PRESET_DICTIONARY_RAW_HTML_EXTENSION
+    elif compress:
+        extension = COMPRESSED_RAW_HTML_EXTENSION
+    else:
+        extension = RAW_HTML_EXTENSION
+    return u"{0}{1}".format(i, extension)
+
+
+def load_raw_data_index(raw_data_dir):
+    """
+    Returns the list of (url, filename) of a raw_data directory.
+    """
+    with open(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME), 'r') as f:
+        return json.load(f)
+
+
+def get_pack_filename(raw_data_dir):
+    """
+    The pack holding the pages of a raw_data directory, next to where the directory would be.
+    """
+    return os.path.join(os.path.dirname(os.path.normpath(raw_data_dir)), RAW_DATA_PACK_FILENAME)
+
+
+def list_raw_pages(raw_data_dir):
+    """
+    Returns the list of (url, location) of the pages of a raw_data (or errors_raw_data)
+    directory, whether it was packed or not. Locations can be passed to read_raw_html().
+    """
+    if os.path.exists(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME)):
+        return [(url, os.path.join(raw_data_dir, filename)) for (url, filename) in load_raw_data_index(raw_data_dir)]
+    pack_filename = get_pack_filename(raw_data_dir)
+    if os.path.exists(pack_filename):
+        with RawDataPack(pack_filename) as pack:
+            references = pack.get_references(os.path.basename(os.path.normpath(raw_data_dir)))
+        return [(url, make_packed_page_location(pack_filename, i)) for (url, i) in references]
+    return []
+
+
+def iter_raw_data(raw_data_dir):
+    """
+    Yields (url, html content) for all the pages of a raw_data directory.
+    """
+    pack_filename = get_pack_filename(raw_data_dir)
+    if not os.path.exists(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME)) and os.path.exists(pack_filename):
+        with RawDataPack(pack_filename) as pack:
+            for url, i in pack.get_references(os.path.basename(os.path.normpath(raw_data_dir))):
+                yield url, pack.get_by_index(i)
+    else:
+        for url, filename in load_raw_data_index(raw_data_dir):
+            yield url, read_raw_html(os.path.join(raw_data_dir, filename))
+
+
+def find_raw_html(batch_directory, url):
+    """
+    Returns the archived html of a url in a batch, or None if the batch does not have it.
+    """
+    pack_filename = os.path.join(batch_directory, RAW_DATA_PACK_FILENAME)
+    if os.path.exists(pack_filename):
+        with RawDataPack(pack_filename) as pack:
+            html_content = pack.get(url)
+            if html_content is not None:
+                return html_content
+    for kind in (RAW_DATA_DIR, ERRORS_RAW_DATA_DIR):
+        raw_data_dir = os.path.join(batch_directory, kind)
+        if os.path.exists(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME)):
+            for page_url, filename in load_raw_data_index(raw_data_dir):
+                if page_url == url:
+                    return read_raw_html(os.path.join(raw_data_dir, filename))
+    return None
+
+
+def save_raw_data(raw_data, raw_data_dir, compress=True, dictionary=None):
+    """
+    Writes a list of (url, html content) to a raw_data directory, with its index.
+
+    Pages are compressed with the PresetDictionary if one is given, gzipped otherwise.
+    """
+    if not os.path.exists(raw_data_dir):
+        os.makedirs(raw_data_dir)
+    references = []
+    for (i, (url, html_content)) in enumerate(raw_data):
+        filename = make_raw_html_filename(i, compress, dictionary)
+        write_raw_html(os.path.join(raw_data_dir, filename), html_content, dictionary)
+        references.append((url, filename))
+
+    with open(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME), 'w') as f:
+        json.dump(references, f)
+
+
+def write_verified_pack(pack_filename, pages, dictionary=None, content_store=None):
+    """
+    Writes a pack, and makes sure it reads back the same as the pages it was written from.
+    """
+    write_pack(pack_filename, pages, dictionary=dictionary, content_store=content_store)
+    with RawDataPack(pack_filename) as pack:
+        if [pack.get_by_index(i) for i in range(len(pack))] != [html_content for (kind, url, html_content) in pages]:
+            raise IOError("{0} does not match the pages it was written from".format(pack_filename))
+
+
+def pack_raw_data_directories(batch_directory, dictionary=None, content_store=None):
+    """
+    Moves the pages of the raw_data/ and errors_raw_data/ directories of an older batch
+    into a raw_data.pack. Returns the number of pages packed.
+    """
+    pages = list()
+    raw_data_dirs = [os.path.join(batch_directory, kind) for kind in (RAW_DATA_DIR, ERRORS_RAW_DATA_DIR)]
+    for raw_data_dir in raw_data_dirs:
+        if os.path.exists(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME)):
+            kind = os.path.basename(raw_data_dir)
+            pages.extend((kind, url, html_content) for (url, html_content) in iter_raw_data(raw_data_dir))
+
+    # the directories only go away once the pack reads back the same
+    write_verified_pack(os.path.join(batch_directory, RAW_DATA_PACK_FILENAME), pages, dictionary, content_store)
+    for raw_data_dir in raw_data_dirs:
+        if os.path.exists(raw_data_dir):
+            shutil.rmtree(raw_data_dir)
+    return len(pages)
+
+
+def move_pack_to_content_store(pack_filename, content_store, dictionary=None):
+    """
+    Rewrites a pack holding its own pages so that it refers to the content store instead.
+    Returns the number of pages moved.
+    """
+    with RawDataPack(pack_filename) as pack:
+        pages = [(kind, url, pack.get_by_index(i)) for (i, (kind, url, offset, length, codec)) in enumerate(pack.index)]
+        moved_count = len([codec for (kind, url, offset, length, codec) in pack.index if not codec.startswith(CONTENT_HASH_PREFIX)])
+    if moved_count:
+        write_verified_pack(pack_filename, pages, dictionary, content_store)
+    return moved_count
@@ -0,0 +1,160 @@
+"""
+Pack files: all the raw html of a batch in a single file.
+
+One file per page adds up to millions of inodes after a few years of
+crawling, which backups and rsync have to walk through one by one. A batch
+now keeps its raw_data/ and errors_raw_data/ pages in raw_data.pack:
+
+    "csxj-pack-1\\n"
+    record 0 | record 1 | ...         pages, one after the other
+    index                             json list of [kind, url, offset, length, codec]
+    index offset                      8 bytes, big endian
+    "csxj-idx"
+
+kind is the directory the page used to go to (raw_data or errors_raw_data),
+codec how its record is stored: "raw", "zlib", or "zd:<dictionary id>" for
+the pages compressed with a preset dictionary (see presetdict.py). Pages
+kept in the source's content store have an empty record and a
+"sha1:<hash>" codec (see contentstore.py).
+
+Packs are read through mmap, so that getting a page out of one, by url or
+by position, only touches that page's record.
+"""
+
+import os
+import json
+import zlib
+import mmap
+import struct
+
+from constants import RAW_DATA_DIR
+from presetdict import find_dictionary
+# a module import: contentstore imports this module as well
+import contentstore
+
+
+PACK_MAGIC = 'csxj-pack-1\n'
+INDEX_MAGIC = 'csxj-idx'
+TRAILER_FORMAT = '>Q'
+TRAILER_SIZE = struct.calcsize(TRAILER_FORMAT) + len(INDEX_MAGIC)
+
+RAW = 'raw'
+ZLIB = 'zlib'
+PRESET_DICTIONARY_PREFIX = 'zd:'
+CONTENT_HASH_PREFIX = 'sha1:'
+
+COMPRESSION_LEVEL = 6
+
+
+class CorruptedPackError(Exception):
+    pass
+
+
+def encode_record(html_content, compress=True, dictionary=None):
+    """
+    Returns (record, codec).
+    """
+    if isinstance(html_content, unicode):
+        html_content = html_content.encode('utf-8')
+    if dictionary:
+        return dictionary.compress(html_content), PRESET_DICTIONARY_PREFIX + dictionary.id
+    if compress:
+        return zlib.compress(html_content, COMPRESSION_LEVEL), ZLIB
+    return html_content, RAW
+
+
+def decode_record(record, codec, filename):
+    """
+    filename is where the record comes from, the dictionaries and content store are looked up from there.
+    """
+    if codec == RAW:
+        return record
+    if codec == ZLIB:
+        return zlib.decompress(record)
+    if codec.startswith(PRESET_DICTIONARY_PREFIX):
+        return find_dictionary(filename, codec[len(PRESET_DICTIONARY_PREFIX):]).decompress(record)
+    if codec.startswith(CONTENT_HASH_PREFIX):
+        return contentstore.find_content_store(filename).get(codec[len(CONTENT_HASH_PREFIX):])
+    raise CorruptedPackError("Unknown codec in {0}: {1}".format(filename, codec))
+
+
+def write_pack(filename, pages, compress=True, dictionary=None, content_store=None):
+    """
+    Writes a pack from a list of (kind, url, html content).
+
+    With a ContentStore, the pages go to the store, and the pack only refers to them.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    index = list()
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(PACK_MAGIC)
+        for kind, url, html_content in pages:
+            if content_store:
+                record, codec = '', CONTENT_HASH_PREFIX + content_store.put(html_content, compress, dictionary)
+            else:
+                record, codec = encode_record(html_content, compress, dictionary)
+            index.append((kind, url, f.tell(), len(record), codec))
+            f.write(record)
+        index_offset = f.tell()
+        f.write(json.dumps(index))
+        f.write(struct.pack(TRAILER_FORMAT, index_offset) + INDEX_MAGIC)
+    os.rename(tmp_filename, filename)
+
+
+class RawDataPack(object):
+    """
+    Read access to a pack file. Can be used as a context manager.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self.file.close()
+            raise CorruptedPackError("{0} is not a pack file".format(filename))
+        self.index = self.load_index()
+        self.positions = dict((url, i) for (i, (kind, url, offset, length, codec)) in enumerate(self.index))
+
+    def load_index(self):
+        size = len(self.map)
+        if size < len(PACK_MAGIC) + TRAILER_SIZE or self.map[:len(PACK_MAGIC)] != PACK_MAGIC or self.map[-len(INDEX_MAGIC):] != INDEX_MAGIC:
+            self.close()
+            raise CorruptedPackError("{0} is not a pack file, or was cut short".format(self.filename))
+        index_offset, = struct.unpack(TRAILER_FORMAT, self.map[size - TRAILER_SIZE:size - len(INDEX_MAGIC)])
+        return json.loads(self.map[index_offset:size - TRAILER_SIZE])
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_references(self, kind=RAW_DATA_DIR):
+        """
+        Returns the (url, position) of the pages of a kind, in the order they were packed.
+        """
+        return [(url, i) for (i, (page_kind, url, offset, length, codec)) in enumerate(self.index) if page_kind == kind]
+
+    def get_by_index(self, i):
+        kind, url, offset, length, codec = self.index[i]
+        return decode_record(self.map[offset:offset + length], codec, self.filename)
+
+    def get(self, url):
+        """
+        Returns the html of a url, or None if it is not in the pack.
+        """
+        i = self.positions.get(url)
+        if i is None:
+            return None
+        return self.get_by_index(i)
@@ -0,0 +1,232 @@
+"""
+Persistent index of every url ever queued for a source.
+
+The index is an on-disk hash set: a table of 64 bit url hashes, with open
+addressing and linear probing, which is accessed through mmap. Lookups and
+insertions are O(1) and only touch a page or two of the file, so memory use
+does not grow with years of history. The file doubles in size when the table
+gets half full.
+
+A Bloom filter sits in front of the table: most urls we ask about are new
+ones, and it answers for them without reading the table at all. It is kept
+next to the table, in <index>.bloom, along with the number of urls in the
+table. The filter is only rebuilt, by scanning the table, when it does not
+match it: after the table grew, or when the last writer did not close the
+index properly.
+
+An index is opened by a single process at a time (a cron filler and the
+daemon may poll the same source): it is locked with flock() on <index>.lock
+until it is closed.
+"""
+
+import os
+import mmap
+import fcntl
+import struct
+import hashlib
+
+
+SLOT_FORMAT = '>Q'
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+EMPTY_SLOT = 0
+INITIAL_SLOT_COUNT = 4096
+MAX_LOAD_FACTOR = 0.5
+
+BLOOM_BITS_PER_SLOT = 8
+BLOOM_HASH_COUNT = 5
+
+BLOOM_FILTER_SUFFIX = '.bloom'
+LOCK_SUFFIX = '.lock'
+# slot count of the table the filter was built for, url count, and whether it was closed properly
+BLOOM_HEADER_FORMAT = '>QQB'
+BLOOM_HEADER_SIZE = struct.calcsize(BLOOM_HEADER_FORMAT)
+
+
+def hash_url(url):
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    url_hash = struct.unpack(SLOT_FORMAT, hashlib.sha1(url).digest()[:SLOT_SIZE])[0]
+    # 0 marks the empty slots
+    return url_hash or 1
+
+
+class BloomFilter(object):
+    """
+    Bloom filter whose bits are kept in a buffer (here, a mmap), from `offset` on.
+    """
+    def __init__(self, bits, offset, bit_count):
+        self.bits = bits
+        self.offset = offset
+        self.bit_count = bit_count
+
+    def get_bit_positions(self, url_hash):
+        # double hashing: the two halves of the url hash give us as many hash functions as we want
+        h1, h2 = url_hash & 0xFFFFFFFF, url_hash >> 32
+        return [(h1 + i * h2) % self.bit_count for i in range(BLOOM_HASH_COUNT)]
+
+    def add(self, url_hash):
+        for position in self.get_bit_positions(url_hash):
+            i = self.offset + position / 8
+            self.bits[i] = chr(ord(self.bits[i]) | 1 << (position % 8))
+
+    def may_contain(self, url_hash):
+        for position in self.get_bit_positions(url_hash):
+            if not ord(self.bits[self.offset + position / 8]) & (1 << (position % 8)):
+                return False
+        return True
+
+    def clear(self):
+        self.bits[self.offset:] = '\0' * (len(self.bits) - self.offset)
+
+
+class SeenUrlIndex(object):
+    """
+    >>> import tempfile, shutil
+    >>> tmp_dir = tempfile.mkdtemp()
+    >>> index = SeenUrlIndex(os.path.join(tmp_dir, 'seen_urls.idx'))
+    >>> index.add(u'http://www.lesoir.be/1')
+    >>> u'http://www.lesoir.be/1' in index, u'http://www.lesoir.be/2' in index
+    (True, False)
+    >>> index.close()
+    >>> shutil.rmtree(tmp_dir)
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.bloom_filter_filename = filename + BLOOM_FILTER_SUFFIX
+        self.lock_file = open(filename + LOCK_SUFFIX, 'a')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(filename):
+                self.create_table(filename, INITIAL_SLOT_COUNT)
+            self.open_table()
+        except Exception:
+            self.unlock()
+            raise
+
+    @staticmethod
+    def create_table(filename, slot_count):
+        with open(filename, 'wb') as f:
+            f.truncate(slot_count * SLOT_SIZE)
+
+    def open_table(self):
+        self.file = open(self.filename, 'r+b')
+        self.table = mmap.mmap(self.file.fileno(), 0)
+        self.slot_count = len(self.table) / SLOT_SIZE
+        self.open_bloom_filter()
+
+    def open_bloom_filter(self):
+        """
+        Opens the Bloom filter kept next to the table, and rebuilds it if it does not match the table.
+        """
+        bit_count = self.slot_count * BLOOM_BITS_PER_SLOT
+        size = BLOOM_HEADER_SIZE + bit_count / 8
+        if not os.path.exists(self.bloom_filter_filename) or os.path.getsize(self.bloom_filter_filename) != size:
+            # a zeroed header is never taken for a clean one
+            with open(self.bloom_filter_filename, 'wb') as f:
+                f.truncate(size)
+        self.bloom_filter_file = open(self.bloom_filter_filename, 'r+b')
+        self.bloom_filter_map = mmap.mmap(self.bloom_filter_file.fileno(), 0)
+        self.bloom_filter = BloomFilter(self.bloom_filter_map, BLOOM_HEADER_SIZE, bit_count)
+
+        slot_count, url_count, closed_properly = struct.unpack_from(BLOOM_HEADER_FORMAT, self.bloom_filter_map, 0)
+        if closed_properly and slot_count == self.slot_count:
+            self.url_count = url_count
+        else:
+            self.rebuild_bloom_filter()
+        # until close(), the filter and the table on disk may not match
+        self.write_bloom_filter_header(closed_properly=False)
+
+    def rebuild_bloom_filter(self):
+        self.bloom_filter.clear()
+        self.url_count = 0
+        for url_hash in self.iter_hashes():
+            self.bloom_filter.add(url_hash)
+            self.url_count += 1
+
+    def write_bloom_filter_header(self, closed_properly):
+        struct.pack_into(BLOOM_HEADER_FORMAT, self.bloom_filter_map, 0, self.slot_count, self.url_count, int(closed_properly))
+        self.bloom_filter_map.flush()
+
+    def close_table(self):
+        self.table.flush()
+        # the filter's bits reach the disk before the header saying they can be trusted
+        self.bloom_filter_map.flush()
+        self.write_bloom_filter_header(closed_properly=True)
+        self.bloom_filter_map.close()
+        self.bloom_filter_file.close()
+        self.table.close()
+        self.file.close()
+
+    def unlock(self):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+
+    def close(self):
+        try:
+            self.close_table()
+        finally:
+            self.unlock()
+
+    def __len__(self):
+        return self.url_count
+
+    def __contains__(self, url):
+        url_hash = hash_url(url)
+        if not self.bloom_filter.may_contain(url_hash):
+            return False
+        return self.find_slot(url_hash)[1]
+
+    def iter_hashes(self):
+        for slot in xrange(self.slot_count):
+            url_hash = self.read_slot(slot)
+            if url_hash != EMPTY_SLOT:
+                yield url_hash
+
+    def read_slot(self, slot):
+        return struct.unpack_from(SLOT_FORMAT, self.table, slot * SLOT_SIZE)[0]
+
+    def find_slot(self, url_hash):
+        """
+        Returns (slot, found): the slot holding url_hash, or the empty slot where it would go.
+        """
+        slot = url_hash % self.slot_count
+        while True:
+            slot_hash = self.read_slot(slot)
+            if slot_hash == url_hash:
+                return slot, True
+            if slot_hash == EMPTY_SLOT:
+                return slot, False
+            slot = (slot + 1) % self.slot_count
+
+    def add(self, url):
+        url_hash = hash_url(url)
+        slot, found = self.find_slot(url_hash)
+        if found:
+            return
+        if self.url_count + 1 > self.slot_count * MAX_LOAD_FACTOR:
+            self.grow()
+            slot, found = self.find_slot(url_hash)
+        struct.pack_into(SLOT_FORMAT, self.table, slot * SLOT_SIZE, url_hash)
+        self.bloom_filter.add(url_hash)
+        self.url_count += 1
+
+    def grow(self):
+        """
+        Rehashes everything in a table twice as big. The new table replaces the old one atomically.
+        """
+        new_filename = self.filename + '.new'
+        new_slot_count = self.slot_count * 2
+        self.create_table(new_filename, new_slot_count)
+        with open(new_filename, 'r+b') as f:
+            new_table = mmap.mmap(f.fileno(), 0)
+            for url_hash in self.iter_hashes():
+                slot = url_hash % new_slot_count
+                while struct.unpack_from(SLOT_FORMAT, new_table, slot * SLOT_SIZE)[0] != EMPTY_SLOT:
+                    slot = (slot + 1) % new_slot_count
+                struct.pack_into(SLOT_FORMAT, new_table, slot * SLOT_SIZE, url_hash)
+            new_table.flush()
+            new_table.close()
+
+        self.close_table()
+        os.rename(new_filename, self.filename)
+        self.open_table()
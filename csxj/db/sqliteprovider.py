@@ -0,0 +1,270 @@
+"""
+SQLite storage for what the downloader extracts from the articles.
+
+Walking the json database means opening and decoding a few files per batch,
+which adds up to hundreds of thousands of them on a database holding a few
+years of data. SQLiteProvider answers the same questions as Provider from a
+single csxj.sqlite file at the root of the database, shared by all the
+sources, with indexes on the date and batch, the article urls and the tags
+of the links they contain.
+
+Only the articles, errors and link lists of each batch go in the database:
+the raw html, the queue and the reprocessed content stay in the source's
+directory, and are handled by Provider as usual.
+"""
+
+import os
+import json
+import sqlite3
+from contextlib import closing
+
+from article import ArticleData
+from provider import Provider, ErrorLogEntry, ErrorLogEntry2, NonExistentDayError, NonExistentBatchError
+from constants import *
+
+
+# seconds a writer waits for another process to release the database
+LOCK_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    batch TEXT NOT NULL,
+    PRIMARY KEY (source, day, batch)
+);
+
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    batch TEXT NOT NULL,
+    url TEXT NOT NULL,
+    link_count INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_by_batch ON articles (source, day, batch);
+CREATE INDEX IF NOT EXISTS articles_by_url ON articles (url);
+
+CREATE TABLE IF NOT EXISTS link_tags (
+    article_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS link_tags_by_tag ON link_tags (tag);
+CREATE INDEX IF NOT EXISTS link_tags_by_article ON link_tags (article_id);
+
+CREATE TABLE IF NOT EXISTS errors (
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    batch TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    url TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS errors_by_batch ON errors (source, day, batch);
+
+CREATE TABLE IF NOT EXISTS batch_links (
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batch_links_by_batch ON batch_links (source, day, batch, kind);
+"""
+
+# what goes in batch_links, named after the json files they replace
+DELETED_ARTICLES = 'deleted_articles'
+BLOGPOSTS = 'blogposts'
+PAYWALLED_ARTICLES = 'paywalled_articles'
+SYNDICATED_ARTICLES = 'syndicated_articles'
+
+
+def connect(db_root):
+    connection = sqlite3.connect(os.path.join(db_root, SQLITE_DB_FILENAME), timeout=LOCK_TIMEOUT)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SQLiteProvider(Provider):
+    """
+    Provider whose batches are stored in SQLite rather than in json files.
+    """
+    def __init__(self, db_root, provider_name):
+        super(SQLiteProvider, self).__init__(db_root, provider_name)
+        self.connection = connect(db_root)
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql, *parameters):
+        with closing(self.connection.cursor()) as cursor:
+            cursor.execute(sql, parameters)
+            return cursor.fetchall()
+
+    def has_batch(self, date_string, batch_time_string):
+        return bool(self.query("SELECT 1 FROM batches WHERE source = ? AND day = ? AND batch = ?",
+                               self.name, date_string, batch_time_string))
+
+    def check_batch_exists(self, date_string, batch_time_string):
+        if not self.has_batch(date_string, batch_time_string):
+            raise NonExistentBatchError(self.name, date_string, batch_time_string)
+
+    def get_source_summary_for_all_days(self):
+        return [(date_string, self.get_cached_metainfos_for_day(date_string)) for date_string in self.get_all_days()]
+
+    def get_all_days(self):
+        return [day for (day,) in self.query("SELECT DISTINCT day FROM batches WHERE source = ? ORDER BY day", self.name)]
+
+    def get_all_batch_hours(self, date_string):
+        batch_hours = [batch for (batch,) in self.query("SELECT batch FROM batches WHERE source = ? AND day = ? ORDER BY batch",
+                                                        self.name, date_string)]
+        if not batch_hours:
+            raise NonExistentDayError(self.name, date_string)
+        return batch_hours
+
+    def get_batch_articles(self, date_string, batch_time_string):
+        self.check_batch_exists(date_string, batch_time_string)
+        rows = self.query("SELECT data FROM articles WHERE source = ? AND day = ? AND batch = ? ORDER BY url",
+                          self.name, date_string, batch_time_string)
+        return [ArticleData.from_json(data) for (data,) in rows]
+
+    def get_pending_batch_errors(self, date_string, batch_time_string):
+        self.check_batch_exists(date_string, batch_time_string)
+        all_errors = [list(), list()]
+        rows = self.query("SELECT version, data FROM errors WHERE source = ? AND day = ? AND batch = ?",
+                          self.name, date_string, batch_time_string)
+        for version, data in rows:
+            if version == 1:
+                all_errors[0].append(ErrorLogEntry(*json.loads(data)))
+            else:
+                all_errors[1].append(ErrorLogEntry2(*json.loads(data)))
+        return all_errors
+
+    def get_batch_metainfos(self, date_string, batch_time_string):
+        """
+        Same as Provider.get_batch_metainfos(), but the counters come from the database
+        without decoding the articles.
+        """
+        self.check_batch_exists(date_string, batch_time_string)
+        [(article_count, link_count)] = self.query("SELECT COUNT(*), COALESCE(SUM(link_count), 0) FROM articles WHERE source = ? AND day = ? AND batch = ?",
+                                                   self.name, date_string, batch_time_string)
+        [(pending_error_count,)] = self.query("SELECT COUNT(*) FROM errors WHERE source = ? AND day = ? AND batch = ?",
+                                             self.name, date_string, batch_time_string)
+
+        reprocessed_article_count, reprocessed_link_count = 0, 0
+        if os.path.isdir(os.path.join(self.directory, date_string, batch_time_string)):
+            for (batch_time, reprocessed_articles) in self.get_reprocessed_batch_articles(date_string, batch_time_string):
+                reprocessed_article_count += len(reprocessed_articles)
+                reprocessed_link_count += sum(len(art.links) for art in reprocessed_articles)
+
+        return {
+            'article_count': article_count,
+            'link_count': link_count,
+            'pending_error_count': pending_error_count,
+            'total_error_count': pending_error_count + reprocessed_article_count,
+            'reprocessed_article_count': reprocessed_article_count,
+            'reprocessed_link_count': reprocessed_link_count
+        }
+
+    def get_articles_per_batch(self, date_string):
+        return [(batch_time, self.get_batch_articles(date_string, batch_time)) for batch_time in self.get_all_batch_hours(date_string)]
+
+    def get_errors2_per_batch(self, date_string):
+        return [(batch_time, self.get_pending_batch_errors(date_string, batch_time)) for batch_time in self.get_all_batch_hours(date_string)]
+
+    def get_data_per_batch(self, date_string, data_extractor_func):
+        all_data = [data_extractor_func(self, date_string, batch_time) for batch_time in self.get_all_batch_hours(date_string)]
+        all_data.sort(key=lambda x: x[0])
+        return all_data
+
+    def get_batch_links(self, date_string, batch_time_string, kind):
+        rows = self.query("SELECT data FROM batch_links WHERE source = ? AND day = ? AND batch = ? AND kind = ?",
+                          self.name, date_string, batch_time_string, kind)
+        return [json.loads(data) for (data,) in rows]
+
+    def get_deleted_articles_from_batch_directory(self, batch_directory):
+        date_string, batch_time_string = os.path.split(os.path.normpath(batch_directory))[-2:]
+        date_string = os.path.basename(date_string)
+        return {"deleted_articles": self.get_batch_links(date_string, batch_time_string, DELETED_ARTICLES)}
+
+    def get_blogpost_titles_from_batch(self, day_string, hour_string):
+        return {"blogposts": self.get_batch_links(day_string, hour_string, BLOGPOSTS)}
+
+    def get_articles_by_url(self, url):
+        """
+        Returns a list of (date, batch, ArticleData) for all the times this url was downloaded.
+        """
+        rows = self.query("SELECT day, batch, data FROM articles WHERE source = ? AND url = ? ORDER BY day, batch", self.name, url)
+        return [(day, batch, ArticleData.from_json(data)) for (day, batch, data) in rows]
+
+    def get_articles_linking_with_tag(self, tag):
+        """
+        Returns a list of (date, batch, ArticleData) for the articles with at least one link tagged with `tag`.
+        """
+        rows = self.query("""SELECT day, batch, data FROM articles WHERE source = ? AND id IN
+                             (SELECT article_id FROM link_tags WHERE tag = ?) ORDER BY day, batch, url""", self.name, tag)
+        return [(day, batch, ArticleData.from_json(data)) for (day, batch, data) in rows]
+
+    def save_batch_content(self, date_string, batch_time_string, batch_directory,
+                           articles, deleted_articles, errors, blogposts, paywalled_articles, syndicated_articles=None):
+        """
+        Stores what was downloaded for a batch, in a single transaction. Saving a
+        batch again replaces what was stored for it.
+        """
+        key = (self.name, date_string, batch_time_string)
+        with self.connection:
+            self.delete_batch_content(*key)
+            self.connection.execute("INSERT INTO batches (source, day, batch) VALUES (?, ?, ?)", key)
+            for article in articles:
+                cursor = self.connection.execute("INSERT INTO articles (source, day, batch, url, link_count, data) VALUES (?, ?, ?, ?, ?, ?)",
+                                                 key + (article.url, len(article.links), article.to_json()))
+                self.connection.executemany("INSERT INTO link_tags (article_id, url, tag) VALUES (?, ?, ?)",
+                                            [(cursor.lastrowid, link.URL, tag) for link in article.links for tag in link.tags])
+            self.connection.executemany("INSERT INTO errors (source, day, batch, version, url, data) VALUES (?, ?, ?, ?, ?, ?)",
+                                        [key + (2 if isinstance(error, ErrorLogEntry2) else 1, error[0], json.dumps(error)) for error in errors])
+            for kind, links in [(DELETED_ARTICLES, deleted_articles), (BLOGPOSTS, blogposts),
+                                (PAYWALLED_ARTICLES, paywalled_articles), (SYNDICATED_ARTICLES, syndicated_articles or [])]:
+                self.connection.executemany("INSERT INTO batch_links (source, day, batch, kind, data) VALUES (?, ?, ?, ?, ?)",
+                                            [key + (kind, json.dumps(link)) for link in links])
+
+    def delete_batch_content(self, source, date_string, batch_time_string):
+        key = (source, date_string, batch_time_string)
+        self.connection.execute("""DELETE FROM link_tags WHERE article_id IN
+                                   (SELECT id FROM articles WHERE source = ? AND day = ? AND batch = ?)""", key)
+        for table in ('batches', 'articles', 'errors', 'batch_links'):
+            self.connection.execute("DELETE FROM {0} WHERE source = ? AND day = ? AND batch = ?".format(table), key)
+
+    def import_json_batch(self, json_provider, date_string, batch_time_string):
+        """
+        Copies a batch of the json database.
+        """
+        pending_errors = json_provider.get_pending_batch_errors(date_string, batch_time_string)
+        batch_directory = os.path.join(json_provider.directory, date_string, batch_time_string)
+
+        def load_links(filename, key):
+            json_filename = os.path.join(batch_directory, filename)
+            if os.path.exists(json_filename):
+                with open(json_filename) as f:
+                    return json.load(f)[key]
+            return []
+
+        self.save_batch_content(date_string, batch_time_string, batch_directory,
+                                articles=json_provider.get_batch_articles(date_string, batch_time_string),
+                                deleted_articles=load_links(DELETED_ARTICLES_FILENAME, DELETED_ARTICLES),
+                                errors=pending_errors[0] + pending_errors[1],
+                                blogposts=load_links(BLOGPOSTS_FILENAME, BLOGPOSTS),
+                                paywalled_articles=load_links(PAYWALLED_ARTICLES_FILENAME, PAYWALLED_ARTICLES),
+                                syndicated_articles=load_links(SYNDICATED_ARTICLES_FILENAME, SYNDICATED_ARTICLES))
+
+
+# the storages the downloader can write to
+STORAGE_BACKENDS = dict(json=Provider,
+                        sqlite=SQLiteProvider)
+
+DEFAULT_STORAGE_BACKEND = 'json'
+
+
+def open_provider(db_root, provider_name, backend=DEFAULT_STORAGE_BACKEND):
+    return STORAGE_BACKENDS[backend](db_root, provider_name)
@@ -0,0 +1,166 @@
+# coding=utf-8
+"""
+Spots the stories which several sources of the same group publish.
+
+Titles of the same owner (e.g. Rossel's lesoir, sudinfo and sudpresse) often
+run the same wire story. Every story a source queues is fingerprinted twice:
+by its canonical url (sources link to their sister sites' articles), and by
+the words of its title. A story whose fingerprint was already queued by
+another source of the group is an alias of that first copy.
+
+Everything lives in the 'syndication' directory of the database, per group:
+
+ - <group>.json: {fingerprint: {"source", "url", "seen", "downloaded"}} for the
+   stories queued recently. Copies are published within hours of each other,
+   so fingerprints older than SYNDICATION_WINDOW are forgotten.
+ - <group>_aliases.jsonl: one line per alias found, for later analysis.
+ - <group>.lock: serializes the fillers and downloaders, with flock().
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import urlparse
+import unicodedata
+from contextlib import contextmanager
+
+from queuejournal import read_json, write_json_atomically
+from constants import SYNDICATION_DIR
+
+
+# seconds during which a story is looked for in the other sources
+SYNDICATION_WINDOW = 3 * 24 * 60 * 60
+
+# titles with fewer meaningful words than this are too generic ("Météo", "En direct")
+MIN_TITLE_WORDS = 4
+
+TITLE_STOPWORDS = frozenset(u"""
+a au aux avec ce ces cette d dans de des du en est et il ils l la le les leur
+n ne par pas pour qu que qui s sa se ses son sur un une y
+""".split())
+
+TRACKING_PARAMETER_PREFIXES = ('utm_', 'xtor', 'xtref', 'fb_')
+
+
+def canonicalize_url(url):
+    """
+    Returns the url without what does not change the page it points to.
+
+    >>> canonicalize_url(u'https://www.Lesoir.be/culture/123/article/?utm_source=rss&id=4#comments')
+    u'http://lesoir.be/culture/123/article?id=4'
+    """
+    scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+    netloc = netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    parameters = [p for p in query.split('&') if p and not p.lower().startswith(TRACKING_PARAMETER_PREFIXES)]
+    return urlparse.urlunsplit(('http', netloc, path.rstrip('/') or '/', '&'.join(sorted(parameters)), ''))
+
+
+def make_title_fingerprint(title):
+    """
+    Returns a hash of the meaningful words of a title, whatever their order, case and
+    accents, or None if the title is too short to tell stories apart.
+
+    >>> make_title_fingerprint(u"Le gouvernement a trouvé un accord") == make_title_fingerprint(u"Accord trouvé pour le Gouvernement !")
+    True
+    >>> make_title_fingerprint(u"Météo") is None
+    True
+    """
+    if isinstance(title, str):
+        title = title.decode('utf-8', 'replace')
+    text = u''.join(c for c in unicodedata.normalize('NFKD', title) if not unicodedata.combining(c)).lower()
+    words = set(w for w in re.split(r'\W+', text, flags=re.UNICODE) if w and w not in TITLE_STOPWORDS)
+    if len(words) < MIN_TITLE_WORDS:
+        return None
+    return hashlib.sha1(u' '.join(sorted(words)).encode('utf-8')).hexdigest()
+
+
+def make_fingerprints(title, url):
+    """
+    Returns the [(kind, fingerprint)] of a story.
+    """
+    fingerprints = [('url', u'url:' + canonicalize_url(url))]
+    title_fingerprint = make_title_fingerprint(title)
+    if title_fingerprint:
+        fingerprints.append(('title', u'title:' + title_fingerprint))
+    return fingerprints
+
+
+class SyndicationIndex(object):
+    def __init__(self, db_root, group):
+        self.group = group
+        self.directory = os.path.join(db_root, SYNDICATION_DIR)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.index_filename = os.path.join(self.directory, '{0}.json'.format(group))
+        self.aliases_filename = os.path.join(self.directory, '{0}_aliases.jsonl'.format(group))
+        self.lock_filename = os.path.join(self.directory, '{0}.lock'.format(group))
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_filename, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_index(self):
+        now = time.time()
+        index = read_json(self.index_filename, dict())
+        return dict((k, story) for (k, story) in index.items() if now - story['seen'] < SYNDICATION_WINDOW)
+
+    def register_stories(self, source_name, stories):
+        """
+        Remembers the (title, url) stories a source just queued, and looks them up in
+        what the other sources of the group queued.
+
+        Returns {url: {"source", "url", "matched_by"}}, the first copy of each story
+        which had already been queued by another source.
+        """
+        aliases = dict()
+        now = time.time()
+        with self.locked():
+            index = self.read_index()
+            for title, url in stories:
+                fingerprints = make_fingerprints(title, url)
+                for kind, fingerprint in fingerprints:
+                    first_copy = index.get(fingerprint)
+                    if first_copy and first_copy['source'] != source_name:
+                        aliases[url] = dict(source=first_copy['source'], url=first_copy['url'], matched_by=kind)
+                        break
+                else:
+                    for kind, fingerprint in fingerprints:
+                        index.setdefault(fingerprint, dict(source=source_name, url=url, seen=now, downloaded=False))
+            write_json_atomically(index, self.index_filename)
+
+            if aliases:
+                with open(self.aliases_filename, 'a') as f:
+                    for url, first_copy in aliases.items():
+                        f.write(json.dumps(dict(source=source_name, url=url, time=now,
+                                                original_source=first_copy['source'], original_url=first_copy['url'],
+                                                matched_by=first_copy['matched_by'])) + '\n')
+        return aliases
+
+    def mark_downloaded(self, source_name, urls):
+        """
+        Remembers that these stories of a source were successfully downloaded.
+        """
+        urls = set(urls)
+        if not urls:
+            return
+        with self.locked():
+            index = self.read_index()
+            for story in index.values():
+                if story['source'] == source_name and story['url'] in urls:
+                    story['downloaded'] = True
+            write_json_atomically(index, self.index_filename)
+
+    def is_downloaded(self, source_name, url):
+        with self.locked():
+            story = self.read_index().get(u'url:' + canonicalize_url(url))
+        return bool(story and story['source'] == source_name and story['downloaded'])
@@ -0,0 +1,124 @@
+"""
+Remembers the urls which are not worth fetching again for a while: articles
+which were deleted, which answered 404 or 403, or which are paywalled.
+
+The tombstones of a source are kept in memory, in a dict, for constant time
+lookups. On disk, they are appended to tombstones.jsonl, one
+[url, reason, expiration time] per line. Expired and superseded lines pile
+up in that log, so it is rewritten with the live tombstones only whenever
+it gets COMPACTION_RATIO times bigger than needed.
+"""
+
+import os
+import json
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+
+from constants import TOMBSTONES_FILENAME
+
+
+MISSING = 'missing'
+FORBIDDEN = 'forbidden'
+DELETED = 'deleted'
+PAYWALLED = 'paywalled'
+
+# seconds before we try those urls again
+TOMBSTONE_TTLS = {
+    MISSING: 30 * 24 * 60 * 60,
+    FORBIDDEN: 7 * 24 * 60 * 60,
+    DELETED: 30 * 24 * 60 * 60,
+    # paywalls come and go
+    PAYWALLED: 2 * 24 * 60 * 60,
+}
+
+HTTP_CODE_REASONS = {404: MISSING, 403: FORBIDDEN}
+
+COMPACTION_RATIO = 2
+MIN_COMPACTION_LINES = 1000
+
+
+class TombstoneStore(object):
+    def __init__(self, source_directory):
+        if not os.path.exists(source_directory):
+            os.makedirs(source_directory)
+        self.filename = os.path.join(source_directory, TOMBSTONES_FILENAME)
+        self.lock_filename = self.filename + '.lock'
+        # fetch workers record the urls they find missing from their own threads
+        self.thread_lock = threading.Lock()
+        self.tombstones = dict()
+        self.line_count = 0
+        self.is_damaged = False
+        with self.locked():
+            self.load()
+            if self.needs_compaction():
+                self.compact()
+
+    @contextmanager
+    def locked(self):
+        with self.thread_lock:
+            with open(self.lock_filename, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        now = time.time()
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                try:
+                    url, reason, expires = json.loads(line)
+                except ValueError:
+                    # cut short by a crash, compacting the log gets rid of it
+                    self.is_damaged = True
+                    continue
+                self.line_count += 1
+                if expires > now:
+                    self.tombstones[url] = (reason, expires)
+                else:
+                    self.tombstones.pop(url, None)
+
+    def needs_compaction(self):
+        return self.is_damaged or self.line_count > max(MIN_COMPACTION_LINES, COMPACTION_RATIO * len(self.tombstones))
+
+    def compact(self):
+        """
+        Rewrites the log with the live tombstones only.
+        """
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            for url, (reason, expires) in self.tombstones.iteritems():
+                f.write(json.dumps([url, reason, expires]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_filename, self.filename)
+        self.line_count = len(self.tombstones)
+        self.is_damaged = False
+
+    def __len__(self):
+        return len(self.tombstones)
+
+    def get(self, url):
+        """
+        Returns why the url should not be fetched, or None if it can be.
+        """
+        tombstone = self.tombstones.get(url)
+        if tombstone is None:
+            return None
+        reason, expires = tombstone
+        if expires <= time.time():
+            return None
+        return reason
+
+    def add(self, url, reason):
+        expires = time.time() + TOMBSTONE_TTLS[reason]
+        with self.locked():
+            self.tombstones[url] = (reason, expires)
+            with open(self.filename, 'ab') as f:
+                f.write(json.dumps([url, reason, expires]) + '\n')
+            self.line_count += 1
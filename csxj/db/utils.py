@@ -4,9 +4,10 @@ from datetime import datetime, time
 
 def get_subdirectories(parent_dir):
     """
-    Yields a list of directory names. Filter out anything that is not a directory
+    Yields a list of directory names. Filter out anything that is not a directory,
+    and the hidden directories (e.g. batches still being written by a downloader)
     """
-    return [d for d in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, d))]
+    return [d for d in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, d)) and not d.startswith('.')]
 
 
 def get_json_files(parent_dir):
@@ -0,0 +1,80 @@
+"""
+Adaptive polling interval of a source's frontpage.
+
+Some frontpages get new stories every few minutes, others every few hours.
+After each poll, the filler tells the source's PollingSchedule how many new
+links it found: the schedule keeps a moving average of the rate at which
+stories appear, and picks the interval at which a poll should find about
+TARGET_NEW_STORIES_PER_POLL of them, within the configured bounds.
+
+The schedule is kept in the source's directory, in polling_schedule.json.
+"""
+
+import os
+import json
+import time
+
+
+POLLING_SCHEDULE_FILENAME = 'polling_schedule.json'
+
+# seconds between two polls of a source we know nothing about yet
+DEFAULT_POLL_INTERVAL = 15 * 60
+DEFAULT_MIN_POLL_INTERVAL = 5 * 60
+DEFAULT_MAX_POLL_INTERVAL = 2 * 60 * 60
+
+# how many new stories we would like each poll to find
+TARGET_NEW_STORIES_PER_POLL = 3.0
+
+# weight of the last poll in the moving average of the new stories rate
+RATE_SMOOTHING = 0.3
+
+
+class PollingSchedule(object):
+    def __init__(self, source_directory, min_interval=DEFAULT_MIN_POLL_INTERVAL, max_interval=DEFAULT_MAX_POLL_INTERVAL):
+        self.filename = os.path.join(source_directory, POLLING_SCHEDULE_FILENAME)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.last_poll = None
+        # new stories per hour
+        self.new_stories_rate = None
+        self.interval = min(max(DEFAULT_POLL_INTERVAL, min_interval), max_interval)
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as f:
+                state = json.load(f)
+            self.last_poll = state['last_poll']
+            self.new_stories_rate = state['new_stories_rate']
+            self.interval = self.clamp(state['interval'])
+
+    def save(self):
+        with open(self.filename, 'w') as f:
+            json.dump(dict(last_poll=self.last_poll, new_stories_rate=self.new_stories_rate, interval=self.interval), f)
+
+    def clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def is_due(self, now=None):
+        if now is None:
+            now = time.time()
+        return self.last_poll is None or now >= self.last_poll + self.interval
+
+    def get_next_poll_time(self):
+        return (self.last_poll or 0) + self.interval
+
+    def record_poll(self, new_story_count, now=None):
+        """
+        Learns from the number of new stories found by a poll, and updates the interval.
+        """
+        if now is None:
+            now = time.time()
+        if self.last_poll is not None and now > self.last_poll:
+            observed_rate = new_story_count * 3600.0 / (now - self.last_poll)
+            if self.new_stories_rate is None:
+                self.new_stories_rate = observed_rate
+            else:
+                self.new_stories_rate = RATE_SMOOTHING * observed_rate + (1 - RATE_SMOOTHING) * self.new_stories_rate
+
+            if self.new_stories_rate > 0:
+                self.interval = self.clamp(TARGET_NEW_STORIES_PER_POLL * 3600.0 / self.new_stories_rate)
+            else:
+                self.interval = self.max_interval
+        self.last_poll = now
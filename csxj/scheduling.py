@@ -0,0 +1,83 @@
+"""
+Policies deciding which queued batch a downloader takes next.
+
+A policy is called with the batches which can be claimed (QueuedBatch
+tuples, in the order they were queued) and returns them in the order they
+should be downloaded: the downloader claims the first one. Policies can
+keep state between calls, every call ends with a claim.
+"""
+
+from datetime import datetime, timedelta
+
+
+# batches queued more recently than this are fetched first
+DEFAULT_FRESH_AGE = timedelta(hours=6)
+
+# share of the claims which go to the backlog while there are fresh batches waiting
+DEFAULT_BACKLOG_SHARE = 0.25
+
+
+def get_batch_time(queued_batch):
+    """
+    Returns when a batch was queued, as a datetime.
+    """
+    try:
+        return datetime.strptime("{0} {1}".format(queued_batch.day, queued_batch.batch), "%Y-%m-%d %H.%M.%S")
+    except ValueError:
+        # not named after its time: consider it as old as it gets
+        return datetime.min
+
+
+class OldestFirstPolicy(object):
+    """
+    Downloads the batches in the order they were queued, days and hours oldest first.
+    """
+    def __call__(self, queued_batches):
+        return sorted(queued_batches, key=get_batch_time)
+
+
+class FreshnessFirstPolicy(object):
+    """
+    Downloads the batches queued in the last `fresh_age` newest first, so that new
+    articles are fetched soon after they appear on the frontpage, even after an outage.
+
+    The older batches (the backlog) are caught up oldest first, at a bounded rate:
+    they get `backlog_share` of the claims while fresh batches are waiting, and
+    all of them once those are done.
+    """
+    def __init__(self, fresh_age=DEFAULT_FRESH_AGE, backlog_share=DEFAULT_BACKLOG_SHARE, now=datetime.now):
+        self.fresh_age = fresh_age
+        self.backlog_share = backlog_share
+        self.now = now
+        self.claim_count = 0
+        self.backlog_claim_count = 0
+
+    def __call__(self, queued_batches):
+        if not queued_batches:
+            return []
+        oldest_fresh_time = self.now() - self.fresh_age
+        fresh, backlog = list(), list()
+        for queued_batch in queued_batches:
+            if get_batch_time(queued_batch) >= oldest_fresh_time:
+                fresh.append(queued_batch)
+            else:
+                backlog.append(queued_batch)
+        fresh.sort(key=get_batch_time, reverse=True)
+        backlog.sort(key=get_batch_time)
+
+        self.claim_count += 1
+        if backlog and (not fresh or self.backlog_claim_count + 1 <= self.backlog_share * self.claim_count):
+            self.backlog_claim_count += 1
+            return backlog + fresh
+        return fresh + backlog
+
+
+SCHEDULING_POLICIES = dict(freshness=FreshnessFirstPolicy,
+                           oldest=OldestFirstPolicy)
+
+
+def make_scheduling_policy(name):
+    """
+    Returns a new policy from its name, one of SCHEDULING_POLICIES.
+    """
+    return SCHEDULING_POLICIES[name]()
@@ -20,3 +20,15 @@ def filter_only_new_stories(frontpage_stories, filename):
     new_stories = set(frontpage_stories) - set(last_stories_fetched)
     save_toc_to_file(frontpage_stories, filename)
     return list(new_stories)
+
+
+def filter_unseen_stories(frontpage_stories, seen_urls):
+    """
+    Returns the (title, url) stories whose url is not in seen_urls, in frontpage order.
+    """
+    new_stories, new_urls = list(), set()
+    for title, url in frontpage_stories:
+        if url not in seen_urls and url not in new_urls:
+            new_stories.append((title, url))
+            new_urls.add(url)
+    return new_stories
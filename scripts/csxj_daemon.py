@@ -0,0 +1,52 @@
+"""
+Runs the crawler as a long-lived process: frontpages are polled and queued
+articles downloaded on internal timers. Stop it with SIGTERM.
+"""
+import argparse
+import csxj.crawler
+from csxj import daemon, polling
+from csxj.datasources import lalibre, dhnet, sudinfo, rtlinfo, lavenir, rtbfinfo, levif, septsursept, lesoir_new
+from csxj.scheduling import make_scheduling_policy, SCHEDULING_POLICIES
+from csxj.db.sqliteprovider import STORAGE_BACKENDS, DEFAULT_STORAGE_BACKEND
+
+
+# same sources as csxj_update_all_queues.py and csxj_download_queued_articles.py
+FILLED_PARSERS = dhnet, lalibre, sudinfo, rtlinfo, lavenir, rtbfinfo, levif, septsursept, lesoir_new
+DOWNLOADED_PARSERS = dhnet, lalibre, rtlinfo, sudinfo, lavenir, septsursept, lesoir_new
+
+
+def make_parser_list():
+    return ','.join([p.SOURCE_NAME for p in FILLED_PARSERS])
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Continuously fetch frontpages and download the queued articles into the csxj json database')
+    arg_parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='directory to dump the json db in')
+    arg_parser.add_argument('--sources', type=str, dest='sources', default=make_parser_list(), help='sources to consider (one of %s)' % make_parser_list())
+    arg_parser.add_argument('--min-poll-interval', type=int, dest='min_poll_interval', default=polling.DEFAULT_MIN_POLL_INTERVAL, help='minimum number of seconds between two polls of a frontpage (default=%d)' % polling.DEFAULT_MIN_POLL_INTERVAL)
+    arg_parser.add_argument('--max-poll-interval', type=int, dest='max_poll_interval', default=polling.DEFAULT_MAX_POLL_INTERVAL, help='maximum number of seconds between two polls of a frontpage (default=%d)' % polling.DEFAULT_MAX_POLL_INTERVAL)
+    arg_parser.add_argument('--download-interval', type=int, dest='download_interval', default=daemon.DEFAULT_DOWNLOAD_INTERVAL, help='seconds between two downloads of the queued articles (default=%d)' % daemon.DEFAULT_DOWNLOAD_INTERVAL)
+    arg_parser.add_argument('--download-time-budget', type=int, dest='download_time_budget', default=None, help='maximum number of seconds spent in each download, for all the sources (default: no limit)')
+    arg_parser.add_argument('--filler-workers', type=int, dest='filler_workers', default=csxj.crawler.DEFAULT_FILLER_WORKERS, help='number of frontpages polled at the same time (default=%d)' % csxj.crawler.DEFAULT_FILLER_WORKERS)
+    arg_parser.add_argument('--workers', type=int, dest='workers', default=None, help='number of articles downloaded in parallel for each source (default: per-source setting)')
+    arg_parser.add_argument('--parse-processes', type=int, dest='parse_processes', default=1, help='number of processes used to parse the downloaded articles (default=1)')
+    arg_parser.add_argument('--skip-syndicated', action='store_true', dest='skip_syndicated', default=False, help='do not download the stories another source of the same group already provided')
+    arg_parser.add_argument('--schedule', type=str, dest='schedule', default='freshness', choices=sorted(SCHEDULING_POLICIES), help='order in which the queued batches are downloaded (default=freshness)')
+    arg_parser.add_argument('--no-rss', action='store_false', dest='check_rss', default=True, help='always fetch the frontpages, even when the RSS feed of a source has nothing new')
+    arg_parser.add_argument('--storage', type=str, dest='storage', default=DEFAULT_STORAGE_BACKEND, choices=sorted(STORAGE_BACKENDS), help='where the articles are stored (default=%s)' % DEFAULT_STORAGE_BACKEND)
+    args = arg_parser.parse_args()
+
+    sources = [s for s in args.sources.split(',') if s]
+    daemon.run_daemon(args.jsondb,
+                      [p for p in FILLED_PARSERS if p.SOURCE_NAME in sources],
+                      [p for p in DOWNLOADED_PARSERS if p.SOURCE_NAME in sources],
+                      poll_interval_bounds=(args.min_poll_interval, args.max_poll_interval),
+                      download_interval=args.download_interval,
+                      download_time_budget=args.download_time_budget,
+                      filler_workers=args.filler_workers,
+                      check_rss=args.check_rss,
+                      max_workers=args.workers,
+                      parse_processes=args.parse_processes,
+                      skip_syndicated=args.skip_syndicated,
+                      scheduling_policy=make_scheduling_policy(args.schedule),
+                      storage_backend=args.storage)
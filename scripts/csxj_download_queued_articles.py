@@ -2,10 +2,13 @@
 
 """
 import os
+import time
 import argparse
 import csxj.crawler
 from csxj.datasources import lalibre, dhnet, sudinfo, rtlinfo, lavenir, septsursept, lesoir_new
 from csxj.articlequeue import ArticleQueueDownloader
+from csxj.scheduling import make_scheduling_policy, SCHEDULING_POLICIES
+from csxj.db.sqliteprovider import STORAGE_BACKENDS, DEFAULT_STORAGE_BACKEND
 import traceback
 
 
@@ -16,15 +19,18 @@ def make_parser_list():
     return ','.join([p.SOURCE_NAME for p in ALL_PARSERS])
 
 
-def download_all_queued_articles(db_root, sources):
+def download_all_queued_articles(db_root, sources, max_workers=None, parse_processes=1, time_budget=None, skip_syndicated=False, schedule='freshness', storage=DEFAULT_STORAGE_BACKEND):
     if not os.path.exists(db_root):
         print("no such database directory: {0}".format(db_root))
     else:
+        # the budget is shared by all the sources: whatever is left when it runs out stays queued
+        deadline = time.time() + time_budget if time_budget else None
         ArticleQueueDownloader.setup_logging()
         for parser in ALL_PARSERS:
             if parser.SOURCE_NAME in sources:
                 try:
-                    csxj.crawler.download_queued_articles(parser, db_root)
+                    csxj.crawler.download_queued_articles(parser, db_root, max_workers, parse_processes, deadline, skip_syndicated,
+                                                         make_scheduling_policy(schedule), storage)
                 except Exception:
                     stacktrace = traceback.format_exc()
                     print stacktrace
@@ -34,8 +40,14 @@ if __name__ == '__main__':
     arg_parser = argparse.ArgumentParser(description='Download, analyze and store all the queued articles in the csxj json database')
     arg_parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='directory to dump the json db in')
     arg_parser.add_argument('--sources', type=str, dest='sources', default=make_parser_list(), help='sources to consider (one of %s)' % make_parser_list())
+    arg_parser.add_argument('--workers', type=int, dest='workers', default=None, help='number of articles downloaded in parallel for each source (default: per-source setting)')
+    arg_parser.add_argument('--parse-processes', type=int, dest='parse_processes', default=1, help='number of processes used to parse the downloaded articles (default=1)')
+    arg_parser.add_argument('--time-budget', type=int, dest='time_budget', default=None, help='maximum number of seconds spent downloading, for all the sources (default: no limit)')
+    arg_parser.add_argument('--skip-syndicated', action='store_true', dest='skip_syndicated', default=False, help='do not download the stories another source of the same group already provided')
+    arg_parser.add_argument('--schedule', type=str, dest='schedule', default='freshness', choices=sorted(SCHEDULING_POLICIES), help='order in which the queued batches are downloaded (default=freshness: newest first, the backlog catching up at a bounded rate)')
+    arg_parser.add_argument('--storage', type=str, dest='storage', default=DEFAULT_STORAGE_BACKEND, choices=sorted(STORAGE_BACKENDS), help='where the articles are stored (default=%s, the raw html always goes to the json db directory)' % DEFAULT_STORAGE_BACKEND)
     args = arg_parser.parse_args()
 
     sources = [s for s in args.sources.split(',') if s]
 
-    download_all_queued_articles(args.jsondb, sources)
+    download_all_queued_articles(args.jsondb, sources, args.workers, args.parse_processes, args.time_budget, args.skip_syndicated, args.schedule, args.storage)
@@ -0,0 +1,23 @@
+"""
+Copies the articles, errors and link lists of a json db into its SQLite
+database (csxj.sqlite, at the root of the json db), for use with --storage=sqlite.
+The raw html stays where it is.
+"""
+import argparse
+import csxj.db as csxjdb
+from csxj.db.sqliteprovider import SQLiteProvider
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Imports the batches of a json db into its SQLite database')
+    parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='json db root directory')
+    args = parser.parse_args()
+
+    for source_name in csxjdb.get_all_provider_names(args.jsondb):
+        json_provider = csxjdb.Provider(args.jsondb, source_name)
+        sqlite_provider = SQLiteProvider(args.jsondb, source_name)
+        print(source_name)
+        for day_string in json_provider.get_all_days():
+            for batch_time_string in json_provider.get_all_batch_hours(day_string):
+                sqlite_provider.import_json_batch(json_provider, day_string, batch_time_string)
+            print('\t{0}'.format(day_string))
+        sqlite_provider.close()
@@ -0,0 +1,53 @@
+"""
+Converts the raw html of older batches, one file per page, to one
+raw_data.pack per batch. Reprocessed content is packed along the way.
+
+With --deduplicate, the pages go to the source's content store, and the
+packs already written with their own pages are moved there as well.
+"""
+import os
+import argparse
+import csxj.db as csxjdb
+from csxj.db import rawdata, presetdict
+from csxj.db.contentstore import get_content_store
+from csxj.db.constants import RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_INDEX_FILENAME, RAW_DATA_PACK_FILENAME
+
+
+def find_unpacked_batch_directories(source_directory):
+    for dirpath, dirnames, filenames in os.walk(source_directory):
+        if RAW_DATA_PACK_FILENAME in filenames:
+            continue
+        for kind in (RAW_DATA_DIR, ERRORS_RAW_DATA_DIR):
+            if kind in dirnames and os.path.exists(os.path.join(dirpath, kind, RAW_DATA_INDEX_FILENAME)):
+                yield dirpath
+                break
+
+
+def find_packs(source_directory):
+    for dirpath, dirnames, filenames in os.walk(source_directory):
+        if RAW_DATA_PACK_FILENAME in filenames:
+            yield os.path.join(dirpath, RAW_DATA_PACK_FILENAME)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Packs the raw html of the older batches, one pack file per batch')
+    parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='json db root directory')
+    parser.add_argument('--use-dictionaries', action='store_true', dest='use_dictionaries', default=False, help="compress the pages with their source's latest preset dictionary (see csxj_train_dictionary.py)")
+    parser.add_argument('--deduplicate', action='store_true', dest='deduplicate', default=False, help="store each page once, in the source's content store")
+    args = parser.parse_args()
+
+    for source_name in csxjdb.get_all_provider_names(args.jsondb):
+        source_directory = os.path.join(args.jsondb, source_name)
+        dictionary = presetdict.load_latest_dictionary(args.jsondb, source_name) if args.use_dictionaries else None
+        content_store = get_content_store(source_directory) if args.deduplicate else None
+        batch_count, page_count = 0, 0
+        for batch_directory in find_unpacked_batch_directories(source_directory):
+            page_count += rawdata.pack_raw_data_directories(batch_directory, dictionary, content_store)
+            batch_count += 1
+        print("{0}: packed {1} pages in {2} batches".format(source_name, page_count, batch_count))
+
+        if content_store:
+            moved_count = sum(rawdata.move_pack_to_content_store(pack_filename, content_store, dictionary)
+                              for pack_filename in find_packs(source_directory))
+            print("{0}: moved {1} packed pages to the content store, {2} of them were already there".format(
+                source_name, moved_count, content_store.deduplicated_count))
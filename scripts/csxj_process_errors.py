@@ -5,6 +5,8 @@ from datetime import datetime
 import json
 from jinja2 import Template, Environment, FileSystemLoader
 from csxj.db import Provider, get_all_provider_names, make_error_log_entry2
+from csxj.db import rawpack
+from csxj.db.contentstore import get_content_store
 from csxj.db.utils import convert_date_to_string, convert_hour_to_string
 from csxj.db.constants import *
 from csxj.datasources import lesoir, lalibre, dhnet, sudpresse, rtlinfo, lavenir
@@ -166,7 +168,7 @@ def save_reprocessed_data(batch_directory, articles, deleted_articles, raw_data)
     print "Writing {0} links to deleted articles to {1}".format(len(deleted_articles), os.path.join(outdir, DELETED_ARTICLES_FILENAME))
     write_dict_to_file({'deleted_articles':deleted_articles}, outdir, DELETED_ARTICLES_FILENAME)
 
-    print "Writing {0} raw html files to {1}".format(len(raw_data), os.path.join(outdir, RAW_DATA_DIR))
+    print "Writing {0} raw html files to {1}".format(len(raw_data), os.path.join(outdir, RAW_DATA_PACK_FILENAME))
     save_raw_data(raw_data, outdir)
 
 
@@ -184,19 +186,11 @@ def update_errors_file(batch_directory, errors):
 def save_raw_data(raw_data, batch_outdir):
      """
      """
-     raw_data_dir = os.path.join(batch_outdir, RAW_DATA_DIR)
-
-     if not os.path.exists(raw_data_dir):
-         os.mkdir(raw_data_dir)
-     references = []
-     for (i, (url, html_content)) in enumerate(raw_data):
-         outfilename = "{0}.html".format(i)
-         with open(os.path.join(raw_data_dir, outfilename), 'w') as f:
-             f.write(html_content)
-         references.append((url, outfilename))
-
-     with open(os.path.join(raw_data_dir, RAW_DATA_INDEX_FILENAME), 'w') as f:
-         json.dump(references, f)
+     # batch_outdir is <source>/<day>/<batch>/reprocessed_..., the pages go to the source's content store
+     source_directory = os.path.normpath(os.path.join(batch_outdir, os.pardir, os.pardir, os.pardir))
+     rawpack.write_pack(os.path.join(batch_outdir, RAW_DATA_PACK_FILENAME),
+                        [(RAW_DATA_DIR, url, html_content) for (url, html_content) in raw_data],
+                        content_store=get_content_store(source_directory))
 
 
 if __name__ == "__main__":
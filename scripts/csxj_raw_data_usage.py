@@ -0,0 +1,33 @@
+"""
+Reports the space taken by the raw html of each source: packs, older
+unpacked batches, content store, and what deduplication saved.
+"""
+import os
+import argparse
+import csxj.db as csxjdb
+from csxj.db.contentstore import measure_raw_data_usage
+
+
+def format_size(byte_count):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if byte_count < 1024:
+            return "{0:.1f}{1}".format(byte_count, unit)
+        byte_count /= 1024.0
+    return "{0:.1f}TB".format(byte_count)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reports the space taken by the raw html of each source')
+    parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='json db root directory')
+    args = parser.parse_args()
+
+    for source_name in csxjdb.get_all_provider_names(args.jsondb):
+        usage = measure_raw_data_usage(os.path.join(args.jsondb, source_name))
+        total_bytes = usage['pack_bytes'] + usage['unpacked_bytes'] + usage['store_bytes']
+        print(source_name)
+        print("\tpages:\t\t{0} ({1} different pages in the content store)".format(usage['page_count'], usage['unique_page_count']))
+        print("\ttotal:\t\t{0}".format(format_size(total_bytes)))
+        print("\tpacks:\t\t{0}".format(format_size(usage['pack_bytes'])))
+        print("\tunpacked:\t{0}".format(format_size(usage['unpacked_bytes'])))
+        print("\tcontent store:\t{0}".format(format_size(usage['store_bytes'])))
+        print("\tsaved by deduplication:\t{0}".format(format_size(usage['deduplicated_bytes'])))
@@ -0,0 +1,88 @@
+"""
+Runs the whole crawling pipeline (queue filling, then downloading) against
+archived pages, with no network access, and reports how long it took.
+
+Pages are served by a local stand-in (see csxj.datasources.parser_tools.replay)
+from the raw html of an existing json db and/or from a cassette directory.
+Frontpages are not part of the raw data archives: record them in a cassette
+first, with --record.
+"""
+import os
+import time
+import argparse
+import traceback
+import csxj.crawler
+from csxj.datasources import lalibre, dhnet, sudinfo, rtlinfo, lavenir, septsursept, lesoir_new
+from csxj.articlequeue import ArticleQueueFiller, ArticleQueueDownloader
+from csxj.datasources.parser_tools.fetcher import get_shared_fetcher
+from csxj.datasources.parser_tools.replay import PageArchive, ReplayServer
+
+
+ALL_PARSERS = dhnet, lalibre, rtlinfo, sudinfo, lavenir, septsursept, lesoir_new
+
+
+def make_parser_list():
+    return ','.join([p.SOURCE_NAME for p in ALL_PARSERS])
+
+
+def make_archive(archive_db_root, cassette_dir):
+    if archive_db_root:
+        return PageArchive.from_db(archive_db_root, cassette_dir)
+    else:
+        return PageArchive(cassette_dir)
+
+
+def run_benchmark(db_root, sources, archive, latency, jitter, record, max_workers=None, parse_processes=1):
+    if not os.path.exists(db_root):
+        os.mkdir(db_root)
+
+    server = ReplayServer(archive, latency, jitter, record)
+    server.start()
+    # the stand-in has no politeness limits to respect, only the crawler gets measured
+    get_shared_fetcher().set_proxy(server.url, rate_limited=False)
+    print("Replaying {0} archived pages from {1}".format(len(archive), server.url))
+
+    ArticleQueueFiller.setup_logging()
+    ArticleQueueDownloader.setup_logging()
+    parsers = [p for p in ALL_PARSERS if p.SOURCE_NAME in sources]
+    try:
+        start_time = time.time()
+        csxj.crawler.put_articles_in_all_queues(parsers, db_root)
+        filling_time = time.time() - start_time
+
+        start_time = time.time()
+        for parser in parsers:
+            try:
+                csxj.crawler.download_queued_articles(parser, db_root, max_workers, parse_processes)
+            except Exception:
+                print traceback.format_exc()
+        downloading_time = time.time() - start_time
+    finally:
+        get_shared_fetcher().set_proxy(None)
+        server.stop()
+
+    stats = get_shared_fetcher().stats.as_dict()
+    print("Filled the queues in {0:.2f}s, downloaded them in {1:.2f}s".format(filling_time, downloading_time))
+    print("Sent {0} requests, received {1} kB".format(stats.get('requests', 0), stats.get('bytes_received', 0) / 1024))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark the crawler end to end, against archived pages')
+    arg_parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='directory to dump the (scratch) json db in')
+    arg_parser.add_argument('--archive', type=str, dest='archive', default=None, help='json db whose raw data is replayed')
+    arg_parser.add_argument('--cassette', type=str, dest='cassette', default=None, help='cassette directory replayed (and recorded to, with --record)')
+    arg_parser.add_argument('--record', dest='record', action='store_true', help='fetch the pages missing from the archive on the live sites, and save them in the cassette')
+    arg_parser.add_argument('--latency', type=float, dest='latency', default=0.0, help='milliseconds added to every response (default=0)')
+    arg_parser.add_argument('--jitter', type=float, dest='jitter', default=0.0, help='random milliseconds added on top of the latency (default=0)')
+    arg_parser.add_argument('--sources', type=str, dest='sources', default=make_parser_list(), help='sources to consider (one of %s)' % make_parser_list())
+    arg_parser.add_argument('--workers', type=int, dest='workers', default=None, help='number of articles downloaded in parallel for each source (default: per-source setting)')
+    arg_parser.add_argument('--parse-processes', type=int, dest='parse_processes', default=1, help='number of processes used to parse the downloaded articles (default=1)')
+    args = arg_parser.parse_args()
+
+    if args.record and not args.cassette:
+        arg_parser.error('--record needs a --cassette directory')
+
+    sources = [s for s in args.sources.split(',') if s]
+    archive = make_archive(args.archive, args.cassette)
+    run_benchmark(args.jsondb, sources, archive, args.latency / 1000.0, args.jitter / 1000.0, args.record,
+                  args.workers, args.parse_processes)
@@ -7,6 +7,8 @@ import itertools as it
 from datetime import datetime
 
 import csxj.db as csxjdb
+from csxj.db import rawdata, rawpack
+from csxj.db.contentstore import get_content_store
 from csxj.datasources import lesoir, lalibre, dhnet, sudinfo, rtlinfo, lavenir, rtbfinfo, levif, septsursept, sudpresse, lesoir_new
 
 
@@ -43,38 +45,30 @@ def write_dict_to_file(d, outdir, outfile):
 
 def reprocess_single_batch(datasource_parser, raw_data_dir):
 
-    errors_index = []
     errors_raw_data_dir = os.path.join(raw_data_dir, os.path.pardir, csxjdb.constants.ERRORS_RAW_DATA_DIR)
-    if os.path.exists(errors_raw_data_dir):
-        errors_index_fpath = os.path.join(errors_raw_data_dir, csxjdb.constants.RAW_DATA_INDEX_FILENAME)
-        f = open(errors_index_fpath, 'r')
-        errors_index = json.load(f)
-        errors_index = [(errors_raw_data_dir, url, filename) for (url, filename) in errors_index]
-        f.close()
+    errors_index = rawdata.list_raw_pages(errors_raw_data_dir)
 
     reprocessed_articles = list()
     errors_encountered = list()
     raw_data_index_file = os.path.join(raw_data_dir, csxjdb.constants.RAW_DATA_INDEX_FILENAME)
+    raw_data_pack_file = rawdata.get_pack_filename(raw_data_dir)
 
-    if not os.path.exists(raw_data_index_file):
-        errors_encountered.append(("NO_URL", raw_data_index_file, "IOError: [Errno 2] No such file or directory: "+raw_data_index_file))
+    if not os.path.exists(raw_data_index_file) and not os.path.exists(raw_data_pack_file):
+        errors_encountered.append(("NO_URL", raw_data_pack_file, "IOError: [Errno 2] No such file or directory: "+raw_data_pack_file))
         return reprocessed_articles, errors_encountered
 
-    with open(raw_data_index_file, 'r') as f:
-        index = json.load(f)
-        index = [(raw_data_dir, url, filename) for (url, filename) in index]
-        for raw_data_dir, url, raw_file in it.chain(index, errors_index):
-            raw_filepath = os.path.join(raw_data_dir, raw_file)
-            try:
-                print u"°°° Reprocessing: {1} ({0})".format(url, raw_filepath)
-                with open(raw_filepath, 'r') as raw_html:
-                    article_data, html = datasource_parser.extract_article_data(raw_html)
-                    article_data.url = url
-                    reprocessed_articles.append((article_data, html))
-            except Exception as e:
-                stacktrace = traceback.format_exc()
-                print u"!!! FAIL", e
-                errors_encountered.append((url, raw_filepath, stacktrace))
+    index = rawdata.list_raw_pages(raw_data_dir)
+    for url, raw_filepath in it.chain(index, errors_index):
+        try:
+            print u"°°° Reprocessing: {1} ({0})".format(url, raw_filepath)
+            with rawdata.open_raw_html(raw_filepath) as raw_html:
+                article_data, html = datasource_parser.extract_article_data(raw_html)
+                article_data.url = url
+                reprocessed_articles.append((article_data, html))
+        except Exception as e:
+            stacktrace = traceback.format_exc()
+            print u"!!! FAIL", e
+            errors_encountered.append((url, raw_filepath, stacktrace))
 
     return reprocessed_articles, errors_encountered
 
@@ -91,21 +85,10 @@ def save_reprocessed_batch(dest_root_dir, source_name, day_string, batch_hour_st
 
     write_dict_to_file(articles_json_data, batch_root_dir, csxjdb.constants.ARTICLES_FILENAME)
 
-    raw_data_dir = os.path.join(batch_root_dir, csxjdb.constants.RAW_DATA_DIR)
-    if not os.path.exists(raw_data_dir):
-        os.makedirs(raw_data_dir)
-
-    print u"^^^ Saving raw html to {0}".format(raw_data_dir)
-    raw_data = [(a[0].url, a[1], "{0}.html".format(i)) for (i, a) in enumerate(articles)]
-    for url, raw_html, raw_html_filename in raw_data:
-        raw_filepath = os.path.join(raw_data_dir, raw_html_filename)
-        with open(raw_filepath, 'w') as f:
-            f.write(raw_html)
-
-    index = [(url, raw_filepath) for (url, raw_html, raw_filepath) in raw_data]
-    index_filepath = os.path.join(raw_data_dir, csxjdb.constants.RAW_DATA_INDEX_FILENAME)
-    with open(index_filepath, 'w') as f:
-        json.dump(index, f)
+    pack_filename = os.path.join(batch_root_dir, csxjdb.constants.RAW_DATA_PACK_FILENAME)
+    print u"^^^ Saving raw html to {0}".format(pack_filename)
+    rawpack.write_pack(pack_filename, [(csxjdb.constants.RAW_DATA_DIR, article.url, raw_html) for article, raw_html in articles],
+                       content_store=get_content_store(os.path.join(dest_root_dir, source_name)))
 
 
 def reprocess_raw_html(args):
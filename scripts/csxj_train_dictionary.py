@@ -0,0 +1,67 @@
+"""
+Trains a preset dictionary for the raw html of each source, from a sample of
+its archived pages, and stores it as a new version in the json db. From then
+on, the downloader compresses that source's pages with it.
+
+A share of the sample is kept aside to compare the dictionary with plain
+gzip before it is saved.
+"""
+import os
+import zlib
+import argparse
+import csxj.db as csxjdb
+from csxj.db import rawdata, presetdict
+from csxj.datasources.parser_tools.replay import find_raw_data_directories
+
+
+DEFAULT_SAMPLE_SIZE = 500
+
+# share of the sampled pages used to evaluate the dictionary rather than to train it
+EVALUATION_SHARE = 0.2
+
+
+def find_raw_html_files(source_directory):
+    for raw_data_dir in find_raw_data_directories(source_directory):
+        for url, location in rawdata.list_raw_pages(raw_data_dir):
+            yield location
+
+
+def evaluate_dictionary(pages, dictionary):
+    gzip_size = sum(len(zlib.compress(page, rawdata.COMPRESSION_LEVEL)) for page in pages)
+    dictionary_size = sum(len(rawdata.encode_with_dictionary(page, dictionary)) for page in pages)
+    return gzip_size, dictionary_size
+
+
+def train_source_dictionary(db_root, source_name, sample_size, dry_run):
+    filenames = presetdict.sample_pages(find_raw_html_files(os.path.join(db_root, source_name)), sample_size)
+    if len(filenames) < 2:
+        print("{0}: not enough pages to train a dictionary".format(source_name))
+        return
+    pages = [rawdata.read_raw_html(filename) for filename in filenames]
+    evaluation_count = max(1, int(EVALUATION_SHARE * len(pages)))
+    training_pages, evaluation_pages = pages[evaluation_count:], pages[:evaluation_count]
+
+    content = presetdict.train_dictionary(training_pages)
+    gzip_size, dictionary_size = evaluate_dictionary(evaluation_pages, presetdict.PresetDictionary(source_name, content))
+    print("{0}: {1} bytes dictionary trained on {2} pages, {3} pages take {4} bytes with gzip, {5} bytes with the dictionary ({6:.0%})".format(
+        source_name, len(content), len(training_pages), len(evaluation_pages), gzip_size, dictionary_size,
+        float(dictionary_size) / max(1, gzip_size)))
+
+    if not dry_run:
+        version = presetdict.save_dictionary(db_root, source_name, content)
+        print("{0}: saved as version {1}".format(source_name, version))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains a preset dictionary for the raw html of each source')
+    parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='json db root directory')
+    parser.add_argument('--sources', type=str, dest='sources', default=None, help='comma-separated list of the sources to consider (default: all of them)')
+    parser.add_argument('--sample-size', type=int, dest='sample_size', default=DEFAULT_SAMPLE_SIZE, help='number of pages sampled for each source (default=%d)' % DEFAULT_SAMPLE_SIZE)
+    parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False, help='only report how well the dictionaries would compress')
+    args = parser.parse_args()
+
+    source_names = csxjdb.get_all_provider_names(args.jsondb)
+    if args.sources:
+        source_names = [s for s in source_names if s in args.sources.split(',')]
+    for source_name in source_names:
+        train_source_dictionary(args.jsondb, source_name, args.sample_size, args.dry_run)
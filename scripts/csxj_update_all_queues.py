@@ -4,6 +4,7 @@
 import os
 import argparse
 import csxj.crawler
+from csxj import polling
 from csxj.datasources import lalibre, dhnet, sudinfo, rtlinfo, lavenir, rtbfinfo, levif, septsursept, lesoir_new
 from csxj.articlequeue import ArticleQueueFiller
 
@@ -14,15 +15,17 @@ def make_parser_list():
     return ','.join([p.SOURCE_NAME for p in ALL_PARSERS])
 
 
-def update_all_queues(db_root, sources):
+def update_all_queues(db_root, sources, max_workers=csxj.crawler.DEFAULT_FILLER_WORKERS, adaptive_polling=False,
+                      poll_interval_bounds=(polling.DEFAULT_MIN_POLL_INTERVAL, polling.DEFAULT_MAX_POLL_INTERVAL), check_rss=True):
     if not os.path.exists(db_root):
         print 'creating output directory:', db_root
         os.mkdir(db_root)
 
     ArticleQueueFiller.setup_logging()
-    for parser in ALL_PARSERS:
-        if parser.SOURCE_NAME in sources:
-            csxj.crawler.put_articles_in_queue(parser, db_root)
+    parsers = [parser for parser in ALL_PARSERS if parser.SOURCE_NAME in sources]
+    csxj.crawler.put_articles_in_all_queues(parsers, db_root, max_workers,
+                                            only_if_due=adaptive_polling, poll_interval_bounds=poll_interval_bounds,
+                                            check_rss=check_rss)
 
 
 if __name__ == '__main__':
@@ -30,7 +33,12 @@ if __name__ == '__main__':
     arg_parser.add_argument('--debug', dest='debug', action='store_true', help="run crawler in debug mode")
     arg_parser.add_argument('--jsondb', type=str, dest='jsondb', required=True, help='directory to dump the json db in')
     arg_parser.add_argument('--sources', type=str, dest='sources', default=make_parser_list(), help='sources to consider (one of %s' % make_parser_list())
+    arg_parser.add_argument('--workers', type=int, dest='workers', default=csxj.crawler.DEFAULT_FILLER_WORKERS, help='number of sources processed at the same time (default=%d)' % csxj.crawler.DEFAULT_FILLER_WORKERS)
+    arg_parser.add_argument('--adaptive-polling', action='store_true', dest='adaptive_polling', default=False, help='only poll the sources whose frontpage is due for a poll, given how often it changes (run this more often than the minimum interval)')
+    arg_parser.add_argument('--min-poll-interval', type=int, dest='min_poll_interval', default=polling.DEFAULT_MIN_POLL_INTERVAL, help='minimum number of seconds between two polls of a frontpage (default=%d)' % polling.DEFAULT_MIN_POLL_INTERVAL)
+    arg_parser.add_argument('--max-poll-interval', type=int, dest='max_poll_interval', default=polling.DEFAULT_MAX_POLL_INTERVAL, help='maximum number of seconds between two polls of a frontpage (default=%d)' % polling.DEFAULT_MAX_POLL_INTERVAL)
+    arg_parser.add_argument('--no-rss', action='store_false', dest='check_rss', default=True, help='always fetch the frontpages, even when the RSS feed of a source has nothing new')
     args = arg_parser.parse_args()
 
     sources = [s for s in args.sources.split(',') if s]
-    update_all_queues(args.jsondb, sources)
+    update_all_queues(args.jsondb, sources, args.workers, args.adaptive_polling, (args.min_poll_interval, args.max_poll_interval), args.check_rss)
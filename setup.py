@@ -12,7 +12,13 @@ setup(
         'scripts/csxj_update_metainfo.py',
         'scripts/csxj_list_errors.py',
         'scripts/csxj_queue_troubleshooting.py',
-        'scripts/csxj_process_errors.py'],
+        'scripts/csxj_process_errors.py',
+        'scripts/csxj_replay_benchmark.py',
+        'scripts/csxj_daemon.py',
+        'scripts/csxj_import_json_db_to_sqlite.py',
+        'scripts/csxj_train_dictionary.py',
+        'scripts/csxj_pack_raw_data.py',
+        'scripts/csxj_raw_data_usage.py'],
 
     version=csxj.__version__,
 
@@ -0,0 +1,173 @@
+# coding=utf-8
+
+import socket
+import threading
+import time
+import urllib2
+import zlib
+import gzip
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.datasources.parser_tools.fetcher import Fetcher, decode_content
+
+
+PAGES = {
+    '/article.html': (200, 'some article'),
+    '/moved': (301, '/article.html'),
+    '/gone': (404, 'not found'),
+    '/big.html': (200, '<p>some long article</p>' * 100),
+    '/slow.html': (200, 'some slow article'),
+    '/unchanged.html': (304, ''),
+}
+
+
+def gzip_compress(content):
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    f.write(content)
+    f.close()
+    return buf.getvalue()
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, payload = PAGES[self.path]
+        if self.path == '/slow.html':
+            time.sleep(0.5)
+        self.send_response(status)
+        if status == 301:
+            self.send_header('Location', payload)
+        if status == 304:
+            # servers keep announcing the encoding of the body they did not send
+            self.send_header('Content-Encoding', 'gzip')
+        accepted_encodings = self.headers.getheader('Accept-Encoding', '')
+        if status == 200 and 'gzip' in accepted_encodings and self.path == '/big.html':
+            payload = gzip_compress(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        elif status == 200 and 'deflate' in accepted_encodings:
+            payload = zlib.compress(payload)
+            self.send_header('Content-Encoding', 'deflate')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestFetcher(object):
+    def setUp(self):
+        self.server = LocalServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        self.fetcher = Fetcher()
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        """ fetcher reuses keep-alive connections to the same host """
+        for i in range(5):
+            page = self.fetcher.fetch(self.base_url + '/article.html')
+            eq_(page.content, 'some article')
+
+        stats = self.fetcher.stats.as_dict()
+        eq_(stats['requests'], 5)
+        eq_(stats['connections_opened'], 1)
+        eq_(stats['connections_reused'], 4)
+
+    def test_follows_redirects(self):
+        """ fetcher follows redirects """
+        page = self.fetcher.fetch(self.base_url + '/moved')
+        eq_(page.content, 'some article')
+        ok_(page.url.endswith('/article.html'))
+
+    @raises(urllib2.HTTPError)
+    def test_http_errors_are_raised(self):
+        """ fetcher raises urllib2.HTTPError on error codes """
+        self.fetcher.fetch(self.base_url + '/gone')
+
+    def test_http_error_code(self):
+        """ fetcher keeps the status code in the raised HTTPError """
+        try:
+            self.fetcher.fetch(self.base_url + '/gone')
+        except urllib2.HTTPError as e:
+            eq_(e.code, 404)
+        else:
+            ok_(False, msg="no HTTPError was raised")
+
+    def test_gzip_content_is_decompressed(self):
+        """ fetcher negotiates gzip and decompresses the content """
+        page = self.fetcher.fetch(self.base_url + '/big.html')
+        eq_(page.content, PAGES['/big.html'][1])
+
+        stats = self.fetcher.stats.as_dict()
+        eq_(stats['bytes_decompressed'], len(PAGES['/big.html'][1]))
+        ok_(stats['bytes_received'] < stats['bytes_decompressed'])
+
+    def test_deflate_content_is_decompressed(self):
+        """ fetcher negotiates deflate and decompresses the content """
+        page = self.fetcher.fetch(self.base_url + '/article.html')
+        eq_(page.content, 'some article')
+
+    def test_not_modified_without_body(self):
+        """ fetcher does not try to decompress the missing body of a 304 """
+        page = self.fetcher.fetch(self.base_url + '/unchanged.html')
+        eq_(page.status, 304)
+        eq_(page.content, '')
+
+    @raises(socket.timeout)
+    def test_read_timeout(self):
+        """ fetcher gives up on servers which take too long to answer """
+        fetcher = Fetcher(read_timeout=0.1)
+        try:
+            fetcher.fetch(self.base_url + '/slow.html')
+        finally:
+            fetcher.close()
+
+    def test_connection_is_closed_on_errors(self):
+        """ fetcher closes the connection when a request fails, instead of leaking it """
+        opened_connections = list()
+        pool = self.fetcher.get_pool('http', self.base_url[len('http://'):])
+        make_connection = pool.make_connection
+
+        def recording_make_connection():
+            conn = make_connection()
+            opened_connections.append(conn)
+            return conn
+
+        def failing_get_response(conn, path, headers):
+            raise ValueError("something unexpected")
+
+        pool.make_connection = recording_make_connection
+        self.fetcher.get_response = failing_get_response
+        try:
+            self.fetcher.fetch(self.base_url + '/article.html')
+        except ValueError:
+            pass
+        else:
+            ok_(False, msg="no ValueError was raised")
+
+        eq_(len(opened_connections), 1)
+        eq_(opened_connections[0].sock, None)
+        eq_(pool.idle_connections, [])
+
+
+def test_decode_empty_content():
+    """ empty bodies are left as they are, whatever their Content-Encoding """
+    for content_encoding in ('gzip', 'deflate', None):
+        eq_(decode_content('', content_encoding), '')
@@ -0,0 +1,58 @@
+# coding=utf-8
+
+import time
+
+from nose.tools import eq_, ok_
+
+from csxj.datasources.parser_tools.ratelimiter import TokenBucket, HostLimiter, RateLimiter
+
+
+class TestTokenBucket(object):
+    def test_burst_is_not_throttled(self):
+        """ token bucket lets a full burst through without waiting """
+        bucket = TokenBucket(rate=1.0, burst=3)
+        waits = [bucket.take() for i in range(3)]
+        eq_(waits, [0.0, 0.0, 0.0])
+
+    def test_rate_is_enforced(self):
+        """ token bucket makes requests wait once the burst is spent """
+        bucket = TokenBucket(rate=50.0, burst=1)
+        start = time.time()
+        for i in range(6):
+            bucket.take()
+        ok_(time.time() - start >= 0.09)
+
+
+class TestHostLimiter(object):
+    def test_throttling_halves_concurrency(self):
+        """ host limiter halves its concurrency on 429/503 responses """
+        limiter = HostLimiter(max_concurrency=8)
+        limiter.concurrency = 8
+        limiter.update_concurrency(503, 0.1)
+        eq_(limiter.concurrency, 4)
+        limiter.update_concurrency(429, 0.1)
+        eq_(limiter.concurrency, 2)
+
+    def test_fast_responses_increase_concurrency(self):
+        """ host limiter grows its concurrency up to the maximum while responses are fast """
+        limiter = HostLimiter(max_concurrency=6, target_latency=1.0)
+        for i in range(100):
+            limiter.update_concurrency(200, 0.1)
+        eq_(limiter.concurrency, 6)
+
+    def test_slow_responses_decrease_concurrency(self):
+        """ host limiter shrinks its concurrency while responses are slow """
+        limiter = HostLimiter(max_concurrency=6, target_latency=1.0)
+        limiter.concurrency = 6
+        for i in range(100):
+            limiter.update_concurrency(200, 5.0)
+        eq_(limiter.concurrency, 1)
+
+
+class TestRateLimiter(object):
+    def test_hosts_are_normalized(self):
+        """ rate limiter shares limits between www.host and host """
+        limiter = RateLimiter()
+        limiter.configure('www.rtl.be', requests_per_second=5.0, burst=8, max_concurrency=8)
+        ok_(limiter.get('rtl.be') is limiter.get('WWW.RTL.BE'))
+        eq_(limiter.get('rtl.be').max_concurrency, 8)
@@ -0,0 +1,94 @@
+# coding=utf-8
+
+import os
+import json
+import shutil
+import time
+import tempfile
+import urllib2
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.datasources.parser_tools.fetcher import Fetcher
+from csxj.datasources.parser_tools.replay import PageArchive, ReplayServer
+from csxj.db.rawpack import write_pack
+
+
+ARCHIVED_PAGES = [
+    (u"http://www.lesoir.be/article.html", u"0.html", "<html>some article</html>"),
+    (u"http://www.dhnet.be/other.html", u"1.html", "<html>some other article</html>"),
+]
+
+
+def make_raw_data_directory(raw_data_dir):
+    os.makedirs(raw_data_dir)
+    for url, filename, html_content in ARCHIVED_PAGES:
+        with open(os.path.join(raw_data_dir, filename), 'w') as f:
+            f.write(html_content)
+    with open(os.path.join(raw_data_dir, 'references.json'), 'w') as f:
+        json.dump([(url, filename) for (url, filename, html_content) in ARCHIVED_PAGES], f)
+
+
+class TestPageArchive(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        make_raw_data_directory(os.path.join(self.db_root, 'lesoir', '2013-01-01', '10.00.00', 'raw_data'))
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_pages_are_found_in_db(self):
+        """ page archive indexes the raw data of every batch """
+        archive = PageArchive.from_db(self.db_root)
+        eq_(len(archive), 2)
+        eq_(archive.get('http://www.lesoir.be/article.html'), "<html>some article</html>")
+        eq_(archive.get('http://www.lesoir.be/unknown.html'), None)
+
+    def test_packed_pages_are_found_in_db(self):
+        """ page archive indexes the raw data of packed batches too """
+        write_pack(os.path.join(self.db_root, 'dhnet', '2013-01-01', '10.00.00', 'raw_data.pack'),
+                   [('errors_raw_data', u"http://www.dhnet.be/broken.html", "<html>a broken article</html>")])
+        archive = PageArchive.from_db(self.db_root)
+        eq_(len(archive), 3)
+        eq_(archive.get('http://www.dhnet.be/broken.html'), "<html>a broken article</html>")
+
+    def test_recorded_pages_are_replayed(self):
+        """ pages recorded in a cassette are found by the next archive """
+        cassette_dir = os.path.join(self.db_root, 'cassette')
+        PageArchive(cassette_dir).record('http://www.lesoir.be', "<html>frontpage</html>")
+        eq_(PageArchive(cassette_dir).get('http://www.lesoir.be'), "<html>frontpage</html>")
+
+
+class TestReplayServer(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        make_raw_data_directory(os.path.join(self.db_root, 'lesoir', '2013-01-01', '10.00.00', 'raw_data'))
+        self.server = ReplayServer(PageArchive.from_db(self.db_root))
+        self.server.start()
+        self.fetcher = Fetcher()
+        self.fetcher.set_proxy(self.server.url)
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.stop()
+        shutil.rmtree(self.db_root)
+
+    def test_archived_pages_are_served(self):
+        """ replay server answers proxied requests from the archive """
+        for url, filename, html_content in ARCHIVED_PAGES:
+            eq_(self.fetcher.fetch(url).content, html_content)
+        ok_(self.fetcher.stats.as_dict()['bytes_received'] > 0)
+
+    @raises(urllib2.HTTPError)
+    def test_missing_pages_are_not_found(self):
+        """ replay server answers 404 for pages which are not archived """
+        self.fetcher.fetch('http://www.lesoir.be/unknown.html')
+
+    def test_replayed_requests_can_skip_the_rate_limits(self):
+        """ replayed requests are not held back by the politeness limits of the sites """
+        self.fetcher.limiter.configure('www.lesoir.be', requests_per_second=1.0, burst=1)
+        self.fetcher.set_proxy(self.server.url, rate_limited=False)
+        start_time = time.time()
+        for i in range(3):
+            self.fetcher.fetch('http://www.lesoir.be/article.html')
+        ok_(time.time() - start_time < 1.0)
@@ -0,0 +1,95 @@
+# coding=utf-8
+
+import urllib2
+from StringIO import StringIO
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.datasources.parser_tools.retry import retry_with_backoff, is_transient_error
+from csxj.datasources.parser_tools.retry import CircuitBreaker, CircuitOpenError
+
+
+def make_http_error(code):
+    return urllib2.HTTPError('http://www.example.com', code, 'error', None, StringIO(''))
+
+
+class FlakyFunction(object):
+    def __init__(self, failures, exception):
+        self.failures = failures
+        self.exception = exception
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exception
+        return 'ok'
+
+
+class TestRetryWithBackoff(object):
+    def test_transient_errors(self):
+        """ 503 and connection errors are transient, 404 is not """
+        ok_(is_transient_error(make_http_error(503)))
+        ok_(is_transient_error(urllib2.URLError('connection refused')))
+        ok_(not is_transient_error(make_http_error(404)))
+        ok_(not is_transient_error(ValueError()))
+
+    def test_transient_errors_are_retried(self):
+        """ retry_with_backoff retries transient errors until it succeeds """
+        func = FlakyFunction(2, make_http_error(503))
+        eq_(retry_with_backoff(func, max_attempts=3, base_delay=0.001), 'ok')
+        eq_(func.calls, 3)
+
+    def test_permanent_errors_are_not_retried(self):
+        """ retry_with_backoff gives up right away on permanent errors """
+        func = FlakyFunction(1, make_http_error(404))
+        try:
+            retry_with_backoff(func, max_attempts=3, base_delay=0.001)
+        except urllib2.HTTPError:
+            pass
+        eq_(func.calls, 1)
+
+    @raises(urllib2.HTTPError)
+    def test_last_error_is_raised(self):
+        """ retry_with_backoff re-raises the error after the last attempt """
+        retry_with_backoff(FlakyFunction(5, make_http_error(503)), max_attempts=3, base_delay=0.001)
+
+
+class TestCircuitBreaker(object):
+    def test_circuit_opens_after_consecutive_failures(self):
+        """ circuit breaker rejects requests after too many consecutive failures """
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for i in range(3):
+            try:
+                breaker.call(FlakyFunction(1, make_http_error(503)))
+            except urllib2.HTTPError:
+                pass
+        ok_(breaker.is_rejecting_requests())
+
+        func = FlakyFunction(0, None)
+        try:
+            breaker.call(func)
+        except CircuitOpenError:
+            pass
+        eq_(func.calls, 0)
+
+    def test_permanent_errors_do_not_open_the_circuit(self):
+        """ circuit breaker ignores errors which mean the site is up """
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        for i in range(5):
+            try:
+                breaker.call(FlakyFunction(1, make_http_error(404)))
+            except urllib2.HTTPError:
+                pass
+        ok_(not breaker.is_open)
+
+    def test_circuit_closes_after_successful_trial(self):
+        """ circuit breaker lets a trial request through after the reset timeout """
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        try:
+            breaker.call(FlakyFunction(1, make_http_error(503)))
+        except urllib2.HTTPError:
+            pass
+        ok_(breaker.is_open)
+        eq_(breaker.call(FlakyFunction(0, None)), 'ok')
+        ok_(not breaker.is_open)
@@ -188,3 +188,36 @@ class Test7sur7ContentExtraction(object):
             expected_content = [u'Si la tension est clairement mont\xe9e entre Jelle Van Damme et Benjamin Deceuninck hier soir \xe0 Mouscron, l\'incident continue \xe0 faire couler beaucoup d\'encre. Le journaliste de la RTBF ne s\'est pas "senti menac\xe9". De son c\xf4t\xe9, Jelle Van Damme n\'avait pas encore donn\xe9 sa version des faits."Il a peut-\xeatre \xe9t\xe9 surpris""Ce n\'est pas un probl\xe8me pour moi d\'en reparler. Lui (NDLR: Benjamin Deceuninck) a peut-\xeatre \xe9t\xe9 surpris. C\'est mon avis. Quand on joue 120 minutes et qu\'on se bat, j\'estime que ce n\'\xe9tait pas le moment de poser une question comme \xe7a. OK, c\'est leur m\xe9tier. Alors, j\'ai aussi le droit de r\xe9agir comme \xe7a. J\'ai peut-\xeatre un peu trop agressif, trop direct. Mais cette question \xe9tait inutile \xe0 ce moment pr\xe9cis. Pour moi, \xe7a reste une question ridicule. Elle ne sert \xe0 rien hormis qu\'\xe0 cr\xe9er une atmosph\xe8re n\xe9gative. Je vais toujours prot\xe9ger mes co\xe9quipiers, le coach ou le pr\xe9sident", a soulign\xe9 Jelle Van Damme sur "Standard TV".BuzzNe supportant visiblement pas une question directe du journaliste de la RTBF \xe0 son entra\xeeneur, Jelle Van Damme s\'est ensuite montr\xe9 agressif verbalement. "Si tu commences avec des questions comme \xe7a... Fais attention \xe0 toi", a-t-il dit, en direct, tout en pointant du doigt Deceuninck."Je connais le temp\xe9rament de Jelle""Je tiens \xe0 pr\xe9ciser qu\'\xe0 aucun moment je ne me suis senti en danger physiquement. J\'ai \xe9t\xe9 surpris par l\'ampleur de la r\xe9action, je l\'avoue. Mais, je connais le temp\xe9rament de Jelle... Et il y avait beaucoup d\'adr\xe9naline durant cette rencontre. Pour moi, on peut trouver une question idiote ou non appropri\xe9e, mais \xe9vitons ce genre de d\xe9rapage.""Van Damme doit m\'appeler"Les choses vont donc en rester l\xe0. "Bien entendu ! Il n\'y a aucune raison de dramatiser. D\'ailleurs, Van Damme doit m\'appeler aujourd\'hui pour aplanir le diff\xe9rend", a d\xe9voil\xe9 le journaliste.Pour le Standard, "l\'incident est clos"Du c\xf4t\xe9 du Standard de Li\xe8ge, on estime "qu\'un journaliste doit avoir le droit de poser des questions directes tout en reconnaissant le droit \xe0 ses interlocuteurs de r\xe9agir. Van Damme s\'est simplement laiss\xe9 envahir par l\'\xe9motion. Pour nous, l\'incident est clos."']
             eq_(len(article.content), len(expected_content), msg=u"Expected {0} paragraphs, got {1}".format(len(article.content), len(expected_content)))
             eq_(article.content, expected_content)
+
+
+def make_frontpage_html(item_count):
+    items = "".join('<article><h3><a href="/7s7/fr/1505/Monde/article/detail/{0}/story.dhtml">Story {0}</a></h3></article>'.format(i)
+                    for i in range(item_count))
+    return "<html><body><section>{0}</section></body></html>".format(items)
+
+
+class Test7sur7PageTypeDetection(object):
+    def setUp(self):
+        self.article_url = "http://www.7sur7.be/7s7/fr/1505/Monde/article/detail/1451992/2012/06/11/Nadine-Morano.dhtml"
+
+    def test_article_parsing_does_not_fetch_anything(self):
+        """ The 7sur7.be parser tells articles from the frontpage without fetching the frontpage """
+        def fail():
+            raise AssertionError("the frontpage was fetched")
+        get_frontpage_toc = septsursept.get_frontpage_toc
+        septsursept.get_frontpage_toc = fail
+        try:
+            with open(os.path.join(DATA_ROOT, "same_owner.html")) as f:
+                article, _ = septsursept.parse_article(f.read(), self.article_url)
+            eq_(article.url, self.article_url)
+            eq_(septsursept.detect_page_type(make_frontpage_html(40), self.article_url), septsursept.IS_FRONTPAGE)
+        finally:
+            septsursept.get_frontpage_toc = get_frontpage_toc
+
+    def test_frontpage_url(self):
+        """ The 7sur7.be parser recognizes the frontpage by its url """
+        eq_(septsursept.detect_page_type(make_frontpage_html(5), "http://www.7sur7.be/"), septsursept.IS_FRONTPAGE)
+
+    def test_page_listing_a_few_stories(self):
+        """ The 7sur7.be parser does not take a page listing a few stories for the frontpage """
+        eq_(septsursept.detect_page_type(make_frontpage_html(5), self.article_url), septsursept.MAYBE_ARTICLE)
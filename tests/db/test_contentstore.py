@@ -0,0 +1,72 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.db import Provider, rawdata
+from csxj.db.contentstore import ContentStore, get_content_store, measure_raw_data_usage
+from csxj.db.rawpack import RawDataPack, write_pack
+from csxj.db.constants import RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_PACK_FILENAME
+
+
+ARTICLE = "<html>some article</html>" * 10
+BROKEN_ARTICLE = "<html>a broken article</html>" * 10
+
+
+class TestContentStore(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.source_directory = os.path.join(self.db_root, 'lesoir')
+        self.store = get_content_store(self.source_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def batch_pack_filename(self, batch_time_string):
+        return os.path.join(self.source_directory, '2013-01-01', batch_time_string, RAW_DATA_PACK_FILENAME)
+
+    def test_pages_are_stored_once(self):
+        """ storing the same page again only returns its hash """
+        content_hash = self.store.put(ARTICLE)
+        eq_(self.store.put(ARTICLE.decode('utf-8')), content_hash)
+        eq_(self.store.deduplicated_count, 1)
+        eq_(self.store.get(content_hash), ARTICLE)
+        eq_(self.store.get_usage()[0], 1)
+        # a store opened by another downloader sees them too
+        ok_(content_hash in ContentStore(self.source_directory))
+
+    @raises(IOError)
+    def test_unknown_hash(self):
+        self.store.get('0' * 40)
+
+    def test_batches_refer_to_the_store(self):
+        """ packs hold references to the pages, which read like any other """
+        write_pack(self.batch_pack_filename('10.00.00'), [(RAW_DATA_DIR, u"http://www.lesoir.be/1", ARTICLE),
+                                                          (ERRORS_RAW_DATA_DIR, u"http://www.lesoir.be/2", BROKEN_ARTICLE)],
+                   content_store=self.store)
+        write_pack(self.batch_pack_filename('12.00.00'), [(RAW_DATA_DIR, u"http://www.lesoir.be/1", ARTICLE)],
+                   content_store=self.store)
+        eq_(self.store.get_usage()[0], 2)
+
+        provider = Provider(self.db_root, 'lesoir')
+        eq_(provider.get_all_days(), ['2013-01-01'])
+        eq_(provider.get_raw_html('2013-01-01', '12.00.00', u"http://www.lesoir.be/1"), ARTICLE)
+        eq_(list(rawdata.iter_raw_data(os.path.join(self.source_directory, '2013-01-01', '10.00.00', ERRORS_RAW_DATA_DIR))),
+            [(u"http://www.lesoir.be/2", BROKEN_ARTICLE)])
+
+        usage = measure_raw_data_usage(self.source_directory)
+        eq_((usage['page_count'], usage['unique_page_count']), (3, 2))
+        eq_(usage['deduplicated_bytes'], self.store.lookup(self.store.put(ARTICLE))[2])
+
+    def test_packs_are_moved_to_the_store(self):
+        """ packs holding their own pages can be rewritten to refer to the store """
+        pack_filename = self.batch_pack_filename('10.00.00')
+        write_pack(pack_filename, [(RAW_DATA_DIR, u"http://www.lesoir.be/1", ARTICLE)])
+        eq_(rawdata.move_pack_to_content_store(pack_filename, self.store), 1)
+        eq_(rawdata.move_pack_to_content_store(pack_filename, self.store), 0)
+        with RawDataPack(pack_filename) as pack:
+            ok_(pack.index[0][4].startswith('sha1:'))
+            eq_(pack.get(u"http://www.lesoir.be/1"), ARTICLE)
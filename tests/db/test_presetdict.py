@@ -0,0 +1,74 @@
+# coding=utf-8
+
+import os
+import zlib
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.db import presetdict, rawdata
+
+
+TEMPLATE = """<html>
+<head><title>Le Soir</title><script src="/js/lesoir.min.js"></script></head>
+<body>
+<div id="navigation"><a href="/belgique">Belgique</a><a href="/monde">Monde</a><a href="/sports">Sports</a></div>
+{0}
+<div id="footer">Copyright Rossel &amp; Cie SA, tous droits reserves</div>
+</body>
+</html>
+"""
+
+
+def make_page(i):
+    return TEMPLATE.format("<p>Article number {0}, with its own content.</p>".format(i))
+
+
+class TestPresetDictionary(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.pages = [make_page(i) for i in range(20)]
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_pages_are_compressed_better_than_alone(self):
+        """ the template shared by the pages ends up in the dictionary """
+        content = presetdict.train_dictionary(self.pages)
+        ok_('<div id="footer">Copyright Rossel &amp; Cie SA, tous droits reserves</div>\n' in content)
+        ok_('Article number' not in content)
+
+        dictionary = presetdict.PresetDictionary('lesoir/1', content)
+        page = make_page(100)
+        compressed = dictionary.compress(page)
+        eq_(dictionary.decompress(compressed), page)
+        ok_(len(compressed) < len(zlib.compress(page)) / 2)
+
+    def test_dictionaries_are_versioned(self):
+        """ training again adds a version, the latest one is used """
+        eq_(presetdict.load_latest_dictionary(self.db_root, 'lesoir'), None)
+        eq_(presetdict.save_dictionary(self.db_root, 'lesoir', 'first'), 1)
+        eq_(presetdict.save_dictionary(self.db_root, 'lesoir', 'second'), 2)
+        eq_(presetdict.get_dictionary_versions(self.db_root, 'lesoir'), [1, 2])
+        eq_(presetdict.load_latest_dictionary(self.db_root, 'lesoir').id, 'lesoir/2')
+
+    def test_raw_data_is_read_back_with_its_dictionary(self):
+        """ pages find the dictionary they were compressed with in their database """
+        presetdict.save_dictionary(self.db_root, 'lesoir', presetdict.train_dictionary(self.pages))
+        dictionary = presetdict.load_latest_dictionary(self.db_root, 'lesoir')
+        raw_data_dir = os.path.join(self.db_root, 'lesoir', '2013-01-01', '10.00.00', 'raw_data')
+        rawdata.save_raw_data([(u"http://www.lesoir.be/1", make_page(1))], raw_data_dir, dictionary=dictionary)
+        # a newer version does not change how the older pages are read
+        presetdict.save_dictionary(self.db_root, 'lesoir', 'unrelated')
+
+        eq_(list(rawdata.iter_raw_data(raw_data_dir)), [(u"http://www.lesoir.be/1", make_page(1))])
+        with rawdata.open_raw_html(os.path.join(raw_data_dir, '0.html.zd')) as f:
+            eq_(f.read(), make_page(1))
+
+    @raises(IOError)
+    def test_missing_dictionary(self):
+        raw_data_dir = os.path.join(self.db_root, 'lesoir', 'raw_data')
+        rawdata.save_raw_data([(u"http://www.lesoir.be/1", make_page(1))], raw_data_dir,
+                              dictionary=presetdict.PresetDictionary('lesoir/42', 'whatever'))
+        list(rawdata.iter_raw_data(raw_data_dir))
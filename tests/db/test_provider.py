@@ -0,0 +1,71 @@
+# coding=utf-8
+
+import os
+import json
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.db import Provider
+
+
+class TestProviderQueue(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.provider = Provider(self.db_root, 'fakesource')
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_requeued_items_make_a_new_batch(self):
+        """ requeued items are stored in their own batch, next to the other ones """
+        items = dict(articles=[[u"title", u"http://www.example.com/1"]], blogposts=[], paywalled_articles=[])
+        first_batch = self.provider.requeue_items('2013-01-01', items)
+        second_batch = self.provider.requeue_items('2013-01-01', items)
+        ok_(first_batch != second_batch)
+
+        queued_items = self.provider.get_queued_batches_by_day()
+        eq_(len(queued_items), 1)
+        day_string, batches = queued_items[0]
+        eq_(day_string, '2013-01-01')
+        eq_([batch_hour for (batch_hour, batch_items) in batches], sorted([first_batch, second_batch]))
+        eq_(batches[0][1], items)
+
+    def test_committing_last_batch_removes_day(self):
+        """ committing the last batch of a day removes the day from the queue """
+        items = dict(articles=[], blogposts=[], paywalled_articles=[])
+        self.provider.requeue_items('2013-01-01', items)
+        self.provider.commit_queued_batch(self.provider.claim_queued_batch('worker'))
+        eq_(self.provider.get_queued_batches_by_day(), [])
+        eq_(self.provider.get_queued_items_count(), 0)
+
+    def test_legacy_queue_is_migrated(self):
+        """ batches queued as one json file per batch are moved to the journal """
+        items = dict(articles=[[u"title", u"http://www.example.com/1"]], blogposts=[], paywalled_articles=[])
+        day_directory = os.path.join(self.db_root, 'fakesource', 'queue', '2013-01-01')
+        os.makedirs(day_directory)
+        with open(os.path.join(day_directory, '10.00.00.json'), 'w') as f:
+            json.dump(items, f)
+
+        # reading the queue leaves it as it is
+        eq_(self.provider.get_queued_batches_by_day(), [('2013-01-01', [('10.00.00', items)])])
+        eq_(self.provider.get_queued_items_count(), 1)
+        ok_(os.path.exists(day_directory))
+
+        queued_batch = self.provider.claim_queued_batch('worker')
+        eq_((queued_batch.day, queued_batch.batch, queued_batch.items), ('2013-01-01', '10.00.00', items))
+        ok_(not os.path.exists(day_directory))
+        eq_(self.provider.get_queued_items_count(), 1)
+
+    def test_reading_a_missing_queue_creates_nothing(self):
+        """ reading the queue of a source which has none does not create it """
+        eq_(self.provider.get_queued_batches_by_day(), [])
+        eq_(self.provider.get_queue_depth(), (0, 0))
+        ok_(not os.path.exists(os.path.join(self.db_root, 'fakesource')))
+
+    def test_unfinished_batches_are_ignored(self):
+        """ batches still being written by a downloader are not part of the database """
+        os.makedirs(os.path.join(self.db_root, 'fakesource', '2013-01-01', '.10.00.00.worker.tmp'))
+        eq_(self.provider.get_all_days(), ['2013-01-01'])
+        eq_(self.provider.get_all_batch_hours('2013-01-01'), [])
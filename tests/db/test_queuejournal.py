@@ -0,0 +1,143 @@
+# coding=utf-8
+
+import os
+import json
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.db.queuejournal import QueueJournal, JOURNAL_FILENAME, ENQUEUED_COUNTS_FILENAME
+
+
+def make_items(article_count):
+    return dict(articles=[[u"title", u"http://www.example.com/{0}".format(i)] for i in range(article_count)],
+                blogposts=[], paywalled_articles=[])
+
+
+class TestQueueJournal(object):
+    def setUp(self):
+        self.queue_dir = tempfile.mkdtemp()
+        self.journal = QueueJournal(self.queue_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.queue_dir)
+
+    def test_batches_are_read_in_order(self):
+        """ queue journal gives back the pending batches in the order they were queued """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(2))
+        pending = self.journal.get_pending_batches()
+        eq_([(b.day, b.batch, b.items) for b in pending], [('2013-01-01', '10.00.00', make_items(1)),
+                                                          ('2013-01-01', '11.00.00', make_items(2))])
+        eq_(self.journal.get_depth(), (2, 3))
+
+    def test_committed_batches_are_not_read_again(self):
+        """ queue journal resumes after the last committed batch """
+        for hour in ('10.00.00', '11.00.00', '12.00.00'):
+            self.journal.enqueue('2013-01-01', hour, make_items(1))
+        self.journal.commit(self.journal.get_pending_batches()[0])
+
+        pending = QueueJournal(self.queue_dir).get_pending_batches()
+        eq_([b.batch for b in pending], ['11.00.00', '12.00.00'])
+        eq_(self.journal.get_depth(), (2, 2))
+
+    def test_out_of_order_commits(self):
+        """ queue journal accepts batches committed out of order """
+        for hour in ('10.00.00', '11.00.00', '12.00.00'):
+            self.journal.enqueue('2013-01-01', hour, make_items(1))
+        first, second, third = self.journal.get_pending_batches()
+
+        self.journal.commit(second)
+        eq_([b.batch for b in self.journal.get_pending_batches()], ['10.00.00', '12.00.00'])
+        self.journal.commit(first)
+        self.journal.commit(first)
+        eq_([b.batch for b in self.journal.get_pending_batches()], ['12.00.00'])
+        eq_(self.journal.get_depth(), (1, 1))
+
+    def test_consumed_journal_is_truncated(self):
+        """ queue journal starts over once everything has been consumed """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        queued_batch = self.journal.get_pending_batches()[0]
+        self.journal.commit(queued_batch)
+        eq_(os.path.getsize(os.path.join(self.queue_dir, JOURNAL_FILENAME)), 0)
+
+        self.journal.enqueue('2013-01-02', '10.00.00', make_items(1))
+        # a stale commit of the old batch must not consume the new one
+        self.journal.commit(queued_batch)
+        eq_([b.day for b in self.journal.get_pending_batches()], ['2013-01-02'])
+
+    def test_partial_line_is_dropped(self):
+        """ queue journal ignores a batch which was not completely written """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        with open(os.path.join(self.queue_dir, JOURNAL_FILENAME), 'ab') as f:
+            f.write('{"day": "2013-01-01", "bat')
+        eq_(len(self.journal.get_pending_batches()), 1)
+
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(1))
+        eq_([b.batch for b in self.journal.get_pending_batches()], ['10.00.00', '11.00.00'])
+
+    def test_leased_batches_are_not_claimed_twice(self):
+        """ queue journal hands out each batch to a single downloader """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(1))
+
+        eq_(self.journal.claim_next('a').batch, '10.00.00')
+        eq_(self.journal.claim_next('b').batch, '11.00.00')
+        eq_(self.journal.claim_next('c'), None)
+
+    def test_expired_leases_are_reclaimed(self):
+        """ queue journal hands out again the batches of downloaders which went away """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        queued_batch = self.journal.claim_next('a', lease_duration=-1)
+
+        eq_(self.journal.claim_next('b'), queued_batch)
+        ok_(not self.journal.renew(queued_batch, 'a'))
+        ok_(self.journal.renew(queued_batch, 'b'))
+
+    def test_released_and_committed_batches(self):
+        """ queue journal lets a released batch be claimed again, but not a committed one """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        queued_batch = self.journal.claim_next('a')
+        self.journal.release(queued_batch, 'a')
+
+        eq_(self.journal.claim_next('b'), queued_batch)
+        self.journal.commit(queued_batch)
+        eq_(self.journal.claim_next('c'), None)
+        eq_(self.journal.read_leases(), dict())
+
+    def test_uncounted_batches_are_counted(self):
+        """ queue journal counts the batches a crashed filler appended without counting them """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        with open(os.path.join(self.queue_dir, ENQUEUED_COUNTS_FILENAME)) as f:
+            counts = f.read()
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(2))
+        # as if the filler died before writing the counts
+        with open(os.path.join(self.queue_dir, ENQUEUED_COUNTS_FILENAME), 'w') as f:
+            f.write(counts)
+
+        eq_(self.journal.get_depth(), (2, 3))
+        self.journal.enqueue('2013-01-01', '12.00.00', make_items(1))
+        eq_(self.journal.get_depth(), (3, 4))
+
+    def test_counts_survive_truncation(self):
+        """ queue journal keeps counting right once the consumed journal is emptied """
+        self.journal.enqueue('2013-01-01', '10.00.00', make_items(1))
+        self.journal.commit(self.journal.get_pending_batches()[0])
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(2))
+        eq_(self.journal.get_depth(), (1, 2))
+
+    def test_legacy_queue_is_migrated_once(self):
+        """ a legacy queue is moved to the journal once, by the first writer """
+        day_directory = os.path.join(self.queue_dir, '2013-01-01')
+        os.makedirs(day_directory)
+        with open(os.path.join(day_directory, '10.00.00.json'), 'w') as f:
+            json.dump(make_items(1), f)
+
+        other_journal = QueueJournal(self.queue_dir)
+        eq_([b.batch for b in self.journal.get_pending_batches()], ['10.00.00'])
+        self.journal.enqueue('2013-01-01', '11.00.00', make_items(1))
+        other_journal.enqueue('2013-01-01', '12.00.00', make_items(1))
+        eq_([b.batch for b in other_journal.get_pending_batches()], ['10.00.00', '11.00.00', '12.00.00'])
+        eq_(other_journal.get_depth(), (3, 3))
+        ok_(not os.path.exists(day_directory))
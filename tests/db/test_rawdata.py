@@ -0,0 +1,46 @@
+# coding=utf-8
+
+import os
+import json
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.db import rawdata
+from csxj.db.constants import RAW_DATA_INDEX_FILENAME
+
+
+RAW_DATA = [(u"http://www.lesoir.be/1", "<html>some article</html>"),
+            (u"http://www.lesoir.be/2", u"<html>un article accentu\xe9</html>")]
+
+
+class TestRawData(object):
+    def setUp(self):
+        self.raw_data_dir = os.path.join(tempfile.mkdtemp(), 'raw_data')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.raw_data_dir))
+
+    def test_pages_are_stored_compressed(self):
+        """ pages are gzipped, and read back as they were """
+        rawdata.save_raw_data(RAW_DATA, self.raw_data_dir)
+        eq_(rawdata.load_raw_data_index(self.raw_data_dir), [[u"http://www.lesoir.be/1", u"0.html.gz"],
+                                                             [u"http://www.lesoir.be/2", u"1.html.gz"]])
+        with open(os.path.join(self.raw_data_dir, u"0.html.gz"), 'rb') as f:
+            ok_(f.read() != "<html>some article</html>")
+        eq_(list(rawdata.iter_raw_data(self.raw_data_dir)),
+            [(u"http://www.lesoir.be/1", "<html>some article</html>"),
+             (u"http://www.lesoir.be/2", u"<html>un article accentu\xe9</html>".encode('utf-8'))])
+
+    def test_uncompressed_pages_are_still_read(self):
+        """ batches saved before compression stay readable """
+        os.makedirs(self.raw_data_dir)
+        with open(os.path.join(self.raw_data_dir, '0.html'), 'w') as f:
+            f.write("<html>some article</html>")
+        with open(os.path.join(self.raw_data_dir, RAW_DATA_INDEX_FILENAME), 'w') as f:
+            json.dump([(u"http://www.lesoir.be/1", u"0.html")], f)
+
+        eq_(list(rawdata.iter_raw_data(self.raw_data_dir)), [(u"http://www.lesoir.be/1", "<html>some article</html>")])
+        with rawdata.open_raw_html(os.path.join(self.raw_data_dir, '0.html')) as f:
+            eq_(f.read(), "<html>some article</html>")
@@ -0,0 +1,70 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.db import Provider, NonExistentBatchError, rawdata
+from csxj.db.rawpack import RawDataPack, CorruptedPackError, write_pack
+from csxj.db.constants import RAW_DATA_DIR, ERRORS_RAW_DATA_DIR, RAW_DATA_PACK_FILENAME
+
+
+PAGES = [(RAW_DATA_DIR, u"http://www.lesoir.be/1", "<html>some article</html>"),
+         (RAW_DATA_DIR, u"http://www.lesoir.be/2", u"<html>un article accentu\xe9</html>"),
+         (ERRORS_RAW_DATA_DIR, u"http://www.lesoir.be/3", "<html>a broken article</html>")]
+
+
+class TestRawDataPack(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.provider = Provider(self.db_root, 'lesoir')
+        self.batch_directory = os.path.join(self.db_root, 'lesoir', '2013-01-01', '10.00.00')
+        self.pack_filename = os.path.join(self.batch_directory, RAW_DATA_PACK_FILENAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_pages_are_found_by_url_and_position(self):
+        """ any page can be read out of a pack, compressed or not """
+        for compress in (True, False):
+            write_pack(self.pack_filename, PAGES, compress=compress)
+            with RawDataPack(self.pack_filename) as pack:
+                eq_(len(pack), 3)
+                eq_(pack.get(u"http://www.lesoir.be/3"), "<html>a broken article</html>")
+                eq_(pack.get_by_index(1), u"<html>un article accentu\xe9</html>".encode('utf-8'))
+                eq_(pack.get(u"http://www.lesoir.be/4"), None)
+                eq_(pack.get_references(ERRORS_RAW_DATA_DIR), [(u"http://www.lesoir.be/3", 2)])
+
+    @raises(CorruptedPackError)
+    def test_truncated_packs_are_detected(self):
+        write_pack(self.pack_filename, PAGES)
+        with open(self.pack_filename, 'r+b') as f:
+            f.truncate(os.path.getsize(self.pack_filename) - 3)
+        RawDataPack(self.pack_filename)
+
+    def test_packed_pages_are_listed_like_directories(self):
+        """ readers of raw_data directories see the pages of the pack """
+        write_pack(self.pack_filename, PAGES)
+        raw_data_dir = os.path.join(self.batch_directory, RAW_DATA_DIR)
+        references = rawdata.list_raw_pages(raw_data_dir)
+        eq_([url for (url, location) in references], [u"http://www.lesoir.be/1", u"http://www.lesoir.be/2"])
+        with rawdata.open_raw_html(references[0][1]) as f:
+            eq_(f.read(), "<html>some article</html>")
+        eq_(list(rawdata.iter_raw_data(os.path.join(self.batch_directory, ERRORS_RAW_DATA_DIR))),
+            [(u"http://www.lesoir.be/3", "<html>a broken article</html>")])
+
+    def test_provider_reads_raw_html(self):
+        """ packed or not, the provider finds the html of a url """
+        rawdata.save_raw_data([(url, html_content) for (kind, url, html_content) in PAGES], os.path.join(self.batch_directory, RAW_DATA_DIR))
+        eq_(self.provider.get_raw_html('2013-01-01', '10.00.00', u"http://www.lesoir.be/3"), "<html>a broken article</html>")
+
+        eq_(rawdata.pack_raw_data_directories(self.batch_directory), 3)
+        ok_(not os.path.exists(os.path.join(self.batch_directory, RAW_DATA_DIR)))
+        eq_(self.provider.get_raw_html('2013-01-01', '10.00.00', u"http://www.lesoir.be/3"), "<html>a broken article</html>")
+        eq_(self.provider.get_raw_html('2013-01-01', '10.00.00', u"http://www.lesoir.be/4"), None)
+
+    @raises(NonExistentBatchError)
+    def test_unknown_batch(self):
+        self.provider.get_raw_html('2013-01-01', '12.00.00', u"http://www.lesoir.be/1")
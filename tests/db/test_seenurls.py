@@ -0,0 +1,95 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import threading
+
+from nose.tools import eq_, ok_
+
+from csxj.db.seenurls import SeenUrlIndex, INITIAL_SLOT_COUNT, SLOT_SIZE
+
+
+class TestSeenUrlIndex(object):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'seen_urls.idx')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_urls_are_remembered(self):
+        """ seen url index remembers urls across sessions """
+        index = SeenUrlIndex(self.filename)
+        index.add(u"http://www.lesoir.be/1")
+        index.add(u"http://www.lesoir.be/1")
+        index.close()
+
+        index = SeenUrlIndex(self.filename)
+        ok_(u"http://www.lesoir.be/1" in index)
+        ok_(u"http://www.lesoir.be/2" not in index)
+        eq_(len(index), 1)
+        index.close()
+
+    def test_index_grows(self):
+        """ seen url index grows its table instead of filling it up """
+        index = SeenUrlIndex(self.filename)
+        urls = [u"http://www.lesoir.be/{0}".format(i) for i in range(INITIAL_SLOT_COUNT)]
+        for url in urls:
+            index.add(url)
+        index.close()
+
+        ok_(os.path.getsize(self.filename) > INITIAL_SLOT_COUNT * SLOT_SIZE)
+        index = SeenUrlIndex(self.filename)
+        eq_(len(index), len(urls))
+        ok_(all(url in index for url in urls))
+        index.close()
+
+    def test_bloom_filter_is_not_rebuilt(self):
+        """ seen url index reopens its saved Bloom filter instead of scanning the table """
+        index = SeenUrlIndex(self.filename)
+        index.add(u"http://www.lesoir.be/1")
+        index.close()
+
+        def fail():
+            raise AssertionError("the table was scanned")
+        index = SeenUrlIndex.__new__(SeenUrlIndex)
+        index.iter_hashes = fail
+        index.__init__(self.filename)
+        ok_(u"http://www.lesoir.be/1" in index)
+        eq_(len(index), 1)
+        index.close()
+
+    def test_bloom_filter_is_rebuilt_after_a_crash(self):
+        """ seen url index rebuilds its Bloom filter when it was not closed properly """
+        index = SeenUrlIndex(self.filename)
+        index.add(u"http://www.lesoir.be/1")
+        index.close()
+        index = SeenUrlIndex(self.filename)
+        index.add(u"http://www.lesoir.be/2")
+        # the table made it to the disk, but the filter's header was not updated
+        index.table.flush()
+        index.unlock()
+
+        index = SeenUrlIndex(self.filename)
+        ok_(u"http://www.lesoir.be/2" in index)
+        eq_(len(index), 2)
+        index.close()
+
+    def test_index_is_locked_while_open(self):
+        """ seen url index is only opened by one writer at a time """
+        index = SeenUrlIndex(self.filename)
+        opened = threading.Event()
+
+        def open_index():
+            other_index = SeenUrlIndex(self.filename)
+            opened.set()
+            other_index.close()
+
+        thread = threading.Thread(target=open_index)
+        thread.start()
+        opened.wait(0.2)
+        ok_(not opened.is_set())
+        index.close()
+        thread.join()
+        ok_(opened.is_set())
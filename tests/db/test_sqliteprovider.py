@@ -0,0 +1,97 @@
+# coding=utf-8
+
+import shutil
+import tempfile
+from datetime import date, time, datetime
+
+from nose.tools import eq_, ok_, raises
+
+from csxj.common.tagging import TaggedURL
+from csxj.db import Provider, ArticleData, NonExistentDayError, NonExistentBatchError, make_error_log_entry2
+from csxj.db.sqliteprovider import SQLiteProvider, open_provider
+
+
+def make_article(url, links=()):
+    return ArticleData(url, u"Title", date(2013, 1, 1), time(10, 0), datetime(2013, 1, 1, 10, 5),
+                       list(links), [u"news"], u"Author", u"Intro", [u"Content"])
+
+
+class TestSQLiteProvider(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.provider = SQLiteProvider(self.db_root, 'fakesource')
+        self.articles = [make_article(u"http://www.example.com/2"),
+                         make_article(u"http://www.example.com/1",
+                                      [TaggedURL(URL=u"http://www.other.com/", title=u"Other", tags=set([u"external", u"embedded"]))])]
+
+    def tearDown(self):
+        self.provider.close()
+        shutil.rmtree(self.db_root)
+
+    def save_batch(self, date_string, batch_time_string, articles):
+        errors = [make_error_log_entry2(u"http://www.example.com/3", u"Broken", u"Traceback")]
+        self.provider.save_batch_content(date_string, batch_time_string, self.db_root, articles=articles,
+                                         deleted_articles=[[u"Deleted", u"http://www.example.com/4"]], errors=errors,
+                                         blogposts=[[u"Blog", u"http://blog.example.com/"]], paywalled_articles=[])
+
+    def test_saved_batches_can_be_read(self):
+        """ batches are read back the way Provider reads them """
+        self.save_batch('2013-01-01', '10.00.00', self.articles)
+        self.save_batch('2013-01-01', '12.00.00', [])
+        eq_(self.provider.get_all_days(), ['2013-01-01'])
+        eq_(self.provider.get_all_batch_hours('2013-01-01'), ['10.00.00', '12.00.00'])
+
+        articles = self.provider.get_batch_articles('2013-01-01', '10.00.00')
+        eq_([a.url for a in articles], [u"http://www.example.com/1", u"http://www.example.com/2"])
+        eq_(articles[0].pub_time, time(10, 0))
+        eq_(articles[0].links[0].tags, set([u"external", u"embedded"]))
+
+        eq_(self.provider.get_pending_batch_errors('2013-01-01', '10.00.00'),
+            [[], [make_error_log_entry2(u"http://www.example.com/3", u"Broken", u"Traceback")]])
+        eq_(self.provider.get_blogpost_titles_from_batch('2013-01-01', '10.00.00'),
+            {"blogposts": [[u"Blog", u"http://blog.example.com/"]]})
+
+        metainfos = self.provider.get_batch_metainfos('2013-01-01', '10.00.00')
+        eq_((metainfos['article_count'], metainfos['link_count'], metainfos['pending_error_count']), (2, 1, 1))
+
+    def test_saving_a_batch_again_replaces_it(self):
+        """ saving a batch twice does not duplicate its content """
+        self.save_batch('2013-01-01', '10.00.00', self.articles)
+        self.save_batch('2013-01-01', '10.00.00', self.articles[:1])
+        eq_(len(self.provider.get_batch_articles('2013-01-01', '10.00.00')), 1)
+        eq_(self.provider.get_articles_linking_with_tag(u"embedded"), [])
+
+    def test_lookups_by_url_and_tag(self):
+        """ articles can be found from their url, or the tags of their links """
+        self.save_batch('2013-01-01', '10.00.00', self.articles)
+        self.save_batch('2013-01-02', '10.00.00', self.articles)
+        found = self.provider.get_articles_by_url(u"http://www.example.com/1")
+        eq_([(day, batch) for (day, batch, article) in found], [('2013-01-01', '10.00.00'), ('2013-01-02', '10.00.00')])
+        found = self.provider.get_articles_linking_with_tag(u"embedded")
+        eq_([article.url for (day, batch, article) in found], [u"http://www.example.com/1"] * 2)
+
+    def test_sources_are_kept_apart(self):
+        """ sources share the database file, not their batches """
+        self.save_batch('2013-01-01', '10.00.00', self.articles)
+        other_provider = SQLiteProvider(self.db_root, 'othersource')
+        eq_(other_provider.get_all_days(), [])
+        other_provider.close()
+
+    @raises(NonExistentDayError)
+    def test_unknown_day(self):
+        self.provider.get_all_batch_hours('2013-01-01')
+
+    @raises(NonExistentBatchError)
+    def test_unknown_batch(self):
+        self.provider.get_batch_articles('2013-01-01', '10.00.00')
+
+    def test_json_batches_can_be_imported(self):
+        """ a json batch reads the same once imported """
+        json_provider = open_provider(self.db_root, 'fakesource', 'json')
+        ok_(type(json_provider) is Provider)
+        batch_directory = json_provider.directory + '/2013-01-01/10.00.00'
+        json_provider.save_batch_content('2013-01-01', '10.00.00', batch_directory, articles=self.articles,
+                                         deleted_articles=[], errors=[], blogposts=[], paywalled_articles=[])
+        self.provider.import_json_batch(json_provider, '2013-01-01', '10.00.00')
+        eq_([a.to_json() for a in self.provider.get_batch_articles('2013-01-01', '10.00.00')],
+            [a.to_json() for a in json_provider.get_batch_articles('2013-01-01', '10.00.00')])
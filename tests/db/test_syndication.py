@@ -0,0 +1,46 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.db.syndication import SyndicationIndex, canonicalize_url
+
+
+class TestSyndicationIndex(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.index = SyndicationIndex(self.db_root, 'rossel')
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_copies_are_found_by_title(self):
+        """ syndication index spots the same wire story published by two sources """
+        self.index.register_stories(u"lesoir", [(u"Le gouvernement fédéral a trouvé un accord budgétaire", u"http://www.lesoir.be/1")])
+        aliases = self.index.register_stories(u"sudinfo", [(u"Accord budgétaire : le gouvernement fédéral a trouvé", u"http://www.sudinfo.be/2"),
+                                                           (u"Un tout autre sujet sans aucun rapport", u"http://www.sudinfo.be/3")])
+        eq_(aliases, {u"http://www.sudinfo.be/2": dict(source=u"lesoir", url=u"http://www.lesoir.be/1", matched_by='title')})
+
+    def test_copies_are_found_by_url(self):
+        """ syndication index spots a source linking to its sister site's article """
+        self.index.register_stories(u"lesoir", [(u"Météo", u"http://www.lesoir.be/1")])
+        aliases = self.index.register_stories(u"sudinfo", [(u"La météo", u"http://lesoir.be/1?utm_source=sudinfo")])
+        eq_(aliases.keys(), [u"http://lesoir.be/1?utm_source=sudinfo"])
+        eq_(aliases.values()[0]['matched_by'], 'url')
+
+    def test_stories_of_the_same_source_are_not_aliases(self):
+        """ syndication index only compares different sources """
+        stories = [(u"Le gouvernement fédéral a trouvé un accord budgétaire", u"http://www.lesoir.be/1")]
+        self.index.register_stories(u"lesoir", stories)
+        eq_(self.index.register_stories(u"lesoir", stories), dict())
+
+    def test_downloaded_stories(self):
+        """ syndication index remembers which first copies were downloaded """
+        self.index.register_stories(u"lesoir", [(u"Météo", u"http://www.lesoir.be/1")])
+        ok_(not self.index.is_downloaded(u"lesoir", u"http://www.lesoir.be/1"))
+        self.index.mark_downloaded(u"lesoir", [u"http://www.lesoir.be/1"])
+        ok_(self.index.is_downloaded(u"lesoir", u"http://www.lesoir.be/1"))
+        ok_(not self.index.is_downloaded(u"sudinfo", u"http://www.lesoir.be/1"))
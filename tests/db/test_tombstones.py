@@ -0,0 +1,66 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.db import tombstones
+from csxj.db.tombstones import TombstoneStore, DELETED, PAYWALLED, TOMBSTONES_FILENAME
+
+
+class TestTombstoneStore(object):
+    def setUp(self):
+        self.source_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_directory)
+
+    def count_lines(self):
+        with open(os.path.join(self.source_directory, TOMBSTONES_FILENAME)) as f:
+            return len(f.readlines())
+
+    def test_tombstones_are_remembered(self):
+        """ tombstone store remembers why urls should not be fetched, across sessions """
+        store = TombstoneStore(self.source_directory)
+        store.add(u"http://www.lesoir.be/1", DELETED)
+        store.add(u"http://www.lesoir.be/2", PAYWALLED)
+
+        store = TombstoneStore(self.source_directory)
+        eq_(store.get(u"http://www.lesoir.be/1"), DELETED)
+        eq_(store.get(u"http://www.lesoir.be/2"), PAYWALLED)
+        eq_(store.get(u"http://www.lesoir.be/3"), None)
+
+    def test_tombstones_expire(self):
+        """ tombstone store forgets tombstones once their ttl is over """
+        original_ttl = tombstones.TOMBSTONE_TTLS[DELETED]
+        tombstones.TOMBSTONE_TTLS[DELETED] = -1
+        try:
+            store = TombstoneStore(self.source_directory)
+            store.add(u"http://www.lesoir.be/1", DELETED)
+            eq_(store.get(u"http://www.lesoir.be/1"), None)
+        finally:
+            tombstones.TOMBSTONE_TTLS[DELETED] = original_ttl
+        eq_(len(TombstoneStore(self.source_directory)), 0)
+
+    def test_log_is_compacted(self):
+        """ tombstone store rewrites its log when it is mostly made of superseded lines """
+        store = TombstoneStore(self.source_directory)
+        for i in range(tombstones.MIN_COMPACTION_LINES + 1):
+            store.add(u"http://www.lesoir.be/1", DELETED)
+        eq_(self.count_lines(), tombstones.MIN_COMPACTION_LINES + 1)
+
+        store = TombstoneStore(self.source_directory)
+        eq_(self.count_lines(), 1)
+        eq_(store.get(u"http://www.lesoir.be/1"), DELETED)
+
+    def test_partial_line_is_dropped(self):
+        """ tombstone store ignores a line which was not completely written """
+        TombstoneStore(self.source_directory).add(u"http://www.lesoir.be/1", DELETED)
+        with open(os.path.join(self.source_directory, TOMBSTONES_FILENAME), 'ab') as f:
+            f.write('["http://www.lesoir.be/2", "del')
+
+        store = TombstoneStore(self.source_directory)
+        eq_(len(store), 1)
+        eq_(self.count_lines(), 1)
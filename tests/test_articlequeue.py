@@ -0,0 +1,308 @@
+# coding=utf-8
+
+import os
+import json
+import sqlite3
+import shutil
+import logging
+import tempfile
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from nose.tools import eq_, ok_, assert_raises
+
+from csxj import utils, articlequeue
+from csxj.articlequeue import ArticleQueueFiller, ArticleQueueDownloader, MAX_RSS_SKIPPED_POLLS
+from csxj.db import Provider
+from csxj.db.constants import FRONTPAGE_CACHE_FILENAME, SYNDICATED_ARTICLES_FILENAME, DELETED_ARTICLES_FILENAME, ERRORS2_FILENAME, LAST_STORIES_FILENAME
+from csxj.db.syndication import SyndicationIndex
+from csxj.db.sqliteprovider import SQLiteProvider, open_provider
+from csxj.db.tombstones import TombstoneStore, DELETED
+from csxj.datasources.parser_tools.fetcher import get_shared_fetcher
+
+
+FRONTPAGE_ETAG = '"frontpage-v1"'
+
+
+class FrontpageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    frontpage = 'frontpage v1'
+    honor_etag = True
+
+    feed = 'feed v1'
+    requested_paths = list()
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        if self.path == '/rss.xml':
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.feed)))
+            self.end_headers()
+            self.wfile.write(self.feed)
+            return
+
+        if self.honor_etag and self.headers.getheader('If-None-Match') == FRONTPAGE_ETAG:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', FRONTPAGE_ETAG)
+        self.send_header('Content-Length', str(len(self.frontpage)))
+        self.end_headers()
+        self.wfile.write(self.frontpage)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeSource(object):
+    def __init__(self, frontpage_url):
+        self.FRONTPAGE_URL = frontpage_url
+        self.parsed_pages = list()
+        self.frontpage_toc = None
+
+    def parse_frontpage_toc(self, html_content):
+        self.parsed_pages.append(html_content)
+        if self.frontpage_toc is not None:
+            return self.frontpage_toc, [], []
+        return [(u"title", u"http://www.example.com/{0}".format(len(self.parsed_pages)))], [], []
+
+
+class FakeSourceWithFeed(FakeSource):
+    def __init__(self, frontpage_url):
+        super(FakeSourceWithFeed, self).__init__(frontpage_url)
+        self.RSS_FEED_URL = frontpage_url + 'rss.xml'
+        self.rss_toc = list()
+
+    def parse_rss_toc(self, xml_content):
+        return self.rss_toc
+
+
+class TestArticleQueueFiller(object):
+    def setUp(self):
+        FrontpageHandler.honor_etag = True
+        self.server = LocalServer(('127.0.0.1', 0), FrontpageHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.db_root = tempfile.mkdtemp()
+        url = 'http://127.0.0.1:{0}/'.format(self.server.server_address[1])
+        self.source = FakeSource(url)
+        self.filler = ArticleQueueFiller(self.source, 'fakesource', self.db_root)
+        self.filler.log = logging.getLogger('csxj_test_QueueFiller')
+
+    def tearDown(self):
+        get_shared_fetcher().close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.db_root)
+
+    def load_frontpage_cache(self):
+        with open(os.path.join(self.db_root, 'fakesource', FRONTPAGE_CACHE_FILENAME)) as f:
+            return json.load(f)
+
+    def test_not_modified_frontpage_is_not_parsed(self):
+        """ the filler sends conditional requests and skips parsing on 304 """
+        self.filler.fetch_newest_article_links()
+        self.filler.fetch_newest_article_links()
+
+        eq_(len(self.source.parsed_pages), 1)
+        cache = self.load_frontpage_cache()
+        eq_(cache['etag'], FRONTPAGE_ETAG)
+        eq_(cache['skipped_polls'], 1)
+
+    def test_unchanged_body_is_not_parsed(self):
+        """ the filler skips parsing when the frontpage body hash did not change """
+        FrontpageHandler.honor_etag = False
+        for i in range(3):
+            self.filler.fetch_newest_article_links()
+
+        eq_(len(self.source.parsed_pages), 1)
+        eq_(self.load_frontpage_cache()['skipped_polls'], 2)
+
+    def test_changed_frontpage_is_parsed(self):
+        """ the filler parses the frontpage again when it changed """
+        FrontpageHandler.honor_etag = False
+        self.filler.fetch_newest_article_links()
+        FrontpageHandler.frontpage = 'frontpage v2'
+        try:
+            self.filler.fetch_newest_article_links()
+        finally:
+            FrontpageHandler.frontpage = 'frontpage v1'
+
+        eq_(len(self.source.parsed_pages), 2)
+        ok_(not self.load_frontpage_cache()['skipped_polls'])
+
+    def test_polls_wait_for_the_polling_schedule(self):
+        """ the filler does not poll a frontpage before its polling schedule says so """
+        filler = ArticleQueueFiller(self.source, 'fakesource', self.db_root, only_if_due=True)
+        filler.log = self.filler.log
+        filler.fetch_newest_article_links()
+        filler.fetch_newest_article_links()
+
+        eq_(len(self.source.parsed_pages), 1)
+        ok_(not filler.polling_schedule.is_due())
+
+    def test_unchanged_feed_saves_the_frontpage(self):
+        """ the filler only fetches the frontpage when the RSS feed has new items, which it queues too """
+        source = FakeSourceWithFeed(self.source.FRONTPAGE_URL)
+        filler = ArticleQueueFiller(source, 'fakesource', self.db_root)
+        filler.log = self.filler.log
+        story_a, story_b = (u"a", u"http://www.example.com/a"), (u"b", u"http://www.example.com/b")
+        del FrontpageHandler.requested_paths[:]
+
+        source.rss_toc = [story_a]
+        filler.fetch_newest_article_links()
+        eq_(FrontpageHandler.requested_paths, ['/rss.xml', '/'])
+        eq_(filler.new_stories, [(u"title", u"http://www.example.com/1"), story_a])
+
+        filler.fetch_newest_article_links()
+        eq_(FrontpageHandler.requested_paths, ['/rss.xml', '/', '/rss.xml'])
+
+        source.rss_toc = [story_a, story_b]
+        filler.fetch_newest_article_links()
+        eq_(FrontpageHandler.requested_paths, ['/rss.xml', '/', '/rss.xml', '/rss.xml', '/'])
+        eq_(filler.new_stories, [story_b])
+        eq_(len(source.parsed_pages), 1)
+        last_stories = utils.load_last_toc_from_file(os.path.join(self.db_root, 'fakesource', LAST_STORIES_FILENAME))
+        eq_(last_stories, [(u"title", u"http://www.example.com/1"), story_a, story_b])
+
+    def test_feed_skips_are_counted_apart(self):
+        """ the filler fetches the frontpage after MAX_RSS_SKIPPED_POLLS feed skips, and starts counting again """
+        source = FakeSourceWithFeed(self.source.FRONTPAGE_URL)
+        filler = ArticleQueueFiller(source, 'fakesource', self.db_root)
+        filler.log = self.filler.log
+        source.rss_toc = [(u"a", u"http://www.example.com/a")]
+        filler.fetch_newest_article_links()
+        del FrontpageHandler.requested_paths[:]
+
+        for i in range(2 * (MAX_RSS_SKIPPED_POLLS + 1)):
+            filler.fetch_newest_article_links()
+
+        frontpage_requests = ['/rss.xml'] * MAX_RSS_SKIPPED_POLLS + ['/rss.xml', '/']
+        eq_(FrontpageHandler.requested_paths, frontpage_requests * 2)
+        eq_(self.load_frontpage_cache()['skipped_polls'], 2 * (MAX_RSS_SKIPPED_POLLS + 1))
+
+    def test_returning_stories_are_not_queued_again(self):
+        """ the filler only queues urls it has never queued before """
+        FrontpageHandler.honor_etag = False
+        story_a, story_b = (u"a", u"http://www.example.com/a"), (u"b", u"http://www.example.com/b")
+        queued_stories = list()
+        try:
+            for i, frontpage_toc in enumerate([[story_a], [story_b], [story_a, story_b]]):
+                FrontpageHandler.frontpage = 'frontpage v{0}'.format(i)
+                self.source.frontpage_toc = frontpage_toc
+                self.filler.fetch_newest_article_links()
+                queued_stories.append(self.filler.new_stories)
+        finally:
+            FrontpageHandler.frontpage = 'frontpage v1'
+
+        eq_(queued_stories, [[story_a], [story_b], []])
+
+
+class FakeArticleSource(object):
+    MISSING_PAGE_HTTP_CODES = ()
+
+    def filter_news_items(self, items):
+        return items, []
+
+    def parse_article(self, html_content, url):
+        return None, html_content
+
+
+class TestArticleQueueDownloader(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+        self.provider = Provider(self.db_root, 'fakesource')
+        self.items = dict(articles=[[u"title", u"http://127.0.0.1:1/article.html"]], blogposts=[], paywalled_articles=[])
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def make_downloader(self, deadline, source=None, skip_syndicated=False, storage_backend='json'):
+        downloader = ArticleQueueDownloader(source or FakeArticleSource(), 'fakesource', self.db_root, deadline=deadline,
+                                            skip_syndicated=skip_syndicated, storage_backend=storage_backend)
+        downloader.log = logging.getLogger('csxj_test_QueueDownloader')
+        return downloader
+
+    def test_batches_stay_queued_when_out_of_time(self):
+        """ the downloader leaves the queue untouched once its time budget is spent """
+        batch = self.provider.requeue_items('2013-01-01', self.items)
+        self.make_downloader(deadline=time.time() - 1).download_all_articles_in_queue()
+
+        eq_(self.provider.get_queued_batches_by_day(), [('2013-01-01', [(batch, self.items)])])
+        ok_(not os.path.exists(os.path.join(self.db_root, 'fakesource', '2013-01-01')))
+
+    def test_batches_leased_to_another_downloader_are_left_alone(self):
+        """ the downloader does not download batches claimed by another downloader """
+        batch = self.provider.requeue_items('2013-01-01', self.items)
+        self.provider.claim_queued_batch(u"someone else")
+        self.make_downloader(deadline=None).download_all_articles_in_queue()
+
+        eq_(self.provider.get_queued_batches_by_day(), [('2013-01-01', [(batch, self.items)])])
+        ok_(not os.path.exists(os.path.join(self.db_root, 'fakesource', '2013-01-01')))
+
+    def test_syndicated_articles_are_not_downloaded_twice(self):
+        """ the downloader skips the stories a sister source already downloaded """
+        source = FakeArticleSource()
+        source.SYNDICATION_GROUP = 'rossel'
+        syndication_index = SyndicationIndex(self.db_root, 'rossel')
+        syndication_index.register_stories(u"lesoir", [(u"title", u"http://www.lesoir.be/1")])
+        syndication_index.mark_downloaded(u"lesoir", [u"http://www.lesoir.be/1"])
+        self.items['syndicated_stories'] = {u"http://127.0.0.1:1/article.html": dict(source=u"lesoir", url=u"http://www.lesoir.be/1", matched_by='title')}
+        batch = self.provider.requeue_items('2013-01-01', self.items)
+        self.make_downloader(deadline=None, source=source, skip_syndicated=True).download_all_articles_in_queue()
+
+        eq_(self.provider.get_queued_batches_by_day(), [])
+        with open(os.path.join(self.db_root, 'fakesource', '2013-01-01', batch, SYNDICATED_ARTICLES_FILENAME)) as f:
+            eq_(json.load(f), dict(syndicated_articles=[[u"title", u"http://127.0.0.1:1/article.html", u"lesoir", u"http://www.lesoir.be/1"]]))
+
+    def test_tombstoned_articles_are_not_fetched(self):
+        """ the downloader does not fetch again the articles it found deleted before """
+        TombstoneStore(os.path.join(self.db_root, 'fakesource')).add(u"http://127.0.0.1:1/article.html", DELETED)
+        batch = self.provider.requeue_items('2013-01-01', self.items)
+        self.make_downloader(deadline=None).download_all_articles_in_queue()
+
+        batch_directory = os.path.join(self.db_root, 'fakesource', '2013-01-01', batch)
+        with open(os.path.join(batch_directory, DELETED_ARTICLES_FILENAME)) as f:
+            eq_(json.load(f), dict(deleted_articles=[[u"title", u"http://127.0.0.1:1/article.html"]]))
+        with open(os.path.join(batch_directory, ERRORS2_FILENAME)) as f:
+            eq_(json.load(f), dict(errors=[]))
+
+    def test_batches_can_be_stored_in_sqlite(self):
+        """ with the sqlite backend, the batch content goes to the database instead of json files """
+        TombstoneStore(os.path.join(self.db_root, 'fakesource')).add(u"http://127.0.0.1:1/article.html", DELETED)
+        batch = self.provider.requeue_items('2013-01-01', self.items)
+        self.make_downloader(deadline=None, storage_backend='sqlite').download_all_articles_in_queue()
+
+        ok_(not os.path.exists(os.path.join(self.db_root, 'fakesource', '2013-01-01', batch, DELETED_ARTICLES_FILENAME)))
+        sqlite_provider = SQLiteProvider(self.db_root, 'fakesource')
+        eq_(sqlite_provider.get_all_batch_hours('2013-01-01'), [batch])
+        eq_(sqlite_provider.get_deleted_articles_from_batch_directory(os.path.join(sqlite_provider.directory, '2013-01-01', batch)),
+            dict(deleted_articles=[[u"title", u"http://127.0.0.1:1/article.html"]]))
+        sqlite_provider.close()
+
+    def test_sqlite_connection_is_closed(self):
+        """ the downloader closes the provider it opened for its run """
+        opened_providers = list()
+
+        def recording_open_provider(*args):
+            opened_providers.append(open_provider(*args))
+            return opened_providers[-1]
+
+        articlequeue.open_provider = recording_open_provider
+        try:
+            self.make_downloader(deadline=None, storage_backend='sqlite').download_all_articles_in_queue()
+        finally:
+            articlequeue.open_provider = open_provider
+
+        eq_(len(opened_providers), 1)
+        assert_raises(sqlite3.ProgrammingError, opened_providers[0].query, "SELECT 1")
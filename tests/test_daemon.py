@@ -0,0 +1,57 @@
+# coding=utf-8
+
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+from nose.tools import eq_, ok_
+
+from csxj.daemon import CrawlerDaemon
+
+
+class FakeSource(object):
+    SOURCE_NAME = 'fakesource'
+
+
+class RecordingDaemon(CrawlerDaemon):
+    log = logging.getLogger('csxj_test_Daemon')
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingDaemon, self).__init__(*args, **kwargs)
+        self.tasks = list()
+
+    def fill_queues(self, sources):
+        self.tasks.append('poll')
+
+    def download_queued_articles(self):
+        self.tasks.append('download')
+
+
+class TestCrawlerDaemon(object):
+    def setUp(self):
+        self.db_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_root)
+
+    def test_tasks_run_on_their_timers(self):
+        """ the daemon polls and downloads on their own intervals, until it is stopped """
+        daemon = RecordingDaemon(self.db_root, [FakeSource], [FakeSource], poll_interval_bounds=(0.3, 0.3), download_interval=10)
+        stopper = threading.Timer(0.5, daemon.stop)
+        stopper.start()
+        started_at = time.time()
+        daemon.run()
+
+        ok_(time.time() - started_at < 5)
+        eq_(daemon.tasks, ['poll', 'download', 'poll'])
+
+    def test_stop_interrupts_the_download(self):
+        """ stopping the daemon moves the running download's deadline to now """
+        daemon = RecordingDaemon(self.db_root, [], [])
+        daemon.current_downloader = FakeSource()
+        daemon.current_downloader.deadline = None
+        daemon.stop()
+        ok_(daemon.current_downloader.deadline <= time.time())
+        ok_(daemon.is_stopping())
@@ -0,0 +1,49 @@
+# coding=utf-8
+
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from csxj.polling import PollingSchedule, TARGET_NEW_STORIES_PER_POLL
+
+
+class TestPollingSchedule(object):
+    def setUp(self):
+        self.source_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_directory)
+
+    def make_schedule(self):
+        return PollingSchedule(self.source_directory, min_interval=60, max_interval=3600)
+
+    def test_busy_frontpages_are_polled_more_often(self):
+        """ polling schedule shortens the interval when many new stories show up """
+        schedule = self.make_schedule()
+        schedule.record_poll(0, now=0)
+        schedule.record_poll(TARGET_NEW_STORIES_PER_POLL * 2, now=600)
+        eq_(schedule.interval, 300)
+
+        for i in range(2, 10):
+            schedule.record_poll(50, now=i * 300)
+        eq_(schedule.interval, 60)
+
+    def test_quiet_frontpages_are_polled_less_often(self):
+        """ polling schedule lengthens the interval when nothing new shows up """
+        schedule = self.make_schedule()
+        schedule.record_poll(0, now=0)
+        schedule.record_poll(0, now=600)
+        eq_(schedule.interval, 3600)
+        ok_(not schedule.is_due(now=3000))
+        ok_(schedule.is_due(now=4200))
+
+    def test_schedule_is_saved(self):
+        """ polling schedule remembers what it learned across runs """
+        schedule = self.make_schedule()
+        schedule.record_poll(0, now=0)
+        schedule.record_poll(TARGET_NEW_STORIES_PER_POLL, now=600)
+        schedule.save()
+
+        schedule = self.make_schedule()
+        eq_((schedule.last_poll, schedule.interval), (600, 600))
@@ -0,0 +1,43 @@
+# coding=utf-8
+
+from datetime import datetime
+
+from nose.tools import eq_
+
+from csxj.db.queuejournal import QueuedBatch
+from csxj.scheduling import FreshnessFirstPolicy, OldestFirstPolicy
+
+
+NOW = datetime(2013, 1, 2, 12, 0, 0)
+
+
+def make_batch(day, batch):
+    return QueuedBatch(0, 0, 0, day, batch, dict(articles=[], blogposts=[], paywalled_articles=[]))
+
+
+BACKLOG = [make_batch('2013-01-01', '08.00.00'), make_batch('2013-01-01', '09.00.00')]
+FRESH = [make_batch('2013-01-02', '10.00.00'), make_batch('2013-01-02', '11.00.00')]
+
+
+def test_oldest_first():
+    """ oldest first scheduling follows the queue order """
+    eq_(OldestFirstPolicy()(list(reversed(BACKLOG + FRESH))), BACKLOG + FRESH)
+
+
+def test_fresh_batches_come_first():
+    """ freshness first scheduling takes the newest batches first """
+    policy = FreshnessFirstPolicy(now=lambda: NOW, backlog_share=0)
+    eq_(policy(BACKLOG + FRESH)[:2], list(reversed(FRESH)))
+    eq_(policy(BACKLOG)[0], BACKLOG[0])
+
+
+def test_backlog_drain_is_bounded():
+    """ freshness first scheduling gives the backlog a share of the claims """
+    policy = FreshnessFirstPolicy(now=lambda: NOW, backlog_share=0.5)
+    queued_batches = BACKLOG + FRESH
+    claimed = list()
+    while queued_batches:
+        queued_batch = policy(queued_batches)[0]
+        claimed.append(queued_batch)
+        queued_batches.remove(queued_batch)
+    eq_(claimed, [FRESH[1], BACKLOG[0], FRESH[0], BACKLOG[1]])